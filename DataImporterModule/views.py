@@ -8,8 +8,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from UserModule.models import (
     GenMembershipType, GenPersonRole, GenShift,
-    SecUser, GenPerson, GenMember
+    SecUser, GenPerson, GenMember, MemberBiometrics
 )
+from UserModule.id_allocator import id_allocator
 from .models import DataImportProgress
 
 
@@ -187,7 +188,7 @@ class DataImportFromJsonConfigAPIView(APIView):
                 user_instance = SecUser.objects.filter(id=row.UserID).first() if row.UserID else None
                 shift_instance = GenShift.objects.filter(id=row.ShiftID).first() if row.ShiftID else None
 
-                GenMember.objects.update_or_create(
+                member, _ = GenMember.objects.update_or_create(
                     id=row.MemberID,
                     defaults={
                         'card_no': row.CardNo,
@@ -203,20 +204,30 @@ class DataImportFromJsonConfigAPIView(APIView):
                         'modification_datetime': modification_datetime,
                         'is_family': row.IsFamily,
                         'max_debit': row.MaxDebit,
-                        'minutiae': row.Minutiae,
-                        'minutiae2': row.Minutiae2,
-                        'minutiae3': row.Minutiae3,
                         'salary': row.Salary,
-                        'face_template_1': row.FaceTmpl1,
-                        'face_template_2': row.FaceTmpl2,
-                        'face_template_3': row.FaceTmpl3,
-                        'face_template_4': row.FaceTmpl4,
-                        'face_template_5': row.FaceTmpl5,
                     }
                 )
+                templates = {
+                    'minutiae': row.Minutiae,
+                    'minutiae2': row.Minutiae2,
+                    'minutiae3': row.Minutiae3,
+                    'face_template_1': row.FaceTmpl1,
+                    'face_template_2': row.FaceTmpl2,
+                    'face_template_3': row.FaceTmpl3,
+                    'face_template_4': row.FaceTmpl4,
+                    'face_template_5': row.FaceTmpl5,
+                }
+                # Only members with templates get a biometrics row, as in the migration
+                if any(templates.values()):
+                    MemberBiometrics.objects.update_or_create(member=member, defaults=templates)
+                else:
+                    MemberBiometrics.objects.filter(member=member).delete()
                 progress.current_step += 1
                 progress.save()
 
+            # Imported rows keep their legacy ids, move the id sequences above them
+            id_allocator.sync_all()
+
             # --- Mark completed ---
             progress.current_step = progress.total_steps  # force 100%
             progress.status = 'completed'
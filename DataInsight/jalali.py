@@ -0,0 +1,113 @@
+"""
+Jalali calendar dimension.
+
+JalaliDay holds one row per Gregorian date from FIRST_DAY to LAST_DAY
+with its Jalali year, month, day, weekday and week, so reports join to
+it and group by Jalali month or day in SQL instead of converting every
+row with jdatetime in Python. The rows are filled by a migration; fill()
+extends the range.
+"""
+from datetime import date, datetime, time, timedelta
+
+import jdatetime
+from django.db import connection
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import JalaliDay
+
+FIRST_DAY = date(1980, 1, 1)
+LAST_DAY = date(2060, 12, 31)
+
+# (month, day) of the solar holidays; Fridays are holidays too
+FIXED_HOLIDAYS = {(1, 1), (1, 2), (1, 3), (1, 4), (1, 12), (1, 13), (3, 14), (3, 15), (11, 22), (12, 29)}
+FRIDAY = 6
+
+AGGREGATES = {'count', 'sum', 'min', 'max', 'avg'}
+
+
+def rows(first_day, last_day):
+    """JalaliDay field values for each date of first_day..last_day."""
+    day = first_day
+    while day <= last_day:
+        jalali = jdatetime.date.fromgregorian(date=day)
+        yield {
+            'date': day,
+            'year': jalali.year,
+            'month': jalali.month,
+            'day': jalali.day,
+            'weekday': jalali.weekday(),
+            'week_of_year': jalali.weeknumber(),
+            'is_holiday': jalali.weekday() == FRIDAY or (jalali.month, jalali.day) in FIXED_HOLIDAYS,
+        }
+        day += timedelta(days=1)
+
+
+def fill(first_day=FIRST_DAY, last_day=LAST_DAY, model=JalaliDay):
+    """Add the missing days of first_day..last_day; days already there (and their holiday flags) are kept."""
+    return len(model.objects.bulk_create(
+        [model(**values) for values in rows(first_day, last_day)], batch_size=5000, ignore_conflicts=True
+    ))
+
+
+def today():
+    """Today's JalaliDay in the current time zone."""
+    return JalaliDay.objects.get(date=timezone.localdate())
+
+
+def period(year, month=None):
+    """
+    [start, end) aware datetimes of a Jalali year, or of one of its months, in the current time zone,
+    for filtering on indexed timestamps.
+    """
+    days = JalaliDay.objects.filter(year=year, **({'month': month} if month else {}))
+    bounds = days.aggregate(first=Min('date'), last=Max('date'))
+    if bounds['first'] is None:
+        raise JalaliDay.DoesNotExist(f"No calendar days for {year}-{month or ''}")
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(bounds['first'], time.min, tzinfo=tz),
+        datetime.combine(bounds['last'] + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def group_by(queryset, field, parts=('year', 'month'), **aggregates):
+    """
+    Group queryset by the Jalali parts (JalaliDay columns) of its date or datetime field, in one query.
+    aggregates map output names to (function, field), function being count, sum, min, max or avg;
+    with none given, rows are counted as 'count'. Returns a list of dicts ordered by parts.
+    Datetimes fall on their local date in the current time zone.
+
+        group_by(Payment.objects.all(), 'payment_date', total_price=('sum', 'price'), count=('count', 'id'))
+    """
+    aggregates = aggregates or {'count': ('count', 'pk')}
+    for function, _ in aggregates.values():
+        if function not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: {function}")
+    invalid = set(parts) - {f.name for f in JalaliDay._meta.get_fields()}
+    if invalid:
+        raise ValueError(f"Unknown Jalali parts: {', '.join(sorted(invalid))}")
+
+    columns = {f'value{n}': F(value) for n, (_, value) in enumerate(aggregates.values())}
+    inner, params = queryset.values(jalali_moment=F(field), **columns).query.sql_with_params()
+    moment = 'inner_rows.jalali_moment'
+    if queryset.model._meta.get_field(field).get_internal_type() == 'DateTimeField':
+        moment = f"({moment} AT TIME ZONE %s)::date"
+        params = (*params, timezone.get_current_timezone_name())
+
+    quote = connection.ops.quote_name
+    selected = [f"calendar.{quote(part)}" for part in parts]
+    selected += [
+        f"{function}(inner_rows.value{n}) AS {quote(name)}"
+        for n, (name, (function, _)) in enumerate(aggregates.items())
+    ]
+    group = ', '.join(str(n + 1) for n in range(len(parts)))
+    sql = (
+        f"SELECT {', '.join(selected)} FROM ({inner}) AS inner_rows "
+        f"JOIN {quote(JalaliDay._meta.db_table)} AS calendar ON calendar.date = {moment} "
+        + (f"GROUP BY {group} ORDER BY {group}" if parts else "")
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [*parts, *aggregates]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
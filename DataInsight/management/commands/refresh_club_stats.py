@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from DataInsight import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard ClubStats (skipped while another process is already recomputing).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Keep running, recomputing every N seconds')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def refresh(self):
+        started = time.monotonic()
+        if refresh.refresh():
+            self.log(f"ClubStats recomputed in {time.monotonic() - started:.1f}s")
+        else:
+            self.log("Another process is recomputing ClubStats, skipped")
+
+    def handle(self, *args, **options):
+        self.refresh()
+        while options['every']:
+            time.sleep(options['every'])
+            self.refresh()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DataInsight', '0008_remove_clubstats_avg_hours_by_weekday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clubstats',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
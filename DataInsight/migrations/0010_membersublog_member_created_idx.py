@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DataInsight', '0009_clubstats_refreshed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='membersublog',
+            index=models.Index(fields=['member', 'created_at'], name='sublog_member_created_idx'),
+        ),
+    ]
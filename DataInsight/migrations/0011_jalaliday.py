@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:17
+
+from datetime import date, timedelta
+
+import jdatetime
+from django.db import migrations, models
+
+# Frozen copy of DataInsight.jalali's range and holidays as of this migration
+FIRST_DAY = date(1980, 1, 1)
+LAST_DAY = date(2060, 12, 31)
+FIXED_HOLIDAYS = {(1, 1), (1, 2), (1, 3), (1, 4), (1, 12), (1, 13), (3, 14), (3, 15), (11, 22), (12, 29)}
+FRIDAY = 6
+
+
+def fill_calendar(apps, schema_editor):
+    JalaliDay = apps.get_model('DataInsight', 'JalaliDay')
+    days = []
+    day = FIRST_DAY
+    while day <= LAST_DAY:
+        jalali = jdatetime.date.fromgregorian(date=day)
+        days.append(JalaliDay(
+            date=day,
+            year=jalali.year,
+            month=jalali.month,
+            day=jalali.day,
+            weekday=jalali.weekday(),
+            week_of_year=jalali.weeknumber(),
+            is_holiday=jalali.weekday() == FRIDAY or (jalali.month, jalali.day) in FIXED_HOLIDAYS,
+        ))
+        day += timedelta(days=1)
+    JalaliDay.objects.bulk_create(days, batch_size=5000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DataInsight', '0010_membersublog_member_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JalaliDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('year', models.SmallIntegerField()),
+                ('month', models.SmallIntegerField()),
+                ('day', models.SmallIntegerField()),
+                ('weekday', models.SmallIntegerField()),
+                ('week_of_year', models.SmallIntegerField()),
+                ('is_holiday', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month', 'day'], name='jalaliday_ymd_idx')],
+            },
+        ),
+        migrations.RunPython(fill_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DataInsight', '0011_jalaliday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clubstats',
+            name='attendance_by_hour',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
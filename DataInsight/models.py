@@ -42,6 +42,10 @@ class ClubStats(models.Model):
     # ]
     top_attendance_hours = models.JSONField(null=True)
 
+    # Average members present in each hour of the day, over the days that hour had anyone
+    # Example format: [{"hour": 0, "avg_count": 0.0}, ..., {"hour": 18, "avg_count": 42.5}, ...]  (24 entries)
+    attendance_by_hour = models.JSONField(default=list, blank=True)
+
     # Attendance by weekday and count, stored as JSON field for flexibility
     # Example: {'Monday': 150, 'Tuesday': 130, ...}
     attendance_by_weekday = models.JSONField(null=True)
@@ -56,6 +60,9 @@ class ClubStats(models.Model):
     # Date for this stats entry
     date_recorded = models.DateField(auto_now_add=True)
 
+    # When update_info() last recomputed this entry (null: never)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"ClubStats for {self.date_recorded}"
 
@@ -65,3 +72,34 @@ class MemberSubLog(models.Model):
     end_date = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Retention reads each member's sign-ups in order
+            models.Index(fields=['member', 'created_at'], name='sublog_member_created_idx'),
+        ]
+
+
+
+class JalaliDay(models.Model):
+    """One row per Gregorian date with its Jalali parts, so queries can group by Jalali month/day in SQL."""
+    date = models.DateField(primary_key=True)
+    year = models.SmallIntegerField()
+    month = models.SmallIntegerField()
+    day = models.SmallIntegerField()
+
+    # 0 = Saturday ... 6 = Friday
+    weekday = models.SmallIntegerField()
+
+    # Weeks start on Saturday, week 1 is the one holding 1 Farvardin
+    week_of_year = models.SmallIntegerField()
+
+    # Fridays and the fixed solar holidays; lunar holidays are flagged by hand
+    is_holiday = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'month', 'day'], name='jalaliday_ymd_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d}-{self.day:02d}"
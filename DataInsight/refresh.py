@@ -0,0 +1,105 @@
+"""
+ClubStats recompute off the request path.
+
+The dashboard serves the stored ClubStats row. Once it is older than
+CLUB_STATS_TTL_SECONDS, or on ?refresh=1, a recompute starts in a
+background thread and the response doesn't wait for it; the
+refresh_club_stats command recomputes on a schedule. However many
+viewers and workers ask at once, a single recompute runs: a flag
+collapses the requests of one process, a Postgres advisory lock those of
+all processes.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ClubStats
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key held while update_info() runs
+LOCK_KEY = 0x436C7562  # 'Club'
+
+_lock = threading.Lock()
+_running = False
+
+
+def latest():
+    return ClubStats.objects.order_by('-date_recorded', '-id').first()
+
+
+def current():
+    """The ClubStats entry update_info() fills, created empty on first use."""
+    stats = latest()
+    if stats is None:
+        stats = ClubStats.objects.create(
+            active_members=0,
+            active_members_change_pct=0,
+            new_members_today=0,
+            new_members_change_pct=0,
+            avg_daily_attendance=0,
+            retention_rate_pct=0,
+            retention_change_pct=0,
+            top_sports_stats=[],
+            top_attendance_hours=[],
+            attendance_by_weekday={},
+            membership_trends={},
+            age_groups={},
+        )
+    return stats
+
+
+def is_stale(stats):
+    ttl = getattr(settings, 'CLUB_STATS_TTL_SECONDS', 300)
+    return stats is None or stats.refreshed_at is None or stats.refreshed_at < timezone.now() - timedelta(seconds=ttl)
+
+
+def refresh(wait=False):
+    """
+    Recompute ClubStats unless another process already is. With wait, block until that one is done
+    instead, and only recompute if the stats are still stale then. Returns True when this call recomputed.
+    """
+    from .views import update_info
+
+    with connection.cursor() as cursor:
+        if wait:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [LOCK_KEY])
+        else:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return False
+    try:
+        if wait and not is_stale(latest()):
+            return False
+        update_info()
+        return True
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [LOCK_KEY])
+
+
+def _run():
+    global _running
+    try:
+        refresh()
+    except Exception:
+        logger.exception("ClubStats refresh failed")
+    finally:
+        connection.close()
+        with _lock:
+            _running = False
+
+
+def refresh_async():
+    """Start a background recompute unless this process already runs one. Returns whether it started."""
+    global _running
+    with _lock:
+        if _running:
+            return False
+        _running = True
+    threading.Thread(target=_run, name='club-stats-refresh', daemon=True).start()
+    return True
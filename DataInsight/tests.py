@@ -1,3 +1,114 @@
+from datetime import date, datetime, timedelta
+
+import jdatetime
 from django.test import TestCase
+from django.utils import timezone
+
+from PaymentModule.models import Payment
+from UserModule.models import GenMember, GenPerson
+
+from . import jalali
+from .models import ClubStats, JalaliDay, MemberSubLog
+from .views import update_retention
+
+
+def loop_retention(stats):
+    # The former per-subscription computation, kept as the reference
+    expired_subs = MemberSubLog.objects.filter(end_date__lt=timezone.now())
+    retained_count = sum(
+        MemberSubLog.objects.filter(member=sub.member, created_at__gt=sub.end_date).exists()
+        for sub in expired_subs
+    )
+    total_expired = expired_subs.count()
+    stats.retention_rate_pct = int((retained_count / total_expired) * 100) if total_expired > 0 else 0
+
+    six_months_ago = timezone.now() - timedelta(days=30*6)
+    past_expired_subs = MemberSubLog.objects.filter(end_date__gte=six_months_ago, end_date__lt=timezone.now())
+    past_retained_count = sum(
+        MemberSubLog.objects.filter(member=sub.member, created_at__gt=sub.end_date).exists()
+        for sub in past_expired_subs
+    )
+    past_total = past_expired_subs.count()
+    past_avg_retention = (past_retained_count / past_total) * 100 if past_total > 0 else 0
+    stats.retention_change_pct = int(stats.retention_rate_pct - past_avg_retention)
+
+
+class RetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        members = []
+        for n in range(1, 9):
+            person = GenPerson.objects.create(id=n, full_name=f'Person {n}')
+            members.append(GenMember.objects.create(id=n, person=person))
+        # (member, created days ago, ends days ago; negative: still running)
+        subs = [
+            (0, 400, 370), (0, 365, 335), (0, 200, 170), (0, 30, -1),
+            (1, 300, 270), (1, 250, 220),
+            (2, 120, 90), (2, 60, 30), (2, 10, -20),
+            (3, 100, 70),
+            (4, 40, 10), (4, 10, 5),
+            (5, 90, 60), (5, 60, 60),
+            (6, 20, -10),
+            (None, 50, 40), (None, 30, 20),
+        ]
+        for member, created, ends in subs:
+            sub = MemberSubLog.objects.create(
+                member=members[member] if member is not None else None, end_date=now - timedelta(days=ends)
+            )
+            MemberSubLog.objects.filter(id=sub.id).update(created_at=now - timedelta(days=created))
+
+    def compute(self, update):
+        stats = ClubStats()
+        update(stats)
+        return stats.retention_rate_pct, stats.retention_change_pct
+
+    def test_matches_per_subscription_loop(self):
+        self.assertEqual(self.compute(update_retention), self.compute(loop_retention))
+        self.assertNotEqual(self.compute(update_retention), (0, 0))
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            update_retention(ClubStats())
+
+    def test_no_expired_subscriptions(self):
+        MemberSubLog.objects.all().delete()
+        self.assertEqual(self.compute(update_retention), (0, 0))
+
+
+class JalaliCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        jalali.fill(date(2025, 3, 1), date(2025, 4, 30))
+        tz = timezone.get_current_timezone()
+        # Local times around Nowruz 1404 (21 March 2025); 23:30 stays on its local day
+        for day, hour, price in [(19, 10, 5), (20, 23, 7), (21, 0, 11), (21, 23, 13), (30, 12, 17)]:
+            payment = Payment.objects.create(price=price)
+            moment = datetime(2025, 3, day, hour, 30, tzinfo=tz)
+            Payment.objects.filter(id=payment.id).update(payment_date=moment)
+
+    def test_days(self):
+        nowruz = JalaliDay.objects.get(date=date(2025, 3, 21))
+        self.assertEqual((nowruz.year, nowruz.month, nowruz.day, nowruz.week_of_year), (1404, 1, 1, 1))
+        self.assertTrue(nowruz.is_holiday)
+        for day in JalaliDay.objects.all():
+            expected = jdatetime.date.fromgregorian(date=day.date)
+            self.assertEqual((day.year, day.month, day.day, day.weekday), (
+                expected.year, expected.month, expected.day, expected.weekday()
+            ))
+
+    def test_group_by_month(self):
+        rows = jalali.group_by(
+            Payment.objects.all(), 'payment_date', total_price=('sum', 'price'), count=('count', 'id')
+        )
+        self.assertEqual(rows, [
+            {'year': 1403, 'month': 12, 'total_price': 12, 'count': 2},
+            {'year': 1404, 'month': 1, 'total_price': 41, 'count': 3},
+        ])
 
-# Create your tests here.
+    def test_period(self):
+        start, end = jalali.period(1404, 1)
+        self.assertEqual((start.date(), end.date()), (date(2025, 3, 21), date(2025, 4, 21)))
+        self.assertEqual(Payment.objects.filter(payment_date__gte=start, payment_date__lt=end).count(), 3)
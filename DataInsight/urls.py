@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ClubStatsListAPIView
+from .views import ClubStatsListAPIView, MembershipTrendsAPIView
 
 urlpatterns = [
     path('club-stats/', ClubStatsListAPIView.as_view(), name='club-stats-list'),
+    path('membership-trends/', MembershipTrendsAPIView.as_view(), name='membership-trends'),
 ]
@@ -1,18 +1,23 @@
-from rest_framework import generics
+import calendar
+import numpy as np
+from rest_framework import generics, status
 from rest_framework.response import Response
-from .models import ClubStats, MemberSubLog
+from rest_framework.views import APIView
+from . import jalali, refresh
+from .models import ClubStats, JalaliDay, MemberSubLog
 from .serializers import ClubStatsSerializer
 from UserModule.models import GenMember
-from LogModule.models import Log
+from LogModule.models import AttendanceRollup
 import jdatetime
 from django.utils import timezone
-from django.db.models import Count
-from datetime import datetime, timedelta
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractIsoWeekDay
+from datetime import date, datetime, timedelta
 from django.utils.timezone import now
 from UserModule.models import GenMember, GenPerson
 from datetime import timedelta
 from django.utils.timezone import now
-from khayyam import JalaliDate
 import jdatetime
 
 
@@ -129,121 +134,81 @@ def update_active_members(stats):
     )
 
 
-# Update average daily attendance
+# Update average daily attendance (days without entries don't count)
 def update_avg_daily_attendance(stats):
-    logs = Log.objects.order_by('entry_time').values_list('entry_time', flat=True)
-    if not logs:
-        stats.avg_daily_attendance = 0.0
-        return
-
-    day_counts = {}
-    for entry_time in logs:
-        entry_time = timezone.localtime(entry_time)
-        j_date = jdatetime.date.fromgregorian(
-            year=entry_time.year,
-            month=entry_time.month,
-            day=entry_time.day
-        )
-        day_counts[j_date] = day_counts.get(j_date, 0) + 1
-
-    stats.avg_daily_attendance = float(sum(day_counts.values()) / len(day_counts))
+    totals = AttendanceRollup.objects.filter(entries__gt=0).aggregate(
+        entries=Sum('entries'), days=Count('day', distinct=True)
+    )
+    stats.avg_daily_attendance = float(totals['entries'] / totals['days']) if totals['days'] else 0.0
 
 
 # Update retention rate and change vs last 6 months
 def update_retention(stats):
-    expired_subs = MemberSubLog.objects.filter(end_date__lt=timezone.now())
-    retained_count = sum(
-        MemberSubLog.objects.filter(member=sub.member, created_at__gt=sub.end_date).exists()
-        for sub in expired_subs
-    )
-    total_expired = expired_subs.count()
+    # A subscription that ended is retained when its member signed up again after it ended,
+    # i.e. when the member's latest sign-up is later than its end_date
+    now = timezone.now()
+    table = connection.ops.quote_name(MemberSubLog._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT count(*) FILTER (WHERE last_created > end_date),
+                   count(*),
+                   count(*) FILTER (WHERE end_date >= %(since)s AND last_created > end_date),
+                   count(*) FILTER (WHERE end_date >= %(since)s)
+            FROM (
+                SELECT end_date, max(created_at) OVER (PARTITION BY member_id) AS last_created
+                FROM {table}
+            ) AS subs
+            WHERE end_date < %(now)s
+            """,
+            {'now': now, 'since': now - timedelta(days=30*6)},
+        )
+        retained_count, total_expired, past_retained_count, past_total = cursor.fetchone()
     stats.retention_rate_pct = int((retained_count / total_expired) * 100) if total_expired > 0 else 0
 
-    six_months_ago = timezone.now() - timedelta(days=30*6)
-    past_expired_subs = MemberSubLog.objects.filter(
-        end_date__gte=six_months_ago,
-        end_date__lt=timezone.now()
-    )
-    past_retained_count = sum(
-        MemberSubLog.objects.filter(member=sub.member, created_at__gt=sub.end_date).exists()
-        for sub in past_expired_subs
-    )
-    past_total = past_expired_subs.count()
     past_avg_retention = (past_retained_count / past_total) * 100 if past_total > 0 else 0
     stats.retention_change_pct = int(stats.retention_rate_pct - past_avg_retention)
 
-# Update top 3 attendance hours with average count per day (ignoring zero days)
-def update_top_attendance_hours(stats):
-    logs = Log.objects.filter(entry_time__isnull=False, exit_time__isnull=False)
-    if not logs.exists():
-        stats.top_attendance_hours = []
-        return
-
-    from collections import defaultdict
-    import math
-
-    attendance_data = defaultdict(lambda: defaultdict(int))
-
-    for log in logs:
-        entry_jalali = jdatetime.datetime.fromgregorian(
-            datetime=timezone.localtime(log.entry_time)
-        )
-        exit_jalali = jdatetime.datetime.fromgregorian(
-            datetime=timezone.localtime(log.exit_time)
-        )
-
-        if exit_jalali <= entry_jalali:
-            continue
-
-        start_hour = math.floor(entry_jalali.hour + entry_jalali.minute / 60)
-        end_hour = math.floor(exit_jalali.hour + exit_jalali.minute / 60)
-
-        date_key = f"{entry_jalali.year}-{entry_jalali.month:02d}-{entry_jalali.day:02d}"
-
-        for hour in range(start_hour, end_hour + 1):
-            next_hour = (hour + 1) % 24
-            hour_range = f"{hour}-{next_hour}"
-            attendance_data[hour_range][date_key] += 1
+def attendance_by_hour():
+    """
+    Average number of members present in each hour of the day (index 0-23), over the days that hour had
+    anyone; hours nobody ever attended are 0. Read from the attendance rollup, a few rows per day.
+    """
+    rows = (
+        AttendanceRollup.objects.filter(present__gt=0)
+        .values('hour')
+        .annotate(present=Sum('present'), days=Count('day', distinct=True))
+        .values_list('hour', 'present', 'days')
+    )
+    hours, present, days = np.array(list(rows), dtype=np.float64).reshape(-1, 3).T
+    curve = np.zeros(24)
+    curve[hours.astype(np.intp)] = present / days
+    return curve
 
-    avg_counts = []
-    for hour_range, daily_counts in attendance_data.items():
-        non_zero_counts = list(daily_counts.values())
-        if non_zero_counts:
-            avg_count = sum(non_zero_counts) / len(non_zero_counts)
-            avg_counts.append({
-                "hour_range": hour_range,
-                "avg_count": round(avg_count, 2)
-            })
 
-    avg_counts.sort(key=lambda x: x["avg_count"], reverse=True)
-    stats.top_attendance_hours = avg_counts[:3]
+# Update the 24-hour attendance curve and the top 3 hours of it (ignoring zero days)
+def update_top_attendance_hours(stats):
+    curve = attendance_by_hour()
+    stats.attendance_by_hour = [
+        {"hour": hour, "avg_count": round(float(count), 2)} for hour, count in enumerate(curve)
+    ]
+    top = [hour for hour in np.argsort(-curve, kind='stable')[:3] if curve[hour] > 0]
+    stats.top_attendance_hours = [
+        {"hour_range": f"{hour}-{(hour + 1) % 24}", "avg_count": round(float(curve[hour]), 2)} for hour in top
+    ]
 
 
 # Update average attendance by weekday (ignoring zero days)
 def update_attendance_by_weekday(stats):
-    logs = Log.objects.filter(entry_time__isnull=False)
-    if not logs.exists():
-        stats.attendance_by_weekday = {}
-        return
-
-    from collections import defaultdict
-
-    weekday_data = defaultdict(lambda: defaultdict(int))
-
-    for log in logs:
-        local_entry = timezone.localtime(log.entry_time)
-        weekday_name = local_entry.strftime('%A')
-        date_key = local_entry.date().isoformat()
-        weekday_data[weekday_name][date_key] += 1
-
-    avg_counts = {}
-    for weekday_name, daily_counts in weekday_data.items():
-        non_zero_counts = list(daily_counts.values())
-        if non_zero_counts:
-            avg_count = sum(non_zero_counts) / len(non_zero_counts)
-            avg_counts[weekday_name] = round(avg_count, 2)
-
-    stats.attendance_by_weekday = avg_counts
+    weekdays = (
+        AttendanceRollup.objects.filter(entries__gt=0)
+        .values(weekday=ExtractIsoWeekDay('day'))
+        .annotate(entries=Sum('entries'), days=Count('day', distinct=True))
+    )
+    stats.attendance_by_weekday = {
+        calendar.day_name[row['weekday'] - 1]: round(row['entries'] / row['days'], 2)
+        for row in weekdays
+    }
 
 
 # Update members count by age groups
@@ -293,11 +258,60 @@ def update_age_groups(stats):
     stats.age_groups = age_groups_count
     stats.save()
 
+def jalali_days(first_day, last_day):
+    # Calendar rows of first_day..last_day, one per day in order
+    days = list(JalaliDay.objects.filter(date__gte=first_day, date__lte=last_day).order_by('date'))
+    if len(days) != (last_day - first_day).days + 1:
+        # Outside the stored calendar: extend it once
+        jalali.fill(first_day, last_day)
+        days = list(JalaliDay.objects.filter(date__gte=first_day, date__lte=last_day).order_by('date'))
+    return days
+
+
+def active_members_per_day(first_day, last_day):
+    """
+    Number of subscriptions active on each local day of first_day..last_day, as an array aligned with the days.
+    A subscription is active from the day it was created through the day it ends.
+    Postgres sums the +1 on each start day and -1 after each end day, clamped to the range;
+    the cumulative sum of that difference array is the count per day.
+    """
+    days = (last_day - first_day).days + 1
+    if days <= 0:
+        return np.zeros(0, dtype=np.int64)
+    tz = timezone.get_current_timezone()
+    table = connection.ops.quote_name(MemberSubLog._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH subs AS (
+                SELECT (created_at AT TIME ZONE %(tz)s)::date AS first_day,
+                       (end_date AT TIME ZONE %(tz)s)::date AS last_day
+                FROM {table}
+                WHERE end_date >= %(start)s AND created_at < %(end)s
+            )
+            SELECT day - %(first)s, sum(delta) FROM (
+                SELECT greatest(first_day, %(first)s) AS day, 1 AS delta FROM subs WHERE first_day <= last_day
+                UNION ALL
+                SELECT last_day + 1, -1 FROM subs WHERE first_day <= last_day AND last_day < %(last)s
+            ) AS changes
+            GROUP BY 1
+            """,
+            {
+                'tz': timezone.get_current_timezone_name(), 'first': first_day, 'last': last_day,
+                'start': datetime.combine(first_day, datetime.min.time(), tzinfo=tz),
+                'end': datetime.combine(last_day + timedelta(days=1), datetime.min.time(), tzinfo=tz),
+            },
+        )
+        changes = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    diff = np.zeros(days, dtype=np.int64)
+    diff[changes[:, 0]] = changes[:, 1]
+    return np.cumsum(diff)
+
+
 # Update membership trends for the last 7 months
 def update_membership_trends(stats):
     """
     Calculates the daily active members for the last 7 months and stores them in stats.membership_trends JSONField.
-    Only considers MemberSubLog entries with end_date later than 7 months ago.
     Dates are converted to Jalali months for keys in the JSON.
     Format:
     {
@@ -309,30 +323,11 @@ def update_membership_trends(stats):
     today = now().date()
     seven_months_ago = today - timedelta(days=30*7)  # approximate 7 months
 
-    # Filter relevant MemberSubLogs
-    recent_logs = MemberSubLog.objects.filter(end_date__gte=seven_months_ago)
-
+    days = jalali_days(seven_months_ago, today)
     trends = {}
-
-    current_day = seven_months_ago
-    while current_day <= today:
-        # Convert current day to Jalali
-        j_date = JalaliDate(current_day)
-        month = str(j_date.month)
-        day = str(j_date.day)
-
-        # Count active members on this day
-        active_count = recent_logs.filter(
-            created_at__date__lte=current_day,
-            end_date__date__gte=current_day
-        ).count()
-
+    for j_date, active_count in zip(days, active_members_per_day(seven_months_ago, today).tolist()):
         if active_count > 0:
-            if month not in trends:
-                trends[month] = {}
-            trends[month][day] = active_count
-
-        current_day += timedelta(days=1)
+            trends.setdefault(str(j_date.month), {})[str(j_date.day)] = active_count
 
     # Save to stats
     stats.membership_trends = trends
@@ -341,7 +336,7 @@ def update_membership_trends(stats):
 
 # Main update function
 def update_info():
-    stats = ClubStats.objects.latest('date_recorded')
+    stats = refresh.current()
 
     update_new_members(stats)
     update_active_members(stats)
@@ -353,6 +348,7 @@ def update_info():
     update_age_groups(stats)
     update_membership_trends(stats)
 
+    stats.refreshed_at = timezone.now()
     stats.save()
 
 
@@ -362,25 +358,44 @@ class ClubStatsListAPIView(generics.ListAPIView):
     serializer_class = ClubStatsSerializer
 
     def list(self, request, *args, **kwargs):
-        if not ClubStats.objects.exists():
-            # Initialize empty stats if none exist
-            new_stats = ClubStats(
-                active_members=0,
-                active_members_change_pct=0,
-                new_members_today=0,
-                new_members_change_pct=0,
-                avg_daily_attendance=0,
-                retention_rate_pct=0,
-                retention_change_pct=0,
-                top_sports_stats=[],
-                attendance_by_weekday={},
-                membership_trends={},
-                age_groups={},
-            )
-            new_stats.save()
-
-        update_info()
+        stats = refresh.latest()
+        if stats is None or stats.refreshed_at is None:
+            # Nothing computed yet: the first viewer waits, concurrent ones wait for the same run
+            refresh.refresh(wait=True)
+        elif request.query_params.get('refresh') == '1' or refresh.is_stale(stats):
+            # Served as stored; the recompute runs in the background
+            refresh.refresh_async()
 
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+
+
+class MembershipTrendsAPIView(APIView):
+    """Active members per day over ?start=YYYY-MM-DD..?end=YYYY-MM-DD (both inclusive, default: the last 7 months)."""
+    MAX_DAYS = 3660
+
+    def get(self, request):
+        try:
+            end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else now().date()
+            start = (
+                date.fromisoformat(request.query_params['start']) if 'start' in request.query_params
+                else end - timedelta(days=30*7)
+            )
+        except ValueError:
+            return Response({'error': 'Invalid date format for start or end. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': 'start must not be after end.'}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= self.MAX_DAYS:
+            return Response({'error': f'At most {self.MAX_DAYS} days per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        days = jalali_days(start, end)
+        counts = active_members_per_day(start, end).tolist()
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'items': [
+                {'date': day.date.isoformat(), 'jalali_date': str(day), 'active': active}
+                for day, active in zip(days, counts)
+            ],
+        })
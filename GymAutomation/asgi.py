@@ -4,3 +4,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'GymAutomation.settings')
 
 application = get_asgi_application()
+
+# Build the biometric galleries before the first gate scan arrives
+from UserModule.face_index import face_index  # noqa: E402
+from UserModule.fingerprint_index import fingerprint_index  # noqa: E402
+from UserModule.fingerprint_matcher import fingerprint_matcher  # noqa: E402
+
+fingerprint_index.warm_up()
+fingerprint_matcher.warm_up()
+face_index.warm_up()
@@ -0,0 +1,194 @@
+"""
+Shared pagination for the list endpoints.
+
+Query parameters understood by every paginated endpoint:
+
+    limit   page size (default 10)
+    page    1-based page number, OFFSET pagination as before
+    cursor  opaque cursor from a previous response's next_cursor; seeks
+            straight past the last row through the ordering's index, so a
+            deep page costs the same as the first one
+    count   exact | estimate | none, how total_items is computed.
+            estimate answers from pg_class.reltuples (unfiltered lists,
+            summed over the leaf partitions of a partitioned table) or
+            the planner's row estimate (filtered ones) and falls back to
+            an exact COUNT(*) below PAGINATION_EXACT_COUNT_BELOW rows
+
+Endpoints keep their own response keys and add next_cursor (None on the
+last page) and total_items_estimated.
+"""
+import base64
+import datetime
+import json
+from math import ceil
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import F, Q
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+class Page:
+    def __init__(self, items, number, limit, total_items, estimated, next_cursor, empty_pages):
+        self.items = items
+        self.number = number
+        self.limit = limit
+        self.total_items = total_items
+        self.estimated = estimated
+        self.next_cursor = next_cursor
+        self._empty_pages = empty_pages
+
+    @property
+    def total_pages(self):
+        if self.total_items is None:
+            return None
+        if not self.total_items:
+            return self._empty_pages
+        return ceil(self.total_items / self.limit)
+
+
+def _parse_ordering(model, ordering):
+    fields = []
+    for name in ordering:
+        descending = name.startswith('-')
+        fields.append((model._meta.get_field(name.lstrip('-')), descending))
+    return fields
+
+
+def _order_by(fields):
+    expressions = []
+    for field, descending in fields:
+        expression = F(field.name)
+        # Keep NULLs after every value in both directions so the seek filter stays simple
+        if field.null:
+            expressions.append(expression.desc(nulls_last=True) if descending else expression.asc(nulls_last=True))
+        else:
+            expressions.append(expression.desc() if descending else expression.asc())
+    return expressions
+
+
+def _seek_filter(fields, values):
+    """Rows strictly after `values` in (fields) order, NULLs last."""
+    (field, descending), value = fields[0], values[0]
+    rest = _seek_filter(fields[1:], values[1:]) if len(fields) > 1 else None
+    if value is None:
+        # Only other NULLs can follow a NULL
+        return Q(**{f'{field.name}__isnull': True}) & rest if rest is not None else Q(pk__in=[])
+    after = Q(**{f"{field.name}__{'lt' if descending else 'gt'}": value})
+    if field.null:
+        after |= Q(**{f'{field.name}__isnull': True})
+    if rest is not None:
+        after |= Q(**{field.name: value}) & rest
+    return after
+
+
+def _cursor_value(value):
+    # Full precision: a truncated timestamp would skip or repeat rows at the page boundary
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(row, fields, ordering, number):
+    values = [row[field.name] if isinstance(row, dict) else getattr(row, field.attname) for field, _ in fields]
+    position = {'o': list(ordering), 'v': values, 'p': number}
+    raw = json.dumps(position, default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields, ordering):
+    """Cursor -> (ordering values of the last row served, page number it leads to)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+        if position['o'] != list(ordering) or len(position['v']) != len(fields):
+            raise ValueError
+        values = [
+            None if value is None else field.to_python(value)
+            for (field, _), value in zip(fields, position['v'])
+        ]
+        return values, int(position['p'])
+    except (ValueError, KeyError, TypeError, DjangoValidationError):
+        raise InvalidPage('Invalid cursor')
+
+
+def estimate_count(queryset):
+    """Planner's row estimate for the queryset, or None when there isn't a usable one."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            # A partitioned parent is never analyzed by autovacuum; its rows are the sum of its leaf partitions
+            cursor.execute(
+                "SELECT CASE WHEN parent.relkind = 'p' THEN ("
+                "SELECT SUM(GREATEST(leaf.reltuples, 0)) FROM pg_partition_tree(parent.oid) tree "
+                "JOIN pg_class leaf ON leaf.oid = tree.relid WHERE tree.isleaf"
+                ") ELSE parent.reltuples END FROM pg_class parent WHERE parent.oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+            # -1 (or 0 right after creation) means the table was never analyzed
+            if row and row[0] is not None and row[0] > 0:
+                return int(row[0])
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, mode):
+    """(total_items, estimated) for the count mode."""
+    if mode == 'none':
+        return None, False
+    if mode == 'estimate':
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate >= getattr(settings, 'PAGINATION_EXACT_COUNT_BELOW', 10000):
+            return estimate, True
+    return queryset.count(), False
+
+
+def paginate(request, queryset, ordering, empty_pages=0):
+    """
+    One page of queryset ordered by `ordering` (model field names, '-' for
+    descending, ending with a unique field such as id).
+    Raises InvalidPage for bad page/limit/count/cursor parameters.
+    """
+    params = request.query_params
+    try:
+        number = int(params.get('page', 1))
+        limit = int(params.get('limit', 10))
+        if number < 1 or limit < 1:
+            raise ValueError
+    except ValueError:
+        raise InvalidPage('Invalid pagination parameters')
+    mode = params.get('count', getattr(settings, 'PAGINATION_COUNT_MODE', 'exact'))
+    if mode not in COUNT_MODES:
+        raise InvalidPage('Invalid count value. Use exact, estimate or none.')
+
+    fields = _parse_ordering(queryset.model, ordering)
+    queryset = queryset.order_by(*_order_by(fields))
+    total_items, estimated = count_rows(queryset, mode)
+
+    cursor = params.get('cursor')
+    if cursor:
+        values, number = decode_cursor(cursor, fields, ordering)
+        rows = list(queryset.filter(_seek_filter(fields, values))[:limit + 1])
+    else:
+        start = (number - 1) * limit
+        rows = list(queryset[start:start + limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], fields, ordering, number + 1)
+    return Page(rows, number, limit, total_items, estimated, next_cursor, empty_pages)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'UserModule',
     'PaymentModule',
     'LogModule',
@@ -157,4 +158,88 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 MEDIA_URL = 'Media/'
-MEDIA_ROOT = BASE_DIR / 'Media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'Media'
+
+# Fingerprint template index
+# How often (seconds) a lookup pulls templates changed or cleared by other workers
+FINGERPRINT_INDEX_REFRESH_SECONDS = 5
+
+# Fuzzy 1:N fingerprint matcher
+# Templates are padded/truncated to this many bytes (rounded up to a multiple of 8)
+FINGERPRINT_TEMPLATE_BYTES = 512
+# Shorter templates (and pairs sharing fewer bytes) are too short to score
+FINGERPRINT_MIN_TEMPLATE_BYTES = 64
+# Minimum bit similarity (0..1) for a candidate to count as a match
+FINGERPRINT_MATCH_THRESHOLD = 0.8
+FINGERPRINT_MATCH_TOP_K = 5
+# Above this many templates the gallery is scored in a process pool (0/1 workers disables it)
+FINGERPRINT_MATCHER_WORKERS = 0
+FINGERPRINT_MATCHER_POOL_MIN_ROWS = 200000
+
+# Face identification
+# Face templates are float32 embeddings of this many dimensions
+FACE_EMBEDDING_DIM = 512
+# Minimum cosine similarity for a face match
+FACE_MATCH_THRESHOLD = 0.6
+FACE_MATCH_TOP_K = 5
+# IVF coarse bucketing kicks in at this many members; 0 lists = sqrt(templates)
+FACE_INDEX_IVF_MIN_MEMBERS = 50000
+FACE_INDEX_IVF_LISTS = 0
+FACE_INDEX_IVF_PROBES = 8
+
+# Incremental template sync for gate devices
+# Changes younger than this are held back so late-committing writes aren't skipped
+# (the in-process template indexes also re-read this far back on every refresh)
+FINGERPRINT_SYNC_LAG_SECONDS = 2
+FINGERPRINT_SYNC_MAX_LIMIT = 5000
+
+# Primary key allocation for the UserModule tables
+# Ids reserved per worker process at a time (1 = one nextval per insert)
+# Above 1, explicit ids must be above every id the sequence has handed out
+ID_ALLOCATOR_BLOCK_SIZE = 1
+
+# Batch create/update on api/dynamic/ (JSON array bodies)
+DYNAMIC_BULK_MAX_ROWS = 1000
+
+# List pagination (GymAutomation/pagination.py)
+# Default for ?count=: exact | estimate | none
+PAGINATION_COUNT_MODE = 'estimate'
+# Estimated totals below this are replaced by an exact COUNT(*)
+PAGINATION_EXACT_COUNT_BELOW = 10000
+
+# Person name search (pg_trgm)
+# Minimum trigram word similarity (0..1) for a fuzzy name match
+PERSON_SEARCH_MIN_SIMILARITY = 0.5
+PERSON_SEARCH_MAX_LIMIT = 100
+
+# Person photos, content-addressed under MEDIA_ROOT / PERSON_MEDIA_DIR
+PERSON_MEDIA_DIR = 'persons'
+# Resized AVIF/WebP renditions: name -> longest edge in pixels
+PERSON_RENDITION_SIZES = {'avatar': 80, 'card': 320, 'full': 1024}
+PERSON_RENDITION_QUALITY = 60
+# Threads building renditions in each web worker
+PERSON_RENDITION_WORKERS = 2
+
+# Presence event stream (api/logs/stream/)
+# Events a slow client may have queued before it is disconnected (it resumes via Last-Event-ID)
+PRESENCE_STREAM_QUEUE_SIZE = 256
+PRESENCE_STREAM_HEARTBEAT_SECONDS = 15
+PRESENCE_STREAM_RETRY_MS = 3000
+PRESENCE_STREAM_REPLAY_LIMIT = 1000
+# Longest a check-in transaction may take to commit after writing its event
+PRESENCE_STREAM_SETTLE_SECONDS = 5
+PRESENCE_EVENT_RETENTION_HOURS = 24
+
+# Log table partitioning (LogModule/partitions.py)
+# Monthly partitions kept ready past the current month
+LOG_PARTITION_MONTHS_AHEAD = 3
+# archive_log_partitions detaches months older than this and writes them here as .csv.gz
+LOG_ARCHIVE_AFTER_MONTHS = 12
+LOG_ARCHIVE_DIR = BASE_DIR / 'archive' / 'logs'
+
+# Offline gate buffer ingest (api/logs/ingest/)
+LOG_INGEST_MAX_EVENTS = 1000
+
+# Dashboard stats (api/dataInsight/club-stats/), recomputed in the background or by refresh_club_stats
+# Older stats are served as they are while a recompute runs
+CLUB_STATS_TTL_SECONDS = 300
\ No newline at end of file
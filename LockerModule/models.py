@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from UserModule.models import GenPerson
 
 class Locker(models.Model):
@@ -13,7 +13,16 @@ class Locker(models.Model):
     full_name = models.CharField(max_length=200, null=True, blank=True)
     number = models.IntegerField(null=True, blank=True)
     locker_place = models.ForeignKey('Saloon', on_delete=models.SET_NULL, null=True, blank=True)
-    
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._original_user_id = self.user_id  # locker assignment events compare against this
+
+    def save(self, *args, **kwargs):
+        # post_save receivers (presence events) commit together with the locker
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._original_user_id = self.user_id
 
 
     def __str__(self):
@@ -2,9 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Q
+from GymAutomation.pagination import InvalidPage, paginate
 from .models import Locker, Saloon
 from .serializers import LockerSerializer, SaloonSerializer
-import math
 
 class LockerAPIView(APIView):
     def get(self, request):
@@ -29,24 +29,17 @@ class LockerAPIView(APIView):
         lockers = Locker.objects.filter(filters)
 
         try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-            if page < 1 or limit < 1:
-                raise ValueError
-        except ValueError:
-            return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_items = lockers.count()
-        total_pages = math.ceil(total_items / limit)
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_lockers = lockers[start:end]
-
-        serializer = LockerSerializer(paginated_lockers, many=True)
+            page = paginate(request, lockers, ['id'])
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = LockerSerializer(page.items, many=True)
         return Response({
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
+            'total_items': page.total_items,
+            'total_pages': page.total_pages,
+            'current_page': page.number,
+            'next_cursor': page.next_cursor,
+            'total_items_estimated': page.estimated,
             'data': serializer.data
         })
 
@@ -183,23 +176,13 @@ class SaloonAPIView(APIView):
 
         # Pagination fallback
         try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-            if page < 1 or limit < 1:
-                raise ValueError
-        except ValueError:
-            return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
-
-        saloons = Saloon.objects.all()
-        total_items = saloons.count()
-        total_pages = math.ceil(total_items / limit)
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_saloons = saloons[start:end]
+            page = paginate(request, Saloon.objects.all(), ['id'])
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         # Serialize saloons with lockers
         data = []
-        for saloon in paginated_saloons:
+        for saloon in page.items:
             lockers = Locker.objects.filter(locker_place=saloon)
             locker_serializer = LockerSerializer(lockers, many=True)
             data.append({
@@ -209,9 +192,11 @@ class SaloonAPIView(APIView):
             })
 
         return Response({
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
+            'total_items': page.total_items,
+            'total_pages': page.total_pages,
+            'current_page': page.number,
+            'next_cursor': page.next_cursor,
+            'total_items_estimated': page.estimated,
             'data': data
         })
 
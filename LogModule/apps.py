@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LogmoduleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LogModule'
+
+    def ready(self):
+        from . import partitions, signals  # noqa: F401
+
+        # Every deploy tops up the month partitions ahead
+        post_migrate.connect(partitions.ensure_on_migrate, sender=self)
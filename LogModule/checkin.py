@@ -0,0 +1,91 @@
+"""
+Gate check-in as a single statement.
+
+One CTE decrements the member's session_left under the row lock (so two
+readers checking the same member in at once each spend their own
+session), inserts the Log row, bumps the saloon's presence counter and
+attendance rollup, queues the check-in event for the presence stream
+and reads back everything the gate screen shows: person, role, sport
+and current locker. A lone statement runs in its own transaction, so
+the whole check-in costs one round-trip.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from LockerModule.models import Locker
+from UserModule.models import GenMember, GenPerson, GenPersonRole, Sport
+
+from . import rollup
+from .models import Log, PresenceCounter, PresenceEvent
+from .presence import NO_SALOON
+
+_COLUMNS = (
+    'id', 'user', 'saloon', 'is_online', 'entry_time', 'exit_time', 'session_left', 'end_date',
+    'person_id', 'full_name', 'person_image_ref', 'thumbnail_ref', 'role', 'sport', 'locker_number',
+)
+
+
+def _sql():
+    table = lambda model: connection.ops.quote_name(model._meta.db_table)
+    new_log = (
+        "(SELECT entry_time, exit_time, saloon_id, true AS opened, NOT is_online AS closed, "
+        "NOT is_online AS visited FROM log) AS logs"
+    )
+    return f"""
+        WITH member AS (
+            UPDATE {table(GenMember)}
+            SET session_left = CASE WHEN session_left > 0 THEN session_left - 1 END,
+                last_change_datetime = %(now)s
+            WHERE id = %(member)s
+            RETURNING id, person_id, role_id, sport_id, session_left, end_date
+        ), log AS (
+            INSERT INTO {table(Log)} (user_id, saloon_id, full_name, is_online, entry_time, exit_time)
+            SELECT id, %(saloon)s, NULL, %(is_online)s, %(now)s,
+                   CASE WHEN %(is_online)s THEN %(exit_time)s ELSE coalesce(%(exit_time)s, %(now)s) END
+            FROM member
+            RETURNING id, user_id, saloon_id, is_online, entry_time, exit_time
+        ), presence AS (
+            INSERT INTO {table(PresenceCounter)} (saloon_id, online)
+            SELECT coalesce(saloon_id, {NO_SALOON}), 1 FROM log WHERE is_online
+            ON CONFLICT (saloon_id) DO UPDATE SET online = {table(PresenceCounter)}.online + 1
+            RETURNING saloon_id, online
+        ), rollup AS (
+            {rollup.upsert_sql(new_log, 'presence')}
+        ), event AS (
+            INSERT INTO {table(PresenceEvent)} (kind, payload, created_at)
+            SELECT '{PresenceEvent.CHECK_IN}', jsonb_build_object(
+                       'log_id', log.id, 'member_id', log.user_id, 'person_id', member.person_id,
+                       'full_name', (SELECT full_name FROM {table(GenPerson)} WHERE id = member.person_id),
+                       'saloon', log.saloon_id, 'entry_time', log.entry_time, 'exit_time', log.exit_time
+                   ), %(now)s
+            FROM log JOIN member ON member.id = log.user_id
+            WHERE log.is_online
+        )
+        SELECT log.id, log.user_id, log.saloon_id, log.is_online, log.entry_time, log.exit_time,
+               member.session_left, member.end_date,
+               person.id, person.full_name, person.person_image_ref, person.thumbnail_ref,
+               role.role_desc, sport.name,
+               (SELECT locker.number FROM {table(Locker)} locker
+                WHERE locker.user_id = person.id ORDER BY locker.id DESC LIMIT 1)
+        FROM log
+        JOIN member ON member.id = log.user_id
+        LEFT JOIN {table(GenPerson)} person ON person.id = member.person_id
+        LEFT JOIN {table(GenPersonRole)} role ON role.id = member.role_id
+        LEFT JOIN {table(Sport)} sport ON sport.id = member.sport_id
+    """
+
+
+def check_in(member_id, is_online=True, exit_time=None, saloon_id=None):
+    """
+    Spend one session of the member and log the entry.
+    Returns the enriched log row as a dict, or None when the member doesn't exist.
+    session_left follows GenMember's rules: counts down to 0, then becomes NULL; NULL stays NULL.
+    """
+    params = {
+        'member': member_id, 'saloon': saloon_id, 'is_online': is_online, 'exit_time': exit_time,
+        'now': timezone.now(), 'tz': timezone.get_current_timezone_name(),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(_sql(), params)
+        row = cursor.fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
@@ -0,0 +1,94 @@
+"""
+Closing-time checkout as a single statement.
+
+One CTE closes every open log (or those of one saloon), releases the
+non-VIP lockers held by their persons, takes the closed logs off the
+presence counters, adds them to the attendance rollup and queues the
+check-out and locker events for the presence stream, in place of one
+Log.save() and Locker.save() per member. A lone statement runs in its own transaction, so a closing
+checkout either happens entirely or not at all.
+"""
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from LockerModule.models import Locker
+from UserModule.models import GenMember, GenPerson
+
+from . import rollup
+from .models import Log, PresenceCounter, PresenceEvent
+from .presence import NO_SALOON
+
+
+def _sql(by_saloon):
+    table = lambda model: connection.ops.quote_name(model._meta.db_table)
+    closed_logs = (
+        "(SELECT entry_time, exit_time, saloon_id, false AS opened, true AS closed, true AS visited "
+        "FROM closed) AS logs"
+    )
+    # The closing hour's peak is the count just before everyone left
+    peaks = (
+        f"(SELECT presence.saloon_id, presence.online + left_count.members AS online FROM presence "
+        f"JOIN (SELECT coalesce(saloon_id, {NO_SALOON}) AS saloon_id, count(*) AS members "
+        f"FROM closed GROUP BY 1) AS left_count USING (saloon_id)) AS peaks"
+    )
+    return f"""
+        WITH closed AS (
+            UPDATE {table(Log)}
+            SET is_online = false, exit_time = coalesce(exit_time, %(now)s)
+            WHERE is_online {'AND saloon_id = %(saloon)s' if by_saloon else ''}
+            RETURNING id, user_id, saloon_id, full_name, entry_time, exit_time
+        ), persons AS (
+            SELECT DISTINCT member.person_id AS id
+            FROM closed JOIN {table(GenMember)} member ON member.id = closed.user_id
+            WHERE member.person_id IS NOT NULL
+        ), released AS (
+            UPDATE {table(Locker)} locker SET user_id = NULL
+            FROM persons
+            WHERE locker.user_id = persons.id AND NOT locker.is_vip
+            RETURNING locker.id, locker.number, locker.locker_place_id, persons.id AS person_id
+        ), presence AS (
+            INSERT INTO {table(PresenceCounter)} (saloon_id, online)
+            SELECT coalesce(saloon_id, {NO_SALOON}), -count(*) FROM closed GROUP BY 1
+            ON CONFLICT (saloon_id) DO UPDATE SET online = {table(PresenceCounter)}.online + EXCLUDED.online
+            RETURNING saloon_id, online
+        ), rollup AS (
+            {rollup.upsert_sql(closed_logs, peaks)}
+        ), checkout_events AS (
+            INSERT INTO {table(PresenceEvent)} (kind, payload, created_at)
+            SELECT '{PresenceEvent.CHECK_OUT}', jsonb_build_object(
+                       'log_id', closed.id, 'member_id', closed.user_id, 'person_id', person.id,
+                       'full_name', coalesce(person.full_name, closed.full_name),
+                       'saloon', closed.saloon_id, 'entry_time', closed.entry_time, 'exit_time', closed.exit_time
+                   ), %(now)s
+            FROM closed
+            JOIN {table(GenMember)} member ON member.id = closed.user_id
+            LEFT JOIN {table(GenPerson)} person ON person.id = member.person_id
+        ), locker_events AS (
+            INSERT INTO {table(PresenceEvent)} (kind, payload, created_at)
+            SELECT '{PresenceEvent.LOCKER_RELEASED}', jsonb_build_object(
+                       'locker_id', id, 'number', number, 'saloon', locker_place_id,
+                       'person_id', NULL, 'previous_person_id', person_id
+                   ), %(now)s
+            FROM released
+        )
+        SELECT (SELECT count(*) FROM closed), (SELECT count(*) FROM released)
+    """
+
+
+def check_out_all(saloon_id=None):
+    """
+    Check out every online log, or only those of saloon_id, and release the non-VIP lockers of their persons.
+    Returns {'checked_out', 'lockers_released', 'duration_ms'}.
+    """
+    started = time.monotonic()
+    params = {'saloon': saloon_id, 'now': timezone.now(), 'tz': timezone.get_current_timezone_name()}
+    with connection.cursor() as cursor:
+        cursor.execute(_sql(saloon_id is not None), params)
+        checked_out, released = cursor.fetchone()
+    return {
+        'checked_out': checked_out,
+        'lockers_released': released,
+        'duration_ms': round((time.monotonic() - started) * 1000, 1),
+    }
@@ -0,0 +1,140 @@
+"""
+Batch ingest of the entries and exits a gate buffered while offline.
+
+Every event carries a key generated by the device and the time it
+happened at the gate. Keys the device already sent are found in one
+indexed lookup and skipped, so a batch retried after a lost response
+changes nothing the second time. The rest are applied in time order:
+an entry spends one of the member's sessions like a live check-in and
+becomes a new log (one bulk_create for the batch); an exit closes the
+member's open log, from this batch or already stored, and releases
+their non-VIP lockers the way Log.save() does.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from LockerModule.models import Locker
+from UserModule.models import GenMember
+
+from . import presence, rollup
+from .models import Log, LogIngestKey, PresenceEvent
+
+ENTRY = 'entry'
+EXIT = 'exit'
+
+
+def _spend(session_left):
+    # GenMember's rule: counts down to 0, then becomes NULL; NULL stays NULL
+    return session_left - 1 if session_left is not None and session_left > 0 else None
+
+
+def ingest(device, events):
+    """
+    Apply a gate's buffered events; each is a dict with key, type (entry/exit), user, time and saloon.
+    Returns {key: result} where result['status'] is created, closed, duplicate, unknown_user or no_open_log.
+    Raises IntegrityError when the same keys are being ingested concurrently; retrying is safe.
+    """
+    now = timezone.now()
+    results = {}
+    with transaction.atomic():
+        # Keys already ingested are dropped here, repeats inside the batch share the first one's result
+        stored = dict(
+            LogIngestKey.objects.filter(device=device, key__in={event['key'] for event in events})
+            .values_list('key', 'log_id')
+        )
+        fresh, keys = [], set(stored)
+        for event in sorted(events, key=lambda event: event['time']):
+            if event['key'] not in keys:
+                keys.add(event['key'])
+                fresh.append(event)
+
+        # Locked in id order, so concurrent batches for the same members queue up instead of deadlocking
+        members = {
+            member.id: member for member in
+            GenMember.objects.select_for_update(of=('self',)).select_related('person')
+            .filter(id__in={event['user'] for event in fresh}).order_by('id')
+            .only('id', 'session_left', 'person__id', 'person__full_name')
+        }
+        open_logs = {}
+        exit_members = {event['user'] for event in fresh if event['type'] == EXIT}
+        stored_logs = (
+            Log.objects.select_for_update()
+            .filter(user_id__in=exit_members, is_online=True).order_by('entry_time', 'id')
+        )
+        for log in stored_logs:
+            open_logs[log.user_id] = log  # latest wins
+
+        created, closed, spent, logs = [], [], {}, {}
+        for event in fresh:
+            key, member = event['key'], members.get(event['user'])
+            if member is None:
+                results[key] = {'status': 'unknown_user', 'log_id': None}
+                continue
+            if event['type'] == ENTRY:
+                member.session_left = _spend(member.session_left)
+                spent[member.id] = member
+                log = Log(user=member, saloon_id=event.get('saloon'), is_online=True, entry_time=event['time'])
+                created.append(log)
+                open_logs[member.id] = log
+                results[key] = {'status': 'created', 'session_left': member.session_left}
+            else:
+                log = open_logs.pop(member.id, None)
+                if log is None:
+                    results[key] = {'status': 'no_open_log', 'log_id': None}
+                    continue
+                log.is_online = False
+                log.exit_time = event['time']
+                if log.pk:
+                    closed.append(log)
+                results[key] = {'status': 'closed'}
+            logs[key] = log
+
+        Log.objects.bulk_create(created)
+        Log.objects.bulk_update(closed, ['is_online', 'exit_time'])
+        for member in spent.values():
+            member.last_change_datetime = now
+        GenMember.objects.bulk_update(spent.values(), ['session_left', 'last_change_datetime'])
+
+        # An entry and exit in the same batch happened while offline and never showed as present
+        deltas = Counter()
+        outbox = []
+        for log in created:
+            if log.is_online:
+                deltas[presence.saloon_key(log.saloon_id)] += 1
+                payload = log.presence_payload(log.user.person)
+                outbox.append(PresenceEvent(kind=PresenceEvent.CHECK_IN, payload=payload, created_at=now))
+        for log in closed:
+            deltas[presence.saloon_key(log.saloon_id)] -= 1
+            payload = log.presence_payload(members[log.user_id].person)
+            outbox.append(PresenceEvent(kind=PresenceEvent.CHECK_OUT, payload=payload, created_at=now))
+        peaks = presence.adjust(deltas)
+        rollup.record(created, [log for log in logs.values() if not log.is_online], peaks)
+
+        left = {members[log.user_id].person_id for log in logs.values() if not log.is_online} - {None}
+        lockers = list(
+            Locker.objects.select_for_update().filter(user_id__in=left, is_vip=False)
+            .values_list('id', 'number', 'locker_place_id', 'user_id')
+        )
+        if lockers:
+            Locker.objects.filter(id__in=[locker[0] for locker in lockers]).update(user=None)
+        outbox += [
+            PresenceEvent(kind=PresenceEvent.LOCKER_RELEASED, created_at=now, payload={
+                'locker_id': locker_id, 'number': number, 'saloon': saloon_id,
+                'person_id': None, 'previous_person_id': person_id,
+            })
+            for locker_id, number, saloon_id, person_id in lockers
+        ]
+        PresenceEvent.objects.bulk_create(outbox)
+
+        for key, log in logs.items():
+            results[key]['log_id'] = log.pk
+        LogIngestKey.objects.bulk_create([
+            LogIngestKey(device=device, key=key, log_id=result['log_id'], created_at=now)
+            for key, result in results.items()
+        ])
+
+    for key, log_id in stored.items():
+        results[key] = {'status': 'duplicate', 'log_id': log_id}
+    return results
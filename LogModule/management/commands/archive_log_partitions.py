@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from LogModule import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Detach Log partitions older than the archive horizon, export them gzipped to LOG_ARCHIVE_DIR '
+        'and drop them. Restore a month with: COPY "<partition>" FROM PROGRAM \'gunzip -c <file>\' '
+        'WITH (FORMAT csv, HEADER) into a table created LIKE "LogModule_log", then attach it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-months', type=int, default=None,
+                            help='Archive months that ended this many months ago (default LOG_ARCHIVE_AFTER_MONTHS)')
+        parser.add_argument('--dir', default=None, help='Archive directory (default LOG_ARCHIVE_DIR)')
+        parser.add_argument('--keep-table', action='store_true',
+                            help='Leave the detached partition in the database as a standalone table')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def handle(self, *args, **options):
+        archived = partitions.archive_partitions(
+            options['older_than_months'], options['dir'], keep_table=options['keep_table'],
+        )
+        for name, rows in archived:
+            self.log(f"archived {name} ({rows} logs)")
+        self.log(f"{len(archived)} partitions archived")
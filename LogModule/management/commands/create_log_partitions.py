@@ -0,0 +1,31 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from LogModule import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly Log partitions ahead of time (also runs after every migrate).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='Months to create past the current one (default LOG_PARTITION_MONTHS_AHEAD)')
+        parser.add_argument('--every', type=int, default=0, help='Keep running, checking every N seconds')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def ensure(self, months_ahead):
+        created = partitions.ensure_partitions(months_ahead)
+        for name in created:
+            self.log(f"created {name}")
+        self.log(f"{len(created)} partitions created")
+
+    def handle(self, *args, **options):
+        self.ensure(options['months_ahead'])
+        while options['every']:
+            time.sleep(options['every'])
+            self.ensure(options['months_ahead'])
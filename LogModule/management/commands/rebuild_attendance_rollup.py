@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from LogModule import rollup
+from LogModule.models import Log
+
+
+class Command(BaseCommand):
+    help = 'Recompute the attendance rollup from Log (one-time backfill, or repair of a date range).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day, YYYY-MM-DD (default: the first log)')
+        parser.add_argument('--until', help='Last day, YYYY-MM-DD (default: today)')
+        parser.add_argument('--days', type=int, default=31, help='Days rebuilt per transaction')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def parse_day(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid date: {value}")
+
+    def handle(self, *args, **options):
+        until = self.parse_day(options['until']) if options['until'] else timezone.localdate()
+        if options['since']:
+            since = self.parse_day(options['since'])
+        else:
+            first = Log.objects.aggregate(first=Min('entry_time'))['first']
+            if first is None:
+                self.log("No logs, nothing to rebuild")
+                return
+            since = timezone.localtime(first).date()
+
+        rows = 0
+        day = since
+        while day <= until:
+            last = min(day + timedelta(days=options['days'] - 1), until)
+            written = rollup.rebuild(day, last)
+            rows += written
+            self.log(f"{day} .. {last}: {written} rows")
+            day = last + timedelta(days=1)
+        self.log(f"{rows} rollup rows for {since} .. {until}")
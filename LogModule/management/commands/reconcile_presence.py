@@ -0,0 +1,31 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from LogModule import presence
+
+
+class Command(BaseCommand):
+    help = 'Recount online logs per saloon and correct drift in the presence counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0, help='Keep running, reconciling every N seconds')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def reconcile(self):
+        drift = presence.reconcile()
+        for key, (counted, recorded) in sorted(drift.items()):
+            saloon = 'no saloon' if key == presence.NO_SALOON else f"saloon {key}"
+            self.log(f"{saloon}: counter was {recorded}, {counted} online")
+        total, _ = presence.online_counts()
+        self.log(f"{total} members online, {len(drift)} counters corrected")
+
+    def handle(self, *args, **options):
+        self.reconcile()
+        while options['every']:
+            time.sleep(options['every'])
+            self.reconcile()
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_online(apps, schema_editor):
+    Log = apps.get_model('LogModule', 'Log')
+    PresenceCounter = apps.get_model('LogModule', 'PresenceCounter')
+    # Every existing log has no saloon yet
+    online = Log.objects.filter(is_online=True).count()
+    PresenceCounter.objects.create(saloon_id=0, online=online)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LockerModule', '0007_locker_is_broken'),
+        ('LogModule', '0003_alter_log_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenceCounter',
+            fields=[
+                ('saloon_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('online', models.IntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='saloon',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='LockerModule.saloon'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(condition=models.Q(('is_online', True)), fields=['saloon'], name='log_online_saloon_idx'),
+        ),
+        migrations.RunPython(count_online, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:59
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+# One notification per committing transaction wakes the stream listeners (LogModule/stream.py)
+NOTIFY_TRIGGER = """
+CREATE FUNCTION logmodule_presence_event_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('presence_events', '');
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER presence_event_notify
+AFTER INSERT ON "LogModule_presenceevent"
+FOR EACH STATEMENT EXECUTE FUNCTION logmodule_presence_event_notify();
+"""
+
+DROP_NOTIFY_TRIGGER = """
+DROP TRIGGER IF EXISTS presence_event_notify ON "LogModule_presenceevent";
+DROP FUNCTION IF EXISTS logmodule_presence_event_notify();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LogModule', '0004_presence_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunSQL(NOTIFY_TRIGGER, DROP_NOTIFY_TRIGGER),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+TABLE = 'LogModule_log'
+OLD = 'LogModule_log_old'
+
+
+def _definitions(cursor, table):
+    """Secondary indexes and constraints of table, to recreate on its replacement under the same names."""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s))",
+        [table, f'"{table}"'],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype <> 'p'",
+        [f'"{table}"'],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild(schema_editor, partitioned):
+    """Swap the Log table for a copy that is (or isn't) range-partitioned on entry_time."""
+    from LogModule import partitions
+
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        indexes, constraints = _definitions(cursor, TABLE)
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(OLD)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(OLD)} INCLUDING DEFAULTS INCLUDING IDENTITY)"
+            + (" PARTITION BY RANGE (entry_time)" if partitioned else "")
+        )
+        if partitioned:
+            cursor.execute(f"SELECT min(entry_time) FROM {quote(OLD)}")
+            since = cursor.fetchone()[0]
+            partitions.create_default_partition(cursor)
+            # Months up to now for the existing rows; post_migrate adds the ones ahead
+            partitions.create_missing(cursor, 0, since=since)
+
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(OLD)}")
+        cursor.execute(f"DROP TABLE {quote(OLD)}")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(TABLE)])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT setval(%s, coalesce(max(id), 0) + 1, false) FROM {quote(TABLE)}", [sequence]
+        )
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {quote(TABLE + '_id_seq')}")
+
+        # Postgres needs the partition key in every unique constraint
+        key = 'id, entry_time' if partitioned else 'id'
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(TABLE + '_pkey')} PRIMARY KEY ({key})")
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition_log(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_log(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LogModule', '0005_presence_event'),
+    ]
+
+    operations = [
+        # Rewrites the whole table under an exclusive lock; plan a maintenance window on large installs
+        migrations.RunPython(partition_log, unpartition_log),
+    ]
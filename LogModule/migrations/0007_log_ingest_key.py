@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LogModule', '0006_partition_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='entry_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='LogIngestKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device', models.CharField(max_length=64)),
+                ('key', models.CharField(max_length=64)),
+                ('log_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('device', 'key'), name='log_ingest_key_unique')],
+            },
+        ),
+    ]
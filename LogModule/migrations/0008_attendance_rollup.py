@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LogModule', '0007_log_ingest_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hour', models.SmallIntegerField()),
+                ('saloon_id', models.BigIntegerField()),
+                ('entries', models.IntegerField(default=0)),
+                ('exits', models.IntegerField(default=0)),
+                ('present', models.IntegerField(default=0)),
+                ('peak', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'hour', 'saloon_id'), name='attendance_rollup_unique')],
+            },
+        ),
+    ]
@@ -1,17 +1,29 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.utils.timezone import now
 from LockerModule.models import Locker
 
+from . import presence, rollup
+
 class Log(models.Model):
     user = models.ForeignKey('UserModule.GenMember', on_delete=models.CASCADE)
+    saloon = models.ForeignKey('LockerModule.Saloon', on_delete=models.SET_NULL, null=True, blank=True)
     full_name = models.CharField(max_length=200, null=True, blank=True)
     is_online = models.BooleanField(default=True)
-    entry_time = models.DateTimeField(auto_now_add=True)
+    entry_time = models.DateTimeField(default=now)  # gate ingest keeps the original time
     exit_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Range-partitioned by month on entry_time (LogModule/partitions.py)
+        indexes = [
+            # Presence reconciliation only reads the online logs
+            models.Index(fields=['saloon'], condition=models.Q(is_online=True), name='log_online_saloon_idx'),
+        ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._original_is_online = self.is_online  # store original value when loaded
+        self._original_saloon_id = self.saloon_id
 
     def save(self, *args, **kwargs):
         # Set exit time only once when going offline
@@ -27,5 +39,89 @@ class Log(models.Model):
                     locker.user = None
                     locker.save()
 
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        was_online = self._original_is_online and not adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            peaks = presence.move(was_online, self._original_saloon_id, self.is_online, self.saloon_id)
+            closed = (adding or was_online) and not self.is_online
+            rollup.record([self] if adding else [], [self] if closed else [], peaks)
+            if self.is_online != was_online:
+                PresenceEvent.objects.create(
+                    kind=PresenceEvent.CHECK_IN if self.is_online else PresenceEvent.CHECK_OUT,
+                    payload=self.presence_payload(self.user.person),
+                )
         self._original_is_online = self.is_online  # update after save
+        self._original_saloon_id = self.saloon_id
+
+    def presence_payload(self, person):
+        """Body of this log's check_in/check_out presence event."""
+        return {
+            'log_id': self.id,
+            'member_id': self.user_id,
+            'person_id': person.id if person else None,
+            'full_name': person.full_name if person else self.full_name,
+            'saloon': self.saloon_id,
+            'entry_time': self.entry_time,
+            'exit_time': self.exit_time,
+        }
+
+
+class PresenceCounter(models.Model):
+    """Online logs per saloon, kept up to date by LogModule.presence."""
+    saloon_id = models.BigIntegerField(primary_key=True)  # presence.NO_SALOON for logs without a saloon
+    online = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Saloon {self.saloon_id}: {self.online} online"
+
+
+class AttendanceRollup(models.Model):
+    """Entries, exits and occupancy per local day, hour and saloon, kept up to date by LogModule.rollup."""
+    day = models.DateField()  # calendar day in TIME_ZONE, i.e. one Jalali day
+    hour = models.SmallIntegerField()
+    saloon_id = models.BigIntegerField()  # presence.NO_SALOON for logs without a saloon
+    entries = models.IntegerField(default=0)
+    exits = models.IntegerField(default=0)
+    present = models.IntegerField(default=0)  # finished visits that spanned this hour
+    peak = models.IntegerField(default=0)  # most members online at once during the hour
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'hour', 'saloon_id'], name='attendance_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.hour}:00 saloon {self.saloon_id}"
+
+
+class PresenceEvent(models.Model):
+    """Outbox of entry/exit/locker events for the presence stream, written with the change itself."""
+    CHECK_IN = 'check_in'
+    CHECK_OUT = 'check_out'
+    LOCKER_ASSIGNED = 'locker_assigned'
+    LOCKER_RELEASED = 'locker_released'
+
+    kind = models.CharField(max_length=32)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.id}"
+
+
+class LogIngestKey(models.Model):
+    """Idempotency key of an event a gate sent from its offline buffer (LogModule/ingest.py)."""
+    device = models.CharField(max_length=64)
+    key = models.CharField(max_length=64)
+    log_id = models.BigIntegerField(null=True, blank=True)  # no foreign key: Log's primary key includes entry_time
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'key'], name='log_ingest_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.device}:{self.key}"
@@ -0,0 +1,197 @@
+"""
+Monthly range partitions of the Log table.
+
+Log is partitioned on entry_time, one partition per calendar month in
+TIME_ZONE, named "<table>_YYYY_MM", plus a default partition that catches
+rows no month partition covers yet. Queries with an entry_time range
+(__gte/__lt, __range, __year) only scan the months they touch; __date and
+other lookups that cast the column can't be pruned. Old months can be detached and archived
+without rewriting the table. In the database the primary key is
+(id, entry_time), as Postgres requires; id stays unique through its
+identity sequence and Django keeps using it alone.
+
+ensure_partitions() creates the coming months and runs after every
+migrate and from the create_log_partitions command; archive_partitions()
+backs archive_log_partitions.
+"""
+import gzip
+import re
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import presence
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parent_table():
+    from .models import Log
+
+    return Log._meta.db_table
+
+
+def default_partition():
+    return f"{parent_table()}_default"
+
+
+def month_start(value):
+    """First instant of value's month in the current time zone."""
+    local = timezone.localtime(value)
+    return datetime(local.year, local.month, 1, tzinfo=local.tzinfo)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=month.tzinfo)
+
+
+def partition_name(month):
+    return f"{parent_table()}_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [connection.ops.quote_name(parent_table())]
+    )
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partitions(cursor):
+    """[(month, name)] of the attached month partitions, oldest first."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [connection.ops.quote_name(parent_table())],
+    )
+    pattern = re.compile(rf"^{re.escape(parent_table())}_(\d{{4}})_(\d{{2}})$")
+    tz = timezone.get_current_timezone()
+    months = []
+    for (name,) in cursor.fetchall():
+        match = pattern.match(name)
+        if match:
+            months.append((datetime(int(match[1]), int(match[2]), 1, tzinfo=tz), name))
+    return sorted(months)
+
+
+def create_default_partition(cursor):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(default_partition())} PARTITION OF {quote(parent_table())} DEFAULT"
+    )
+
+
+def create_partition(cursor, month):
+    """
+    Attach the partition for month.
+    Rows already sitting in the default partition for that month are moved into it first,
+    otherwise Postgres refuses the new bounds.
+    """
+    quote = connection.ops.quote_name
+    parent, name, default = quote(parent_table()), quote(partition_name(month)), quote(default_partition())
+    bounds = [month, add_months(month, 1)]
+    cursor.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)")
+    cursor.execute("SELECT to_regclass(%s)", [default])
+    if cursor.fetchone()[0]:
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE entry_time >= %s AND entry_time < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            bounds,
+        )
+    cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+
+
+def create_missing(cursor, months_ahead, since=None):
+    """
+    Attach the month partitions missing from since (default: this month) through months_ahead
+    months later, and for any month that has rows waiting in the default partition.
+    """
+    current = month_start(timezone.now())
+    month = min(month_start(since), current) if since else current
+    months = set()
+    while month <= add_months(current, months_ahead):
+        months.add(month)
+        month = add_months(month, 1)
+    cursor.execute("SELECT to_regclass(%s)", [connection.ops.quote_name(default_partition())])
+    if cursor.fetchone()[0]:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', entry_time, %s) FROM {connection.ops.quote_name(default_partition())}",
+            [timezone.get_current_timezone_name()],
+        )
+        months.update(month_start(value) for (value,) in cursor.fetchall())
+
+    existing = {name for _, name in partitions(cursor)}
+    created = []
+    for month in sorted(months):
+        if partition_name(month) not in existing:
+            create_partition(cursor, month)
+            created.append(partition_name(month))
+    return created
+
+
+def ensure_partitions(months_ahead=None):
+    """Create the partitions for this month and the next months_ahead. Returns the names created."""
+    if months_ahead is None:
+        months_ahead = _setting('LOG_PARTITION_MONTHS_AHEAD', 3)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Nothing to do while Log isn't partitioned (migrations not applied yet)
+        if not is_partitioned(cursor):
+            return []
+        return create_missing(cursor, months_ahead)
+
+
+def archive_partitions(older_than_months=None, directory=None, keep_table=False):
+    """
+    Detach the month partitions that ended more than older_than_months months ago, export each
+    to <directory>/<name>.csv.gz and drop it (or leave it as a standalone table with keep_table).
+    Returns [(name, rows)]. Online logs in an archived month come off the presence counters.
+    """
+    if older_than_months is None:
+        older_than_months = _setting('LOG_ARCHIVE_AFTER_MONTHS', 12)
+    directory = Path(directory or _setting('LOG_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'logs'))
+    horizon = add_months(month_start(timezone.now()), -older_than_months)
+    quote = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        expired = [name for month, name in partitions(cursor) if add_months(month, 1) <= horizon]
+
+    archived = []
+    for name in expired:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT coalesce(saloon_id, {presence.NO_SALOON}), count(*) FROM {quote(name)} "
+                f"WHERE is_online GROUP BY 1"
+            )
+            presence.adjust({key: -online for key, online in cursor.fetchall()})
+            cursor.execute(f"ALTER TABLE {quote(parent_table())} DETACH PARTITION {quote(name)}")
+
+        # Exported after the detach, so live traffic never waits on it
+        directory.mkdir(parents=True, exist_ok=True)
+        with connection.cursor() as cursor:
+            with gzip.open(directory / f"{name}.csv.gz", 'wt', encoding='utf-8') as archive:
+                cursor.copy_expert(f"COPY {quote(name)} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+            cursor.execute(f"SELECT count(*) FROM {quote(name)}")
+            rows = cursor.fetchone()[0]
+            if not keep_table:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+        archived.append((name, rows))
+    return archived
+
+
+def scanned_partitions(queryset):
+    """Names of the partitions Postgres plans to scan for queryset, to check a filter prunes."""
+    plan = queryset.explain(format='json')
+    return sorted(set(re.findall(rf'"Relation Name": "({re.escape(parent_table())}_[^"]+)"', plan)))
+
+
+def ensure_on_migrate(sender, **kwargs):
+    ensure_partitions()
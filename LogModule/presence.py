@@ -0,0 +1,100 @@
+"""
+Live count of members currently in the club.
+
+PresenceCounter keeps one row per saloon (NO_SALOON for logs without one)
+holding how many Log rows are online there. Every write that creates an
+online log, flips is_online, moves a log between saloons or deletes an
+online log adjusts the counter in the same transaction, so reading the
+count is a lookup in a table of a handful of rows instead of a COUNT over
+Log. reconcile() recounts from Log to correct any drift left by writes
+that bypass the model (queryset.update(), raw SQL).
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+NO_SALOON = 0
+
+
+def saloon_key(saloon_id):
+    return saloon_id if saloon_id is not None else NO_SALOON
+
+
+def _table():
+    from .models import PresenceCounter
+
+    return connection.ops.quote_name(PresenceCounter._meta.db_table)
+
+
+def adjust(deltas):
+    """
+    Apply {saloon key: delta} to the counters in one upsert.
+    Returns {saloon key: the higher of the counts before and after}, the attendance rollup's peak.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    table = _table()
+    values = ', '.join(['(%s, %s)'] * len(deltas))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (saloon_id, online) VALUES {values} "
+            f"ON CONFLICT (saloon_id) DO UPDATE SET online = {table}.online + EXCLUDED.online "
+            f"RETURNING saloon_id, online",
+            [item for pair in sorted(deltas.items()) for item in pair],
+        )
+        return {key: max(online, online - deltas[key]) for key, online in cursor.fetchall()}
+
+
+def move(was_online, old_saloon_id, is_online, saloon_id):
+    """Counter change for one log going from (was_online, old saloon) to (is_online, saloon)."""
+    deltas = Counter()
+    if was_online:
+        deltas[saloon_key(old_saloon_id)] -= 1
+    if is_online:
+        deltas[saloon_key(saloon_id)] += 1
+    return adjust(deltas)
+
+
+def online_counts():
+    """(total online, {saloon key: online}) from the counter table."""
+    from .models import PresenceCounter
+
+    by_saloon = dict(PresenceCounter.objects.filter(online__gt=0).values_list('saloon_id', 'online'))
+    return sum(by_saloon.values()), by_saloon
+
+
+def reconcile():
+    """
+    Recount online logs per saloon and overwrite the counters.
+    Returns {saloon key: (counted, recorded)} for every counter that had drifted.
+    """
+    from .models import Log, PresenceCounter
+
+    with transaction.atomic():
+        # Check-ins wait for the recount instead of adjusting a counter that is being replaced;
+        # ones that wrote their log but not their counter yet land on top of the recount.
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {_table()} IN SHARE ROW EXCLUSIVE MODE")
+        actual = dict(
+            Log.objects.filter(is_online=True)
+            .values_list(Coalesce('saloon_id', Value(NO_SALOON)))
+            .annotate(online=Count('id'))
+            .order_by()
+        )
+        recorded = dict(PresenceCounter.objects.values_list('saloon_id', 'online'))
+        drift = {
+            key: (actual.get(key, 0), recorded.get(key, 0))
+            for key in set(actual) | set(recorded)
+            if actual.get(key, 0) != recorded.get(key, 0)
+        }
+        now = timezone.now()
+        PresenceCounter.objects.bulk_create(
+            [PresenceCounter(saloon_id=key, online=actual.get(key, 0), reconciled_at=now)
+             for key in set(actual) | set(recorded)],
+            update_conflicts=True, unique_fields=['saloon_id'], update_fields=['online', 'reconciled_at'],
+        )
+    return drift
@@ -0,0 +1,201 @@
+"""
+Attendance rollup: entries, exits, visits and peak occupancy per local
+day, hour and saloon.
+
+Every write that opens or closes a log adds its share to AttendanceRollup
+in the same transaction (the check-in and checkout statements embed
+upsert_sql(), Log.save() and the gate ingest call record()), so the
+dashboards read a few hundred rollup rows instead of every Log. A
+finished visit counts as present in each hour it spanned, up to the end
+of its entry day. Peaks come from the live presence counters, so only
+changes happening now raise them; rebuild() recomputes a range of days
+exactly from Log and backs the rebuild_attendance_rollup command.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .presence import NO_SALOON
+
+
+def _table():
+    from .models import AttendanceRollup
+
+    return connection.ops.quote_name(AttendanceRollup._meta.db_table)
+
+
+def upsert_sql(logs=None, peaks=None):
+    """
+    One INSERT ... ON CONFLICT adding to the rollup:
+    logs, a relation of (entry_time, exit_time, saloon_id, opened, closed, visited), counts
+    an entry for each opened log, an exit for each closed one and the hours of each visited one;
+    peaks, a relation of (saloon_id, online), raises the current hour's peak.
+    Uses the %(tz)s and %(now)s parameters.
+    """
+    parts = []
+    if logs:
+        parts += [
+            f"SELECT entry_time AS moment, saloon_id, 1 AS entries, 0 AS exits, 0 AS present, 0 AS peak "
+            f"FROM {logs} WHERE opened",
+            f"SELECT exit_time, saloon_id, 0, 1, 0, 0 FROM {logs} WHERE closed",
+            f"""SELECT hour_start, saloon_id, 0, 0, 1, 0
+                FROM {logs}, generate_series(
+                    date_trunc('hour', entry_time, %(tz)s),
+                    least(exit_time, date_trunc('day', entry_time, %(tz)s) + interval '1 day' - interval '1 usec'),
+                    interval '1 hour'
+                ) AS hour_start
+                WHERE visited AND exit_time >= entry_time""",
+        ]
+    if peaks:
+        parts.append(f"SELECT %(now)s::timestamptz, saloon_id, 0, 0, 0, online FROM {peaks}")
+    table = _table()
+    return f"""
+        INSERT INTO {table} (day, hour, saloon_id, entries, exits, present, peak)
+        SELECT (moment AT TIME ZONE %(tz)s)::date, extract(hour FROM moment AT TIME ZONE %(tz)s),
+               coalesce(saloon_id, {NO_SALOON}), sum(entries), sum(exits), sum(present), max(peak)
+        FROM ({' UNION ALL '.join(parts)}) AS contribution
+        GROUP BY 1, 2, 3
+        ON CONFLICT (day, hour, saloon_id) DO UPDATE SET
+            entries = {table}.entries + EXCLUDED.entries,
+            exits = {table}.exits + EXCLUDED.exits,
+            present = {table}.present + EXCLUDED.present,
+            peak = greatest({table}.peak, EXCLUDED.peak)
+    """
+
+
+def record(opened=(), closed=(), peaks=None):
+    """
+    Add logs that were just opened and/or closed, and {saloon key: online} peaks seen now, in one statement.
+    A log may be in both (opened and closed in the same write).
+    """
+    logs = {}
+    for log in opened:
+        logs[id(log)] = [log, True, False]
+    for log in closed:
+        logs.setdefault(id(log), [log, False, False])[2] = True
+    peaks = {key: online for key, online in (peaks or {}).items() if online > 0}
+    if not logs and not peaks:
+        return
+
+    params = {'tz': timezone.get_current_timezone_name(), 'now': timezone.now()}
+    ctes = []
+    if logs:
+        rows = []
+        for n, (log, is_opened, is_closed) in enumerate(logs.values()):
+            rows.append(f"(%(e{n})s::timestamptz, %(x{n})s::timestamptz, %(s{n})s::bigint, %(o{n})s, %(c{n})s)")
+            params.update({
+                f'e{n}': log.entry_time, f'x{n}': log.exit_time, f's{n}': log.saloon_id,
+                f'o{n}': is_opened, f'c{n}': is_closed,
+            })
+        ctes.append(
+            "logs (entry_time, exit_time, saloon_id, opened, closed) AS (VALUES " + ', '.join(rows) + ")"
+        )
+    if peaks:
+        rows = []
+        for n, (key, online) in enumerate(sorted(peaks.items())):
+            rows.append(f"(%(k{n})s::bigint, %(p{n})s::int)")
+            params.update({f'k{n}': key, f'p{n}': online})
+        ctes.append("peaks (saloon_id, online) AS (VALUES " + ', '.join(rows) + ")")
+
+    sql = upsert_sql(
+        '(SELECT *, closed AS visited FROM logs) AS logs' if logs else None,
+        'peaks' if peaks else None,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('WITH ' + ', '.join(ctes) + sql, params)
+
+
+def _bounds(first_day, last_day):
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(first_day, time.min, tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
+def _peaks(first_day, last_day):
+    """
+    {(day, hour, saloon key): peak} for the days, by sweeping the entries (+1) and exits (-1)
+    of every log that overlaps them; logs still online count as present until now.
+    """
+    from .models import Log
+
+    start, end = _bounds(first_day, last_day)
+    now = timezone.now()
+    logs = (
+        Log.objects.filter(Q(entry_time__lt=end), Q(is_online=True) | Q(exit_time__gt=start))
+        .values_list('entry_time', 'exit_time', 'is_online', 'saloon_id')
+    )
+    by_saloon = defaultdict(list)
+    for entry_time, exit_time, is_online, saloon_id in logs.iterator(chunk_size=10000):
+        left = now if is_online or exit_time is None else exit_time
+        if left > entry_time:
+            key = saloon_id if saloon_id is not None else NO_SALOON
+            by_saloon[key].append((entry_time.timestamp(), left.timestamp()))
+
+    # Local hour boundaries of the range: [edges[i], edges[i + 1]) is one rollup row
+    tz = timezone.get_current_timezone()
+    hours = []
+    day = first_day
+    while day <= last_day:
+        hours += [datetime.combine(day, time(hour), tzinfo=tz) for hour in range(24)]
+        day += timedelta(days=1)
+    edges = np.array([moment.timestamp() for moment in hours] + [end.timestamp()])
+
+    peaks = {}
+    for key, visits in by_saloon.items():
+        visits = np.array(visits)
+        moments = np.concatenate([visits[:, 0], visits[:, 1]])
+        deltas = np.concatenate([np.ones(len(visits)), -np.ones(len(visits))])
+        # Exits sort before entries at the same instant, so a handover isn't counted as two people
+        order = np.lexsort((deltas, moments))
+        moments, occupancy = moments[order], np.cumsum(deltas[order])
+
+        # Occupancy carried into each hour, raised by the highest it reached inside the hour
+        first = np.searchsorted(moments, edges[:-1], side='left')
+        last = np.searchsorted(moments, edges[1:], side='left')
+        peak = np.where(first > 0, occupancy[np.maximum(first - 1, 0)], 0)
+        busy = np.flatnonzero(last > first)
+        if len(busy):
+            # Busy hours' events are back to back, so each reduceat slice ends where the next hour starts
+            inside = np.maximum.reduceat(occupancy[:last[busy[-1]]], first[busy])
+            peak[busy] = np.maximum(peak[busy], inside)
+        for index in np.flatnonzero(peak > 0):
+            peaks[(hours[index].date(), hours[index].hour, key)] = int(peak[index])
+    return peaks
+
+
+def rebuild(first_day, last_day):
+    """
+    Recompute the rollup rows of first_day..last_day (local dates) from Log.
+    Safe alongside live writes: they wait on the rows being rebuilt and then add to the new ones.
+    Returns the number of rows written.
+    """
+    from .models import AttendanceRollup, Log
+
+    start, end = _bounds(first_day, last_day)
+    table = connection.ops.quote_name(Log._meta.db_table)
+    # Entries, and visits' hours, belong to the entry day; exits to the exit day
+    logs = f"""(
+        SELECT entry_time, exit_time, saloon_id,
+               entry_time >= %(start)s AS opened,
+               NOT is_online AND exit_time >= %(start)s AND exit_time < %(end)s AS closed,
+               NOT is_online AND entry_time >= %(start)s AS visited
+        FROM {table}
+        WHERE entry_time < %(end)s AND (entry_time >= %(start)s OR (NOT is_online AND exit_time >= %(start)s))
+    ) AS logs"""
+    params = {'tz': timezone.get_current_timezone_name(), 'now': timezone.now(), 'start': start, 'end': end}
+
+    with transaction.atomic():
+        AttendanceRollup.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(upsert_sql(logs), params)
+        AttendanceRollup.objects.bulk_create(
+            [AttendanceRollup(day=day, hour=hour, saloon_id=key, peak=peak)
+             for (day, hour, key), peak in _peaks(first_day, last_day).items()],
+            update_conflicts=True, unique_fields=['day', 'hour', 'saloon_id'], update_fields=['peak'],
+        )
+        return AttendanceRollup.objects.filter(day__gte=first_day, day__lte=last_day).count()
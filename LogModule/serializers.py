@@ -1,4 +1,9 @@
+from django.conf import settings
 from rest_framework import serializers
+
+from LockerModule.models import Saloon
+
+from .ingest import ENTRY, EXIT
 from .models import Log
 
 
@@ -6,6 +11,42 @@ from .models import Log
 class LogSerializer(serializers.ModelSerializer):
     class Meta:
         model = Log
-        fields = ['id', 'user', 'is_online', 'entry_time', 'exit_time']
+        fields = ['id', 'user', 'saloon', 'is_online', 'entry_time', 'exit_time']
         read_only_fields = ['entry_time']
 
+
+
+class CheckInSerializer(serializers.Serializer):
+    # Validated without loading the member, the check-in statement reports a missing one
+    user = serializers.IntegerField()
+    is_online = serializers.BooleanField(default=True)
+    exit_time = serializers.DateTimeField(required=False, allow_null=True)
+    saloon = serializers.IntegerField(required=False, allow_null=True)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    # Omitted or null checks out every saloon
+    saloon = serializers.IntegerField(required=False, allow_null=True)
+
+
+class IngestEventSerializer(serializers.Serializer):
+    key = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(choices=[ENTRY, EXIT])
+    user = serializers.IntegerField()
+    time = serializers.DateTimeField()
+    saloon = serializers.IntegerField(required=False, allow_null=True)
+
+
+class IngestSerializer(serializers.Serializer):
+    device = serializers.CharField(max_length=64)
+    events = IngestEventSerializer(
+        many=True, allow_empty=False, max_length=getattr(settings, 'LOG_INGEST_MAX_EVENTS', 1000),
+    )
+
+    def validate_events(self, events):
+        # A bad saloon id would only fail at commit, for the whole batch
+        saloons = {event['saloon'] for event in events if event.get('saloon') is not None}
+        unknown = saloons - set(Saloon.objects.filter(id__in=saloons).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError(f"Invalid saloon ID(s): {sorted(unknown)}")
+        return events
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from LockerModule.models import Locker
+
+from . import presence
+from .models import Log, PresenceEvent
+
+
+@receiver(post_delete, sender=Log)
+def release_presence(sender, instance, **kwargs):
+    if instance.is_online:
+        presence.adjust({presence.saloon_key(instance.saloon_id): -1})
+
+
+@receiver(post_save, sender=Locker)
+def publish_locker_assignment(sender, instance, created, **kwargs):
+    if instance.user_id == (None if created else instance._original_user_id):
+        return
+    PresenceEvent.objects.create(
+        kind=PresenceEvent.LOCKER_ASSIGNED if instance.user_id else PresenceEvent.LOCKER_RELEASED,
+        payload={
+            'locker_id': instance.id,
+            'number': instance.number,
+            'saloon': instance.locker_place_id,
+            'person_id': instance.user_id,
+            'previous_person_id': None if created else instance._original_user_id,
+        },
+    )
@@ -0,0 +1,237 @@
+"""
+Server-Sent Events feed of check-ins, check-outs and locker assignments.
+
+Events are rows of PresenceEvent, written in the same transaction as the
+log or locker change, and an INSERT trigger on that table NOTIFYs
+'presence_events'. One listener thread per process wakes up on the
+notification, reads the new rows once and hands them to every connected
+client's bounded queue.
+
+A client that can't keep up (queue full) is disconnected rather than
+buffered without limit; EventSource reconnects by itself and sends
+Last-Event-ID, and the missed events are replayed from the table. The
+same replay serves any reconnect, so a dashboard never has to poll.
+Delivery is at-least-once: a transaction that commits late can deliver
+an event with a lower id after a higher one, clients dedupe by id.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+
+from . import presence
+from .models import PresenceEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'presence_events'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def format_event(event_id, kind, data):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One connected client: a bounded queue of events, closed when it overflows."""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def push(self, events):
+        # Runs on the client's event loop
+        if self.overflowed:
+            return
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                return
+
+
+class Broadcaster:
+    """Per-process LISTEN loop fanning new PresenceEvent rows out to the subscriptions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._thread = None
+        self._low = None
+        self._seen = set()
+        self._last_prune = 0
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop(), _setting('PRESENCE_STREAM_QUEUE_SIZE', 256))
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='presence-stream', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _publish(self, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, events)
+            except RuntimeError:
+                # The client's loop is gone
+                self.unsubscribe(subscription)
+
+    def _poll(self):
+        """New events since the last poll, each delivered once even if it commits out of id order."""
+        settled = timezone.now() - timedelta(seconds=_setting('PRESENCE_STREAM_SETTLE_SECONDS', 5))
+        if self._low is None:
+            # Start below the settle window, clients skip what they already read themselves
+            self._low = (
+                PresenceEvent.objects.filter(created_at__lt=settled)
+                .order_by('-id').values_list('id', flat=True).first() or 0
+            )
+            self._seen = set()
+        events = [
+            event for event in PresenceEvent.objects.filter(id__gt=self._low).order_by('id')
+            if event.id not in self._seen
+        ]
+        self._seen.update(event.id for event in events)
+        # Rows older than the settle window belong to committed transactions, nothing below them can still appear
+        low = (
+            PresenceEvent.objects.filter(id__gt=self._low, created_at__lt=settled)
+            .order_by('-id').values_list('id', flat=True).first()
+        )
+        if low:
+            self._low = low
+            self._seen = {event_id for event_id in self._seen if event_id > low}
+        return events
+
+    def _prune(self):
+        hours = _setting('PRESENCE_EVENT_RETENTION_HOURS', 24)
+        if time.monotonic() - self._last_prune >= 3600:
+            PresenceEvent.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours)).delete()
+            self._last_prune = time.monotonic()
+
+    def _listen(self):
+        connection.ensure_connection()
+        raw = connection.connection
+        with raw.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        self._low = None
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    self._thread = None
+                    return
+            events = self._poll()
+            if events:
+                self._publish(events)
+            self._prune()
+            # The timeout doubles as a safety net for a lost notification
+            if select.select([raw], [], [], 5) != ([], [], []):
+                raw.poll()
+                raw.notifies.clear()
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    return self._listen()
+                except Exception:
+                    logger.exception("Presence stream listener failed, reconnecting")
+                    connection.close()
+                    time.sleep(1)
+        finally:
+            connection.close()
+
+
+broadcaster = Broadcaster()
+
+
+def _replay(after, limit):
+    return list(PresenceEvent.objects.filter(id__gt=after).order_by('id')[:limit])
+
+
+def _resumable(last_event_id):
+    """Whether the events after last_event_id are still stored."""
+    oldest = PresenceEvent.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is None or oldest <= last_event_id + 1
+
+
+def _snapshot():
+    total, by_saloon = presence.online_counts()
+    latest = PresenceEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    return {'online_members': total, 'online_by_saloon': by_saloon}, latest
+
+
+def _recent_ids(upto):
+    """Ids up to upto that the listener may still publish (inside its settle window)."""
+    settled = timezone.now() - timedelta(seconds=_setting('PRESENCE_STREAM_SETTLE_SECONDS', 5))
+    return set(PresenceEvent.objects.filter(id__lte=upto, created_at__gte=settled).values_list('id', flat=True))
+
+
+async def events(last_event_id=None):
+    """Async iterator of SSE frames for one client, resuming after last_event_id when given."""
+    heartbeat = _setting('PRESENCE_STREAM_HEARTBEAT_SECONDS', 15)
+    # Subscribe before reading the table, so nothing committed in between is missed
+    subscription = broadcaster.subscribe()
+    try:
+        yield f"retry: {_setting('PRESENCE_STREAM_RETRY_MS', 3000)}\n\n"
+        if last_event_id is not None and not await sync_to_async(_resumable)(last_event_id):
+            # Events after that id were pruned, the client has to reload its state
+            yield format_event(None, 'reset', {})
+            last_event_id = None
+        if last_event_id is None:
+            # Current counters to start from; live events follow
+            snapshot, last_event_id = await sync_to_async(_snapshot)()
+            yield format_event(None, 'presence', snapshot)
+
+        # Already reflected in what the client has, so skipped when the listener publishes them too
+        known = await sync_to_async(_recent_ids)(last_event_id)
+        limit = _setting('PRESENCE_STREAM_REPLAY_LIMIT', 1000)
+        while True:
+            batch = await sync_to_async(_replay)(last_event_id, limit)
+            for event in batch:
+                known.add(event.id)
+                yield format_event(event.id, event.kind, event.payload)
+            if batch:
+                last_event_id = batch[-1].id
+            if len(batch) < limit:
+                break
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Too slow to keep up; the reconnect resumes from the last delivered id
+                break
+            if event.id not in known:
+                yield format_event(event.id, event.kind, event.payload)
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -1,3 +1,203 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from LockerModule.models import Locker
+from UserModule.models import GenMember, GenPerson, GenPersonRole, Sport
+
+from . import partitions, presence
+from .checkin import check_in
+from .ingest import ENTRY, EXIT, ingest
+from .models import Log, PresenceEvent
+
+
+class LogListQueryBudgetTests(TestCase):
+    # count, page, latest lockers, online members
+    QUERY_BUDGET = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        role = GenPersonRole.objects.create(id=1, role_desc='Athlete')
+        sport = Sport.objects.create(name='Swimming')
+        for n in range(1, 21):
+            person = GenPerson.objects.create(id=n, full_name=f'Person {n}')
+            member = GenMember.objects.create(id=n, person=person, role=role, sport=sport, session_left=n)
+            Locker.objects.create(user=person, number=n)
+            Locker.objects.create(user=person, number=100 + n)
+            Log.objects.create(user=member, is_online=n % 2 == 0)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_page(self, limit):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get('/api/logs/', {'page': 1, 'limit': limit, 'count': 'exact'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.assertEqual(len(self.get_page(2)['items']), 2)
+        self.assertEqual(len(self.get_page(20)['items']), 20)
+
+    def test_rows_are_enriched(self):
+        data = self.get_page(20)
+        self.assertEqual(data['online_members'], 10)
+        item = data['items'][0]
+        self.assertEqual(item['full_name'], 'Person 20')
+        self.assertEqual(item['role'], 'Athlete')
+        self.assertEqual(item['sport'], 'Swimming')
+        self.assertEqual(item['session_left'], 20)
+        # Latest locker of the person
+        self.assertEqual(item['locker_number'], 120)
+        self.assertNotIn('person_image', item)
+
+
+class LogListEstimateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(1, 31):
+            person = GenPerson.objects.create(id=n, full_name=f'Person {n}')
+            Log.objects.create(user=GenMember.objects.create(id=n, person=person))
+
+    @override_settings(PAGINATION_EXACT_COUNT_BELOW=1)
+    def test_estimate_sums_the_partitions(self):
+        # Autovacuum analyzes the leaf partitions only, never the partitioned parent
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relid::regclass::text FROM pg_partition_tree(%s) WHERE isleaf", [connection.ops.quote_name(Log._meta.db_table)])
+            for (leaf,) in cursor.fetchall():
+                cursor.execute(f"ANALYZE {leaf}")
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/logs/', {'page': 1, 'limit': 5, 'count': 'estimate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 30)
+        self.assertTrue(response.data['total_items_estimated'])
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()])
+
+
+class LogPartitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        person = GenPerson.objects.create(id=1, full_name='Person 1')
+        cls.member = GenMember.objects.create(id=1, person=person)
+
+    def test_time_range_scans_only_its_month(self):
+        month = partitions.month_start(timezone.now())
+        queryset = Log.objects.filter(entry_time__gte=month, entry_time__lt=partitions.add_months(month, 1))
+        self.assertEqual(partitions.scanned_partitions(queryset), [partitions.partition_name(month)])
+
+    def test_rows_outside_the_partitions_get_their_month(self):
+        log = Log.objects.create(user=self.member)
+        entry_time = timezone.now() - timedelta(days=5 * 365)
+        Log.objects.filter(pk=log.pk).update(entry_time=entry_time)
+
+        month = partitions.month_start(entry_time)
+        self.assertIn(partitions.partition_name(month), partitions.ensure_partitions())
+        queryset = Log.objects.filter(entry_time__gte=month, entry_time__lt=partitions.add_months(month, 1))
+        self.assertEqual(partitions.scanned_partitions(queryset), [partitions.partition_name(month)])
+        self.assertEqual(list(queryset.values_list('pk', flat=True)), [log.pk])
+
+
+class CheckInTests(TransactionTestCase):
+
+    def setUp(self):
+        self.person = GenPerson.objects.create(id=1, full_name='Person 1')
+
+    def member(self, session_left):
+        return GenMember.objects.create(id=GenMember.objects.count() + 1, person=self.person, session_left=session_left)
+
+    def check_in_parallel(self, member, count):
+        barrier = threading.Barrier(count)
+
+        def gate():
+            # Every reader its own connection, all starting at once
+            try:
+                barrier.wait()
+                return check_in(member.id)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(count) as pool:
+            return list(pool.map(lambda _: gate(), range(count)))
+
+    def test_parallel_check_ins_each_spend_a_session(self):
+        member = self.member(10)
+        rows = self.check_in_parallel(member, 5)
+        member.refresh_from_db()
+        self.assertEqual(member.session_left, 5)
+        self.assertEqual(sorted(row['session_left'] for row in rows), [5, 6, 7, 8, 9])
+        self.assertEqual(Log.objects.filter(user=member).count(), 5)
+
+    def test_parallel_check_ins_run_out(self):
+        member = self.member(3)
+        rows = self.check_in_parallel(member, 5)
+        member.refresh_from_db()
+        self.assertIsNone(member.session_left)
+        self.assertEqual(sorted(row['session_left'] for row in rows if row['session_left'] is not None), [0, 1, 2])
+
+    def test_zero_becomes_null_and_null_stays_null(self):
+        member = self.member(0)
+        self.assertIsNone(check_in(member.id)['session_left'])
+        self.assertIsNone(check_in(member.id)['session_left'])
+        member.refresh_from_db()
+        self.assertIsNone(member.session_left)
+
+    def test_unknown_member(self):
+        self.assertIsNone(check_in(999))
+        response = APIClient().post('/api/logs/', {'user': 999}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Log.objects.exists())
+
+
+class IngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        person = GenPerson.objects.create(id=1, full_name='Person 1')
+        cls.member = GenMember.objects.create(id=1, person=person, session_left=5)
+        cls.start = timezone.now() - timedelta(hours=3)
+
+    def event(self, key, kind, minutes):
+        return {'key': key, 'type': kind, 'user': self.member.id, 'time': self.start + timedelta(minutes=minutes)}
+
+    def session_left(self):
+        self.member.refresh_from_db()
+        return self.member.session_left
+
+    def test_retried_batch_changes_nothing(self):
+        events = [self.event('a', ENTRY, 0)]
+        first = ingest('gate-1', events)
+        self.assertEqual(first['a']['status'], 'created')
+        second = ingest('gate-1', events)
+        self.assertEqual(second, {'a': {'status': 'duplicate', 'log_id': first['a']['log_id']}})
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(self.session_left(), 4)
+
+    def test_key_repeated_in_batch_is_applied_once(self):
+        results = ingest('gate-1', [self.event('a', ENTRY, 0), self.event('a', ENTRY, 5)])
+        self.assertEqual(list(results), ['a'])
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(self.session_left(), 4)
+
+    def test_entries_are_spent_in_time_order(self):
+        GenMember.objects.filter(id=self.member.id).update(session_left=1)
+        results = ingest('gate-1', [self.event('late', ENTRY, 30), self.event('early', ENTRY, 10)])
+        self.assertEqual(results['early']['session_left'], 0)
+        self.assertIsNone(results['late']['session_left'])
+        self.assertIsNone(self.session_left())
+
+    def test_entry_and_exit_in_one_batch_skip_presence(self):
+        before = presence.online_counts()
+        results = ingest('gate-1', [self.event('out', EXIT, 20), self.event('in', ENTRY, 10)])
+        self.assertEqual((results['in']['status'], results['out']['status']), ('created', 'closed'))
+        self.assertEqual(results['in']['log_id'], results['out']['log_id'])
+        self.assertFalse(Log.objects.get().is_online)
+        self.assertEqual(presence.online_counts(), before)
+        self.assertFalse(PresenceEvent.objects.filter(kind__in=[PresenceEvent.CHECK_IN, PresenceEvent.CHECK_OUT]).exists())
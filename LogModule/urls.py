@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import LogAPIView
+from .views import CheckoutAPIView, IngestAPIView, LogAPIView, presence_stream
 
 urlpatterns = [
     path('', LogAPIView.as_view()),
+    path('checkout/', CheckoutAPIView.as_view()),
+    path('ingest/', IngestAPIView.as_view()),
+    path('stream/', presence_stream),
 ]
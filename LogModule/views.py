@@ -1,36 +1,72 @@
 import base64
 import logging
-from math import ceil
-
+from collections import Counter
+from django.db import IntegrityError
 from django.db.models import Q
-from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils.timezone import now
+from django.views.decorators.http import require_GET
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from GymAutomation.pagination import InvalidPage, paginate
+from . import presence, stream
+from .checkin import check_in
+from .checkout import check_out_all
+from .ingest import ingest
 from .models import Log
-from .serializers import LogSerializer
+from .serializers import CheckInSerializer, CheckoutSerializer, IngestSerializer, LogSerializer
 from LockerModule.models import Locker
-from UserModule.models import GenMember, GenPerson
+from UserModule.media_store import media_url, read_blob
+from UserModule.models import GenPerson
 
 logger = logging.getLogger(__name__)
 
+
+def person_photo(request, image_ref, thumbnail_ref):
+    """Photo URLs for a log row; the base64 photo itself only with ?include_image=1."""
+    photo = {
+        'person_image_url': media_url(image_ref, request),
+        'thumbnail_url': media_url(thumbnail_ref, request),
+        'avatar_url': media_url(image_ref, request, size='avatar'),
+    }
+    if request.query_params.get('include_image') == '1':
+        image = read_blob(image_ref)
+        photo['person_image'] = base64.b64encode(image).decode('utf-8') if image else None
+    return photo
+
+
+LOG_ROW_FIELDS = [
+    'id', 'saloon', 'full_name', 'is_online', 'entry_time', 'exit_time',
+    'user__id', 'user__session_left', 'user__membership_datetime',
+    'user__person__id', 'user__person__full_name', 'user__person__person_image_ref', 'user__person__thumbnail_ref',
+    'user__role__role_desc', 'user__sport__name',
+]
+
+
+def latest_lockers(person_ids):
+    """Person id -> number of their most recent locker, for a whole page in one DISTINCT ON query."""
+    person_ids = {person_id for person_id in person_ids if person_id is not None}
+    if not person_ids:
+        return {}
+    return dict(
+        Locker.objects
+        .filter(user_id__in=person_ids)
+        .order_by('user_id', '-id')
+        .distinct('user_id')
+        .values_list('user_id', 'number')
+    )
+
+
 class LogAPIView(APIView):
     def get(self, request):
         log_id = request.query_params.get('id')
         is_online_param = request.query_params.get('is_online')
         person_param = request.query_params.get('person')
 
-        try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-            if page < 1 or limit < 1:
-                raise ValueError
-        except ValueError:
-            return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
-
-        logs_qs = Log.objects.all()
+        # Members, persons, roles and sports come in with the page, photo blobs stay behind
+        logs_qs = Log.objects.select_related('user__person', 'user__role', 'user__sport').only(*LOG_ROW_FIELDS)
 
         if log_id:
             logs_qs = logs_qs.filter(id=log_id)
@@ -50,33 +86,22 @@ class LogAPIView(APIView):
                 return Response({'error': 'Invalid person ID'}, status=status.HTTP_400_BAD_REQUEST)
             logs_qs = logs_qs.filter(user__person__id=person_id)
 
-        logs_qs = logs_qs.order_by('-id')
-
-        total_items = logs_qs.count()
-        total_pages = ceil(total_items / limit) if total_items > 0 else 1
-
-        start = (page - 1) * limit
-        end = start + limit
-        logs_page = logs_qs[start:end]
+        try:
+            page = paginate(request, logs_qs, ['-id'], empty_pages=1)
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         items = []
+        lockers = latest_lockers(log.user.person_id for log in page.items)
 
-        for log in logs_page:
+        for log in page.items:
             member = log.user
             person = member.person if member else None
 
-            locker = None
-            if person:
-                locker = Locker.objects.filter(user=person).order_by('-id').first()
-
-            if person and person.person_image:
-                person_image_b64 = base64.b64encode(person.person_image).decode('utf-8')
-            else:
-                person_image_b64 = None
-
             item = {
                 'id': log.id,
                 'user': member.id if member else None,
+                'saloon': log.saloon_id,
                 'person_id': person.id if person else None,
                 'full_name': person.full_name if person else log.full_name,
                 'is_online': log.is_online,
@@ -86,82 +111,69 @@ class LogAPIView(APIView):
                 'sport': member.sport.name if member and member.sport else None,
                 'session_left': member.session_left if member else None,
                 'membership_datetime': member.membership_datetime if member else None,
-                'person_image': person_image_b64,
-                'locker_number': locker.number if locker else None,
+                **person_photo(
+                    request,
+                    person.person_image_ref if person else None,
+                    person.thumbnail_ref if person else None,
+                ),
+                'locker_number': lockers.get(person.id) if person else None,
             }
 
             items.append(item)
 
-        online_members = Log.objects.filter(is_online=True).count()
+        online_members, online_by_saloon = presence.online_counts()
 
         response_data = {
-            'total_items': total_items,
-            'current_page': page,
-            'total_pages': total_pages,
+            'total_items': page.total_items,
+            'current_page': page.number,
+            'total_pages': page.total_pages,
+            'next_cursor': page.next_cursor,
+            'total_items_estimated': page.estimated,
             'online_members': online_members,
+            'online_by_saloon': online_by_saloon,
             'items': items,
         }
 
         return Response(response_data)
 
     def post(self, request):
-        user_id = request.data.get('user')
-        if user_id is None:
+        if request.data.get('user') is None:
             return Response({'user': 'This field is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            member = get_object_or_404(GenMember, id=user_id)
-        except Exception:
-            return Response({'user': 'Invalid user ID.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = LogSerializer(data=request.data)
-        if serializer.is_valid():
-            try:
-                log = serializer.save()
-                if member.session_left is not None:
-                    if member.session_left > 0:
-                        member.session_left -= 1
-                    else:
-                        member.session_left = None
-                    member.save()
-
-                # ✅ Build the same enriched response as GET for this single log
-                person = member.person if member else None
-
-                locker = None
-                if person:
-                    locker = Locker.objects.filter(user=person).order_by('-id').first()
-
-                if person and person.person_image:
-                    person_image_b64 = base64.b64encode(person.person_image).decode('utf-8')
-                else:
-                    person_image_b64 = None
-
-                item = {
-                    'id': log.id,
-                    'user': member.id if member else None,
-                    'person_id': person.id if person else None,
-                    'full_name': person.full_name if person else log.full_name,
-                    'is_online': log.is_online,
-                    'entry_time': log.entry_time,
-                    'exit_time': log.exit_time,
-                    'role': member.role.role_desc if member and member.role else None,
-                    'sport': member.sport.name if member and member.sport else None,
-                    'session_left': member.session_left if member else None,
-                    'end_date': member.end_date if member else None,
-                    'person_image': person_image_b64,
-                    'locker_number': locker.number if locker else None,
-                }
-
-                return Response(item, status=status.HTTP_201_CREATED)
-
-            except Exception as e:
-                logger.error(f"Error saving Log: {e}", exc_info=True)
-                return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
+        serializer = CheckInSerializer(data=request.data)
+        if not serializer.is_valid():
             logger.warning(f"Validation errors: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            data = serializer.validated_data
+            row = check_in(data['user'], data['is_online'], data.get('exit_time'), data.get('saloon'))
+        except IntegrityError:
+            return Response({'saloon': 'Invalid saloon ID.'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error saving Log: {e}", exc_info=True)
+            return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if row is None:
+            return Response({'user': 'Invalid user ID.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Same enriched item as GET, straight from the check-in statement
+        item = {
+            'id': row['id'],
+            'user': row['user'],
+            'saloon': row['saloon'],
+            'person_id': row['person_id'],
+            'full_name': row['full_name'],
+            'is_online': row['is_online'],
+            'entry_time': row['entry_time'],
+            'exit_time': row['exit_time'],
+            'role': row['role'],
+            'sport': row['sport'],
+            'session_left': row['session_left'],
+            'end_date': row['end_date'],
+            **person_photo(request, row['person_image_ref'], row['thumbnail_ref']),
+            'locker_number': row['locker_number'],
+        }
+        return Response(item, status=status.HTTP_201_CREATED)
 
     def patch(self, request):
         log_id = request.query_params.get('id')
@@ -190,3 +202,53 @@ class LogAPIView(APIView):
             return Response({'message': 'Log deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
         except Log.DoesNotExist:
             return Response({'error': 'Log not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class CheckoutAPIView(APIView):
+    def post(self, request):
+        """Closing time: check out everyone online, or everyone in one saloon with {"saloon": id}."""
+        serializer = CheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        result = check_out_all(serializer.validated_data.get('saloon'))
+        logger.info(
+            f"Checked out {result['checked_out']} logs, released {result['lockers_released']} lockers "
+            f"in {result['duration_ms']} ms"
+        )
+        return Response(result)
+
+
+class IngestAPIView(APIView):
+    def post(self, request):
+        """Entries/exits a gate buffered offline: {"device": ..., "events": [{key, type, user, time, saloon}]}."""
+        serializer = IngestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        try:
+            results = ingest(data['device'], data['events'])
+        except IntegrityError:
+            # Another request is ingesting the same keys; a retry sees them as duplicates
+            return Response({'error': 'Events already being ingested, retry.'}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            'counts': Counter(result['status'] for result in results.values()),
+            'results': results,
+        })
+
+
+@require_GET
+async def presence_stream(request):
+    """Server-Sent Events feed of check-ins, check-outs and locker assignments."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Last-Event-ID'}, status=400)
+
+    response = StreamingHttpResponse(stream.events(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Let nginx pass events through as they are written
+    response['X-Accel-Buffering'] = 'no'
+    return response
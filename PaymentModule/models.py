@@ -10,5 +10,10 @@ class Payment(models.Model):
     payment_status = models.CharField(max_length=100, null=True, blank=True)
     full_name = models.CharField(max_length=200, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"Payment by {self.full_name or self.user_id} on {self.payment_date}"
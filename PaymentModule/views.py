@@ -10,6 +10,8 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from DataInsight import jalali
+from GymAutomation.pagination import InvalidPage, paginate
 from .models import Payment
 from .serializers import PaymentSerializer
 from UserModule.models import GenMember
@@ -70,6 +72,22 @@ class PaymentSummaryAPIView(APIView):
                 'count': item['count'] or 0
             }
 
+        # Same totals per month of the current Jalali year, grouped in SQL through the calendar table
+        jalali_year = jalali.today().year
+        year_start, year_end = jalali.period(jalali_year)
+        jalali_monthly_prices = {
+            f"{jalali_year}-{month:02d}": {'total_price': 0, 'count': 0} for month in range(1, 13)
+        }
+        jalali_months = jalali.group_by(
+            payments.filter(payment_date__gte=year_start, payment_date__lt=year_end), 'payment_date',
+            parts=('month',), total_price=('sum', 'price'), count=('count', 'id'),
+        )
+        for item in jalali_months:
+            jalali_monthly_prices[f"{jalali_year}-{item['month']:02d}"] = {
+                'total_price': item['total_price'] or 0,
+                'count': item['count'],
+            }
+
         return Response({
             'daily_count': dict(daily_count),  # ✅ NEW
             'total_price': total_price,
@@ -81,11 +99,16 @@ class PaymentSummaryAPIView(APIView):
             'today_price': today_price,
             'today_count': today_count,
             'monthly_prices': dict(monthly_prices),
+            'jalali_monthly_prices': jalali_monthly_prices,
         })
 
 
 
 
+# Newest first; walked backwards along payment_date_id_idx
+PAYMENT_ORDERING = ['-payment_date', '-id']
+
+
 class PaymentAPIView(APIView):
     def get(self, request):
         year_param = request.query_params.get('year')
@@ -96,23 +119,14 @@ class PaymentAPIView(APIView):
 
             payments_in_year = Payment.objects.filter(payment_date__range=[start_date, end_date]).order_by('-payment_date')
             total_price_year = payments_in_year.aggregate(total=Sum('price'))['total'] or 0
-            total_items = payments_in_year.count()
 
             # Pagination
             try:
-                page = int(request.query_params.get('page', 1))
-                limit = int(request.query_params.get('limit', 10))
-                if page < 1 or limit < 1:
-                    raise ValueError
-            except ValueError:
-                return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
+                page = paginate(request, payments_in_year, PAYMENT_ORDERING)
+            except InvalidPage as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_payments = payments_in_year[start:end]
-
-            serializer = PaymentSerializer(paginated_payments, many=True)
-            total_pages = (total_items + limit - 1) // limit
+            serializer = PaymentSerializer(page.items, many=True)
 
             # Monthly summary: 12 months before + current = 13 total
             monthly_summary = []
@@ -139,10 +153,12 @@ class PaymentAPIView(APIView):
                 "start_date": start_date.strftime('%Y-%m-%d'),
                 "end_date": end_date.strftime('%Y-%m-%d'),
                 "total_price": total_price_year,
-                "total_items": total_items,
-                "limit": limit,
-                "page": page,
-                "total_pages": total_pages,
+                "total_items": page.total_items,
+                "total_items_estimated": page.estimated,
+                "limit": page.limit,
+                "page": page.number,
+                "total_pages": page.total_pages,
+                "next_cursor": page.next_cursor,
                 "monthly_summary": monthly_summary,
                 "items": serializer.data
             })
@@ -169,59 +185,42 @@ class PaymentAPIView(APIView):
             elif end_date:
                 payments_filtered = payments_filtered.filter(payment_date__lt=end_date)
 
-            payments_filtered = payments_filtered.order_by('-payment_date')
-
-            total_items = payments_filtered.count()
-
             # Pagination
             try:
-                page = int(request.query_params.get('page', 1))
-                limit = int(request.query_params.get('limit', 10))
-                if page < 1 or limit < 1:
-                    raise ValueError
-            except ValueError:
-                return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
-
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_payments = payments_filtered[start:end]
+                page = paginate(request, payments_filtered, PAYMENT_ORDERING)
+            except InvalidPage as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = PaymentSerializer(paginated_payments, many=True)
-            total_pages = (total_items + limit - 1) // limit
+            serializer = PaymentSerializer(page.items, many=True)
 
             return Response({
-                "limit": limit,
-                "page": page,
-                "total_pages": total_pages,
-                "total_items": total_items,
+                "limit": page.limit,
+                "page": page.number,
+                "total_pages": page.total_pages,
+                "total_items": page.total_items,
+                "total_items_estimated": page.estimated,
+                "next_cursor": page.next_cursor,
                 "items": serializer.data
             })
         # === END NEW FILTERING LOGIC ===
 
         # Default: no year=1 and no start/end, return all with pagination as you already had
-        payments = Payment.objects.all().order_by('-payment_date')
+        payments = Payment.objects.all()
 
-        total_items = payments.count()
         try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-            if page < 1 or limit < 1:
-                raise ValueError
-        except ValueError:
-            return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
-
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_payments = payments[start:end]
+            page = paginate(request, payments, PAYMENT_ORDERING)
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = PaymentSerializer(paginated_payments, many=True)
-        total_pages = (total_items + limit - 1) // limit
+        serializer = PaymentSerializer(page.items, many=True)
 
         return Response({
-            "limit": limit,
-            "page": page,
-            "total_pages": total_pages,
-            "total_items": total_items,
+            "limit": page.limit,
+            "page": page.number,
+            "total_pages": page.total_pages,
+            "total_items": page.total_items,
+            "total_items_estimated": page.estimated,
+            "next_cursor": page.next_cursor,
             "items": serializer.data
         })
 
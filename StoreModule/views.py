@@ -2,7 +2,8 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.db.models import Q
-import math
+
+from GymAutomation.pagination import InvalidPage, paginate
 
 from .models import StoreConfiguration, Category, Product, Order
 from .serializers import (
@@ -19,6 +20,7 @@ class BaseAPIView(APIView):
     model = None
     serializer_class = None
     filter_fields = []
+    ordering = ['id']
 
     def build_filters(self, request):
         """Override this in subclasses if needed"""
@@ -43,24 +45,17 @@ class BaseAPIView(APIView):
 
         # Pagination
         try:
-            page = int(request.query_params.get("page", 1))
-            limit = int(request.query_params.get("limit", 10))
-            if page < 1 or limit < 1:
-                raise ValueError
-        except ValueError:
-            return Response({"error": "Invalid pagination parameters"}, status=400)
-
-        total_items = queryset.count()
-        total_pages = math.ceil(total_items / limit) if total_items else 1
-        start = (page - 1) * limit
-        end = start + limit
-        paginated = queryset[start:end]
-
-        serializer = self.serializer_class(paginated, many=True)
+            page = paginate(request, queryset, self.ordering, empty_pages=1)
+        except InvalidPage as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        serializer = self.serializer_class(page.items, many=True)
         return Response({
-            "total_items": total_items,
-            "total_pages": total_pages,
-            "current_page": page,
+            "total_items": page.total_items,
+            "total_pages": page.total_pages,
+            "current_page": page.number,
+            "next_cursor": page.next_cursor,
+            "total_items_estimated": page.estimated,
             "data": serializer.data
         })
 
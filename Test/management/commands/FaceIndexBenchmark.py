@@ -0,0 +1,66 @@
+import time
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from UserModule.face_index import FaceIndex, ROWS_PER_MEMBER
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p99 face identification latency on a synthetic embedding gallery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=20000, help='Gallery size (members, 5 templates each)')
+        parser.add_argument('--queries', type=int, default=200, help='Number of timed search calls')
+        parser.add_argument('--batch', type=int, default=1, help='Probes per search call')
+        parser.add_argument('--ivf-min-members', type=int, default=None,
+                            help='Override FACE_INDEX_IVF_MIN_MEMBERS (0 forces IVF on)')
+        parser.add_argument('--noise', type=float, default=0.3, help='Probe noise relative to the enrolled embedding')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def handle(self, *args, **options):
+        ivf_min = options['ivf_min_members']
+        if ivf_min is None:
+            ivf_min = getattr(settings, 'FACE_INDEX_IVF_MIN_MEMBERS', 50000)
+        with override_settings(FACE_INDEX_IVF_MIN_MEMBERS=ivf_min):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        rng = np.random.default_rng(0)
+        dim = getattr(settings, 'FACE_EMBEDDING_DIM', 512)
+        members = options['members']
+
+        self.log(f"Building gallery of {members} members x {ROWS_PER_MEMBER} templates, dim {dim}...")
+        identities = rng.standard_normal((members, 1, dim), dtype=np.float32)
+        templates = identities + 0.2 * rng.standard_normal((members, ROWS_PER_MEMBER, dim), dtype=np.float32)
+
+        index = FaceIndex()
+        started = time.perf_counter()
+        index.load(np.arange(1, members + 1, dtype=np.int64), templates)
+        self.log(f"Loaded in {time.perf_counter() - started:.2f} s, stats: {index.stats()}")
+
+        timings = []
+        hits = 0
+        for _ in range(options['queries']):
+            targets = rng.integers(0, members, size=options['batch'])
+            probes = identities[targets, 0] + options['noise'] * rng.standard_normal((len(targets), dim), dtype=np.float32)
+            payload = [probe.astype(np.float32).tobytes() for probe in probes]
+
+            started = time.perf_counter()
+            results = index.search(payload, top_k=5, threshold=0.0)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += sum(1 for target, matches in zip(targets, results) if matches and matches[0][0] == target + 1)
+
+        timings = np.array(timings)
+        total = options['queries'] * options['batch']
+        self.stdout.write("\n===== SUMMARY =====")
+        self.stdout.write(f"Members: {members}  Batch: {options['batch']}  IVF lists: {index.stats()['ivf_lists']}")
+        self.stdout.write(f"p50: {np.percentile(timings, 50):.2f} ms  p99: {np.percentile(timings, 99):.2f} ms per call")
+        self.stdout.write(f"Top-1 accuracy: {hits}/{total}")
+        self.log("Face index benchmark finished.")
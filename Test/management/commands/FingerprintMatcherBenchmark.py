@@ -0,0 +1,70 @@
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from UserModule.fingerprint_matcher import FingerprintMatcher, template_width
+
+
+class Command(BaseCommand):
+    help = 'Benchmark 1:N fingerprint identification on synthetic galleries of 10k/100k/1M templates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma separated gallery sizes (templates)')
+        parser.add_argument('--probes', type=int, default=50, help='Probes per gallery size')
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Shard galleries of 200k+ templates across this many processes')
+        parser.add_argument('--noise', type=float, default=0.1,
+                            help='Fraction of bits flipped in each probe to mimic a re-scan')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def handle(self, *args, **options):
+        with override_settings(FINGERPRINT_MATCHER_WORKERS=options['workers']):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        rng = np.random.default_rng(0)
+        width = template_width()
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+
+        self.log(f"Template width {width} bytes, {options['probes']} probes per size, "
+                 f"{options['workers'] or 'no'} pool workers.")
+        for size in sizes:
+            templates = rng.integers(0, 256, size=(size, width), dtype=np.uint8)
+            member_ids = np.arange(1, size + 1, dtype=np.int64)
+
+            matcher = FingerprintMatcher()
+            started = time.perf_counter()
+            matcher.load(member_ids, templates)
+            load_seconds = time.perf_counter() - started
+
+            hits = 0
+            timings = []
+            for _ in range(options['probes']):
+                row = int(rng.integers(0, size))
+                flips = np.unpackbits(templates[row]).astype(bool) ^ (rng.random(width * 8) < options['noise'])
+                probe = np.packbits(flips).tobytes()
+
+                started = time.perf_counter()
+                candidates = matcher.identify(probe, top_k=options['top_k'], threshold=0.0)
+                timings.append((time.perf_counter() - started) * 1000)
+                if candidates and candidates[0][0] == row + 1:
+                    hits += 1
+
+            timings = np.array(timings)
+            self.stdout.write(
+                f"{size:>9} templates | load {load_seconds:6.2f} s | "
+                f"p50 {np.percentile(timings, 50):8.2f} ms | p99 {np.percentile(timings, 99):8.2f} ms | "
+                f"top-1 hits {hits}/{options['probes']} | matrix {matcher.stats()['memory_bytes'] / 2 ** 20:.0f} MiB"
+            )
+            matcher.close()
+            del matcher, templates
+
+        self.log("Fingerprint matcher benchmark finished.")
@@ -0,0 +1,103 @@
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from UserModule.id_allocator import id_allocator
+from UserModule.models import GenMember, MemberBiometrics
+from UserModule.views import DynamicAPIView
+
+MARKER = 'row-width-benchmark'
+# Roughly what the gate devices store: ~0.5 KB per fingerprint, 512 float32 per face
+FINGERPRINT_BYTES = 512
+FACE_BYTES = 2048
+
+
+class Command(BaseCommand):
+    help = 'Compare member row width with and without the biometric templates and time the member listing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Members with templates to insert before measuring')
+        parser.add_argument('--limit', type=int, default=100, help='Page size of the timed listing')
+        parser.add_argument('--repeats', type=int, default=50)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded members afterwards')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def seed(self, count):
+        self.log(f"Seeding {count} members with templates...")
+        for start in range(0, count, 2000):
+            size = min(2000, count - start)
+            ids = id_allocator.allocate(GenMember, size)
+            members = [GenMember(id=member_id, modifier=MARKER) for member_id in ids]
+            GenMember.objects.bulk_create(members)
+            MemberBiometrics.objects.bulk_create([
+                MemberBiometrics(
+                    member=member,
+                    **{field: os.urandom(FINGERPRINT_BYTES) for field in ('minutiae', 'minutiae2', 'minutiae3')},
+                    **{f'face_template_{n}': os.urandom(FACE_BYTES) for n in range(1, 6)},
+                )
+                for member in members
+            ])
+        with connection.cursor() as cursor:
+            for model in (GenMember, MemberBiometrics):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+    def row_widths(self):
+        quote = connection.ops.quote_name
+        members = quote(GenMember._meta.db_table)
+        biometrics = quote(MemberBiometrics._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT avg(pg_column_size(m.*)), avg(pg_column_size(m.*) + coalesce(pg_column_size(b.*), 0)), "
+                f"pg_total_relation_size('{members}'), pg_total_relation_size('{biometrics}') "
+                f"FROM {members} m LEFT JOIN {biometrics} b ON b.member_id = m.id"
+            )
+            return cursor.fetchone()
+
+    def time_listing(self, limit, repeats, include_templates):
+        factory = APIRequestFactory()
+        view = DynamicAPIView.as_view()
+        params = {'action': 'member', 'limit': limit, 'page': 1, 'count': 'none'}
+        if include_templates:
+            params['include_templates'] = '1'
+        timings = []
+        size = 0
+        for _ in range(repeats):
+            request = factory.get('/api/dynamic/', params)
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append(time.perf_counter() - started)
+            size = len(response.content)
+        timings = np.array(timings) * 1000
+        return np.percentile(timings, 50), np.percentile(timings, 99), size
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+
+        narrow, wide, member_bytes, biometric_bytes = self.row_widths()
+        if narrow is None:
+            self.log("No members to measure")
+            return
+        self.log(
+            f"Average member row: {narrow:.0f} bytes, {wide:.0f} bytes with templates inline "
+            f"({(1 - float(narrow) / float(wide)) * 100:.1f}% narrower)"
+        )
+        self.log(f"Member table {member_bytes / 1024:.0f} KiB, biometrics table {biometric_bytes / 1024:.0f} KiB")
+
+        for include_templates in (False, True):
+            p50, p99, size = self.time_listing(options['limit'], options['repeats'], include_templates)
+            label = 'with templates   ' if include_templates else 'without templates'
+            self.log(f"Listing {options['limit']} members {label}: p50 {p50:.2f} ms, p99 {p99:.2f} ms, {size} bytes")
+
+        if options['cleanup']:
+            deleted, _ = GenMember.objects.filter(modifier=MARKER).delete()
+            self.log(f"Deleted {deleted} seeded rows")
@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from UserModule.id_allocator import id_allocator
+from UserModule.models import GenPerson
+from UserModule.search import normalize_name, search_persons
+
+FIRST_NAMES = ['علی', 'محمد', 'رضا', 'حسین', 'مهدی', 'سارا', 'مریم', 'زهرا', 'فاطمه', 'نرگس', 'امیر', 'کیان']
+LAST_NAMES = ['کریمی', 'رحیمی', 'محمدی', 'حسینی', 'احمدی', 'کاظمی', 'موسوی', 'یزدانی', 'نیک‌نام', 'شریفی']
+MARKER = 'search-benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic persons and measure p50/p99 latency of the trigram name search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Persons to insert before measuring')
+        parser.add_argument('--queries', type=int, default=200, help='Number of timed searches')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded persons afterwards')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def random_name(self, rng):
+        # Mix in Arabic yeh/kaf spellings so the normalization is exercised
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if rng.random() < 0.2:
+            last = last.replace('ی', 'ي').replace('ک', 'ك')
+        return first, f"{last}{rng.randint(1, 999)}"
+
+    def seed(self, count, rng):
+        self.log(f"Seeding {count} persons...")
+        for start in range(0, count, 5000):
+            size = min(5000, count - start)
+            persons = []
+            for person_id in id_allocator.allocate(GenPerson, size):
+                first, last = self.random_name(rng)
+                person = GenPerson(id=person_id, first_name=first, last_name=last,
+                                   full_name=f"{first} {last}", modifier=MARKER)
+                person.refresh_search_key()
+                persons.append(person)
+            GenPerson.objects.bulk_create(persons)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(GenPerson._meta.db_table)}")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        if options['seed']:
+            self.seed(options['seed'], rng)
+        self.log(f"{GenPerson.objects.count()} persons in the table")
+
+        queries = []
+        for _ in range(options['queries']):
+            first, last = self.random_name(rng)
+            # Prefixes, whole names and misspelled last names
+            queries.append(rng.choice([first[:2], last[:4], f"{first} {last[:3]}", last[:-2] + 'ی']))
+
+        timings = []
+        hits = 0
+        for query in queries:
+            started = time.perf_counter()
+            results = search_persons(query, options['limit'])
+            timings.append(time.perf_counter() - started)
+            hits += bool(results)
+
+        timings = np.array(timings) * 1000
+        self.log(
+            f"{len(queries)} searches: p50 {np.percentile(timings, 50):.2f} ms, "
+            f"p99 {np.percentile(timings, 99):.2f} ms, {hits} with results"
+        )
+
+        key = normalize_name(queries[0])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"EXPLAIN ANALYZE SELECT id FROM {connection.ops.quote_name(GenPerson._meta.db_table)} "
+                f"WHERE search_key %%> %s LIMIT %s",
+                [key, options['limit']],
+            )
+            self.log("Plan for %r:\n%s" % (key, '\n'.join(row[0] for row in cursor.fetchall())))
+
+        if options['cleanup']:
+            deleted, _ = GenPerson.objects.filter(modifier=MARKER).delete()
+            self.log(f"Deleted {deleted} seeded rows")
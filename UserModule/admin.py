@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import GenMembershipType, GenPersonRole, GenShift, GenMember, GenPerson, SecUser, Sport, CoachManagement, CoachUsers
+from .models import GenMembershipType, GenPersonRole, GenShift, GenMember, MemberBiometrics, GenPerson, SecUser, Sport, CoachManagement, CoachUsers
 
 admin.site.register(GenMembershipType)
 admin.site.register(GenPersonRole)
 admin.site.register(GenShift)
-admin.site.register(GenMember)
+admin.site.register(GenMember)
+admin.site.register(MemberBiometrics)
 admin.site.register(GenPerson)
 admin.site.register(SecUser)
 admin.site.register(Sport)
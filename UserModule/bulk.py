@@ -0,0 +1,285 @@
+"""
+Batch create/update for DynamicAPIView.
+
+A JSON array sent to api/dynamic/ is validated row by row with the
+action's serializer, but related-object lookups are served from one
+prefetch query per field, new ids come from a single sequence call and
+the valid rows are written with bulk_create/bulk_update in one
+transaction. Invalid rows are reported with their index and skipped.
+"""
+from django.apps import apps
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from .id_allocator import id_allocator
+from .models import GenMember, GenPerson, MemberBiometrics
+from .signals import reindex_members
+
+BATCH_SIZE = 500
+
+
+class _Prefetched:
+    """Stands in for a related field's queryset, answering pk lookups from a prefetched dict."""
+
+    def __init__(self, model, objects):
+        self.model = model
+        self._objects = objects
+
+    def get(self, pk):
+        try:
+            pk = self.model._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise ValueError(pk)
+        try:
+            return self._objects[pk]
+        except KeyError:
+            raise self.model.DoesNotExist
+
+
+def _to_pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except (DjangoValidationError, TypeError):
+        return None
+
+
+def _prefetch_related(serializer_class, rows):
+    """One in_bulk() per related field for every pk referenced anywhere in the batch."""
+    lookups = {}
+    for name, field in serializer_class().fields.items():
+        if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        queryset = field.get_queryset()
+        pks = {_to_pk(queryset.model, row.get(name)) for row in rows if row.get(name) not in (None, '')}
+        pks.discard(None)
+        lookups[name] = _Prefetched(queryset.model, queryset.in_bulk(pks) if pks else {})
+    return lookups
+
+
+def _row_serializer(serializer_class, lookups, *args, **kwargs):
+    serializer = serializer_class(*args, **kwargs)
+    for name, prefetched in lookups.items():
+        serializer.fields[name].queryset = prefetched
+    # Id clashes are checked for the whole batch in one query instead
+    if 'id' in serializer.fields:
+        id_field = serializer.fields['id']
+        id_field.validators = [v for v in id_field.validators if not isinstance(v, UniqueValidator)]
+    return serializer
+
+
+def _log_end_dates(members):
+    """Bulk equivalent of the MemberSubLog entry GenMember.save() writes for a new member's end_date."""
+    MemberSubLog = apps.get_model('DataInsight', 'MemberSubLog')
+    MemberSubLog.objects.bulk_create([
+        MemberSubLog(member=member, end_date=member.end_date)
+        for member in members
+        if member.end_date
+    ], batch_size=BATCH_SIZE)
+
+
+def _write_biometrics(templates, existing):
+    """Upsert the MemberBiometrics rows of a batch; templates maps member -> changed template fields."""
+    rows = []
+    fields = set()
+    for member, changes in templates.items():
+        row = existing.get(member.pk) or MemberBiometrics(member=member)
+        for attr, value in changes.items():
+            setattr(row, attr, value)
+        fields.update(changes)
+        rows.append(row)
+    if rows:
+        MemberBiometrics.objects.bulk_create(
+            rows, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['member'], update_fields=sorted(fields),
+        )
+    return rows
+
+
+def _split_rows(rows):
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        if isinstance(row, dict):
+            valid.append(index)
+        else:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'non_field_errors': ['Expected an object.']}}
+    return results, valid
+
+
+def bulk_create(model, serializer_class, rows, pool=False):
+    """
+    Create every valid row of the batch.
+    Returns one {'index', 'status', 'id' | 'errors'} result per row, in input order.
+    """
+    results, indexes = _split_rows(rows)
+    rows = {index: dict(rows[index]) for index in indexes}
+    full_names = {}
+    if pool:
+        for index, row in rows.items():
+            row['is_single_settion'] = True
+            row['session_left'] = 1
+            full_name = row.pop('full_name', None)
+            if full_name:
+                full_names[index] = full_name
+
+    # Explicit ids must be free and unique within the batch; the rest get fresh ones
+    explicit = {}
+    for index in list(rows):
+        value = rows[index].get('id')
+        if value in (None, ''):
+            continue
+        object_id = _to_pk(model, value)
+        if object_id is None:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['Invalid ID format']}}
+            del rows[index]
+        else:
+            explicit[index] = object_id
+    taken = set(model.objects.filter(id__in=set(explicit.values())).values_list('id', flat=True))
+    floor = id_allocator.explicit_floor(model) if explicit else 1
+    seen = set()
+    for index, object_id in list(explicit.items()):
+        if object_id in taken or object_id in seen:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['This id already exists.']}}
+        elif object_id < floor:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['This id is already allocated.']}}
+        else:
+            seen.add(object_id)
+            continue
+        del rows[index], explicit[index]
+    # Move the sequence past the explicit ids before any fresh id is drawn
+    if explicit and not id_allocator.reserve(model, max(explicit.values())):
+        for index in explicit:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['This id is already allocated.']}}
+            del rows[index]
+    missing = [index for index in rows if rows[index].get('id') in (None, '')]
+    for index, object_id in zip(missing, id_allocator.allocate(model, len(missing)) if missing else ()):
+        rows[index]['id'] = object_id
+
+    lookups = _prefetch_related(serializer_class, list(rows.values()))
+    objects = {}
+    templates = {}
+    for index, row in rows.items():
+        serializer = _row_serializer(serializer_class, lookups, data=row)
+        if serializer.is_valid():
+            validated = dict(serializer.validated_data)
+            if validated.get('biometrics'):
+                templates[index] = validated.pop('biometrics')
+            objects[index] = model(**validated)
+            if model is GenPerson:
+                objects[index].refresh_search_key()
+        else:
+            results[index] = {'index': index, 'status': 'failed', 'errors': serializer.errors}
+
+    persons = {}
+    if full_names:
+        person_ids = id_allocator.allocate(GenPerson, len(full_names))
+        persons = {
+            index: GenPerson(id=person_id, full_name=full_names[index])
+            for index, person_id in zip(full_names, person_ids)
+            if index in objects
+        }
+        for index, person in persons.items():
+            person.refresh_search_key()
+            objects[index].person = person
+
+    created = list(objects.values())
+    if model is GenMember:
+        now = timezone.now()
+        for member in created:
+            member.last_change_datetime = now
+
+    with transaction.atomic():
+        if model is GenPerson:
+            # Only rows that passed validation store their photos
+            for person in created:
+                person.offload_images()
+        if persons:
+            GenPerson.objects.bulk_create(persons.values(), batch_size=BATCH_SIZE)
+        model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if model is GenMember:
+            if pool:
+                # Same as the single-row pool path: membership time is the exact creation time
+                for member in created:
+                    member.membership_datetime = member.creation_datetime.strftime('%Y-%m-%d %H:%M:%S')
+                model.objects.bulk_update(created, ['membership_datetime'], batch_size=BATCH_SIZE)
+            _log_end_dates(created)
+            biometrics = _write_biometrics({objects[index]: changes for index, changes in templates.items()}, {})
+
+    if templates:
+        reindex_members(biometrics)
+    for index, obj in objects.items():
+        results[index] = {'index': index, 'status': 'created', 'id': obj.pk}
+    return results
+
+
+def bulk_update(model, serializer_class, rows):
+    """
+    Partially update every valid row of the batch; each row names its object by 'id'.
+    Returns one {'index', 'status', 'id' | 'errors'} result per row, in input order.
+    """
+    results, indexes = _split_rows(rows)
+    object_ids = {}
+    seen = set()
+    for index in indexes:
+        object_id = _to_pk(model, rows[index].get('id'))
+        if object_id is None:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['ID is required']}}
+        elif object_id in seen:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['Duplicate id in batch.']}}
+        else:
+            object_ids[index] = object_id
+            seen.add(object_id)
+
+    instances = model.objects.in_bulk(object_ids.values())
+    lookups = _prefetch_related(serializer_class, [rows[index] for index in object_ids])
+    updated = {}
+    templates = {}
+    fields = set()
+    for index, object_id in object_ids.items():
+        instance = instances.get(object_id)
+        if instance is None:
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'id': ['Not found.']}}
+            continue
+        data = {key: value for key, value in rows[index].items() if key != 'id'}
+        serializer = _row_serializer(serializer_class, lookups, instance, data=data, partial=True)
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'status': 'failed', 'errors': serializer.errors}
+            continue
+        validated = dict(serializer.validated_data)
+        if validated.get('biometrics'):
+            templates[instance] = validated.pop('biometrics')
+        for attr, value in validated.items():
+            setattr(instance, attr, value)
+        fields.update(validated)
+        updated[index] = instance
+
+    members = list(updated.values())
+    if model is GenPerson and fields & set(GenPerson.NAME_FIELDS):
+        for person in members:
+            person.refresh_search_key()
+        fields.add('search_key')
+    if model is GenMember and members:
+        now = timezone.now()
+        for member in members:
+            member.last_change_datetime = now
+        fields.add('last_change_datetime')
+
+    if fields:
+        existing = MemberBiometrics.objects.in_bulk([member.pk for member in templates]) if templates else {}
+        with transaction.atomic():
+            if model is GenPerson:
+                for person in members:
+                    fields.update(person.offload_images())
+            # GenMember's queryset logs end_date changes for the whole batch
+            model.objects.bulk_update(members, sorted(fields), batch_size=BATCH_SIZE)
+            if model is GenMember:
+                biometrics = _write_biometrics(templates, existing)
+
+    if templates:
+        reindex_members(biometrics)
+    for index, obj in updated.items():
+        results[index] = {'index': index, 'status': 'updated', 'id': obj.pk}
+    return results
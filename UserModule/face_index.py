@@ -0,0 +1,377 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .fingerprint_index import refresh_watermark
+
+FACE_FIELDS = (
+    'face_template_1', 'face_template_2', 'face_template_3', 'face_template_4', 'face_template_5',
+)
+MEMBER_FACE_LOOKUPS = tuple(f'biometrics__{field}' for field in FACE_FIELDS)
+ROWS_PER_MEMBER = len(FACE_FIELDS)
+FREE_SLOT = -1
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def decode_embedding(template, dim=None):
+    """Raw face template -> unit-length float32 vector, or None if it isn't a dim-sized embedding."""
+    dim = dim or int(_setting('FACE_EMBEDDING_DIM', 512))
+    if not template:
+        return None
+    raw = bytes(template)
+    if len(raw) != dim * 4:
+        return None
+    vector = np.frombuffer(raw, dtype=np.float32).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _kmeans(vectors, lists, iterations=10, seed=0):
+    """Spherical k-means used to train the IVF coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for list_id in range(lists):
+            members = vectors[assignment == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+class FaceIndex:
+    """
+    Preloaded face embedding gallery for 1:N identification.
+
+    Each member owns one slot of five consecutive float32 rows (one per
+    face_template_N, zero when missing), all L2-normalized so a batch of
+    probes is scored against the whole gallery with a single matrix
+    multiply. Once the gallery reaches FACE_INDEX_IVF_MIN_MEMBERS the rows
+    are also bucketed by a k-means coarse quantizer into inverted lists,
+    and only the rows of the FACE_INDEX_IVF_PROBES closest lists are
+    scored. The quantizer is trained when the gallery crosses that size,
+    by a build or by incremental adds, and retrained each time it doubles.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dim = None
+        self._capacity = 0
+        self._size = 0
+        self._free = []
+        self._matrix = None
+        self._slot_members = None
+        self._member_slots = {}
+        self._centroids = None
+        self._trained_members = 0
+        self._row_lists = None      # row -> list id (-1: none)
+        self._list_rows = []        # list id -> set of rows
+        self._list_arrays = {}      # list id -> sorted row array, rebuilt after the list changes
+        self._built = False
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._build_stats = {}
+
+    @property
+    def is_built(self):
+        return self._built
+
+    # ---------- storage ----------
+
+    def _allocate(self, capacity):
+        matrix = np.zeros((capacity * ROWS_PER_MEMBER, self._dim), dtype=np.float32)
+        slot_members = np.full(capacity, FREE_SLOT, dtype=np.int64)
+        row_lists = np.full(capacity * ROWS_PER_MEMBER, -1, dtype=np.int32)
+        if self._matrix is not None:
+            used_rows = self._size * ROWS_PER_MEMBER
+            matrix[:used_rows] = self._matrix[:used_rows]
+            slot_members[:self._size] = self._slot_members[:self._size]
+            row_lists[:used_rows] = self._row_lists[:used_rows]
+        self._matrix, self._slot_members, self._row_lists = matrix, slot_members, row_lists
+        self._capacity = capacity
+
+    def _next_slot(self):
+        if self._free:
+            return self._free.pop()
+        if self._size == self._capacity:
+            self._allocate(max(1024, self._capacity * 2))
+        self._size += 1
+        return self._size - 1
+
+    def _unassign_lists(self, rows):
+        for row, list_id in zip(np.asarray(rows).tolist(), self._row_lists[rows].tolist()):
+            if list_id >= 0:
+                self._list_rows[list_id].discard(row)
+                self._list_arrays.pop(list_id, None)
+        self._row_lists[rows] = -1
+
+    def _assign_lists(self, rows):
+        if self._centroids is None:
+            return
+        self._unassign_lists(rows)
+        block = self._matrix[rows]
+        lists = np.argmax(block @ self._centroids.T, axis=1).astype(np.int32)
+        # Empty (missing template) rows never belong to a bucket
+        lists[~block.any(axis=1)] = -1
+        self._row_lists[rows] = lists
+        for row, list_id in zip(np.asarray(rows).tolist(), lists.tolist()):
+            if list_id >= 0:
+                self._list_rows[list_id].add(row)
+                self._list_arrays.pop(list_id, None)
+
+    def _list_array(self, list_id):
+        rows = self._list_arrays.get(list_id)
+        if rows is None:
+            rows = np.array(sorted(self._list_rows[list_id]), dtype=np.int64)
+            self._list_arrays[list_id] = rows
+        return rows
+
+    def _set_member(self, member_id, templates):
+        slot = self._member_slots.pop(member_id, None)
+        vectors = [decode_embedding(template, self._dim) for template in templates]
+        if not any(vector is not None for vector in vectors):
+            if slot is not None:
+                rows = np.arange(slot * ROWS_PER_MEMBER, (slot + 1) * ROWS_PER_MEMBER)
+                self._matrix[rows] = 0
+                self._unassign_lists(rows)
+                self._slot_members[slot] = FREE_SLOT
+                self._free.append(slot)
+            return
+        if slot is None:
+            slot = self._next_slot()
+        rows = np.arange(slot * ROWS_PER_MEMBER, (slot + 1) * ROWS_PER_MEMBER)
+        for row, vector in zip(rows, vectors):
+            self._matrix[row] = 0 if vector is None else vector
+        self._slot_members[slot] = member_id
+        self._member_slots[member_id] = slot
+        self._assign_lists(rows)
+
+    def _train_ivf(self):
+        members = len(self._member_slots)
+        self._centroids = None
+        self._row_lists[:] = -1
+        self._list_rows = []
+        self._list_arrays = {}
+        self._trained_members = members
+        if members < int(_setting('FACE_INDEX_IVF_MIN_MEMBERS', 50000)):
+            return
+        used = self._matrix[:self._size * ROWS_PER_MEMBER]
+        filled = np.flatnonzero(used.any(axis=1))
+        lists = int(_setting('FACE_INDEX_IVF_LISTS', 0)) or int(np.sqrt(len(filled)))
+        rng = np.random.default_rng(0)
+        sample = used[rng.choice(filled, size=min(len(filled), 50000), replace=False)]
+        self._centroids = _kmeans(sample, min(lists, len(sample)))
+        self._list_rows = [set() for _ in range(len(self._centroids))]
+        self._assign_lists(filled)
+
+    def _retrain_if_due(self):
+        # After incremental changes: train once the gallery is big enough, retrain as it doubles
+        members = len(self._member_slots)
+        min_members = int(_setting('FACE_INDEX_IVF_MIN_MEMBERS', 50000))
+        if self._centroids is None:
+            due = members >= min_members
+        else:
+            due = members < min_members or members >= 2 * self._trained_members
+        if due:
+            self._train_ivf()
+
+    def load(self, member_ids, templates):
+        """
+        Replace the gallery with pre-decoded embeddings.
+        templates is a (members, 5, dim) float32 array, zero rows for missing templates.
+        """
+        with self._lock:
+            self._dim = templates.shape[2]
+            self._matrix = None
+            self._size = 0
+            self._free = []
+            self._watermark = None
+            self._allocate(max(1024, len(member_ids)))
+            rows = len(member_ids) * ROWS_PER_MEMBER
+            self._matrix[:rows] = _normalize(templates.reshape(rows, self._dim).astype(np.float32))
+            self._slot_members[:len(member_ids)] = member_ids
+            self._size = len(member_ids)
+            self._member_slots = {member_id: slot for slot, member_id in enumerate(np.asarray(member_ids).tolist())}
+            self._train_ivf()
+            self._built = True
+
+    def build(self):
+        from .models import MemberBiometrics
+
+        started = time.perf_counter()
+        built_at = timezone.now()
+        with self._lock:
+            self._dim = int(_setting('FACE_EMBEDDING_DIM', 512))
+            self._matrix = None
+            self._size = 0
+            self._free = []
+            self._member_slots = {}
+            self._centroids = None
+            self._allocate(1024)
+
+            has_face = MemberBiometrics.objects.exclude(**{f'{field}__isnull': True for field in FACE_FIELDS})
+            rows = has_face.values_list('member_id', *FACE_FIELDS).iterator(chunk_size=2000)
+            for member_id, *templates in rows:
+                self._set_member(member_id, templates)
+            self._train_ivf()
+
+            self._watermark = refresh_watermark(built_at)
+            self._last_refresh = time.monotonic()
+            self._built = True
+            self._build_stats = {
+                'built_at': built_at,
+                'build_seconds': round(time.perf_counter() - started, 3),
+            }
+        return self.stats()
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def warm_up(self):
+        thread = threading.Thread(target=self.ensure_built, name='face-index-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self):
+        """Pull templates written or deleted by other processes since the last build/refresh."""
+        from .models import GenMember, GenMemberTombstone
+
+        with self._lock:
+            if not self._built:
+                self.build()
+                return
+            if self._watermark is None:
+                return
+            watermark = refresh_watermark(timezone.now())
+            deleted = (
+                GenMemberTombstone.objects
+                .filter(deleted_at__gte=self._watermark)
+                .values_list('member_id', flat=True)
+            )
+            for member_id in deleted:
+                self._set_member(member_id, ())
+            changed = (
+                GenMember.objects
+                .filter(last_change_datetime__gte=self._watermark)
+                .values_list('id', *MEMBER_FACE_LOOKUPS)
+            )
+            for member_id, *templates in changed:
+                self._set_member(member_id, templates)
+            self._retrain_if_due()
+            self._watermark = watermark
+            self._last_refresh = time.monotonic()
+
+    def _refresh_if_due(self):
+        interval = _setting('FINGERPRINT_INDEX_REFRESH_SECONDS', 5)
+        if self._watermark is not None and time.monotonic() - self._last_refresh >= interval:
+            self.refresh()
+
+    def update_member(self, member_id, templates):
+        if not self._built:
+            return
+        with self._lock:
+            self._set_member(member_id, templates)
+            self._retrain_if_due()
+
+    def remove_member(self, member_id):
+        self.update_member(member_id, ())
+
+    # ---------- search ----------
+
+    def _search_exhaustive(self, probes, top_k):
+        rows = self._size * ROWS_PER_MEMBER
+        scores = probes @ self._matrix[:rows].T
+        # Best of the member's five templates
+        member_scores = scores.reshape(len(probes), self._size, ROWS_PER_MEMBER).max(axis=2)
+        member_scores[:, self._slot_members[:self._size] == FREE_SLOT] = -1.0
+        count = min(top_k, self._size)
+        results = []
+        for probe_scores in member_scores:
+            if count == 0:
+                results.append([])
+                continue
+            slots = np.argpartition(probe_scores, -count)[-count:]
+            slots = slots[np.argsort(probe_scores[slots])[::-1]]
+            results.append(list(zip(self._slot_members[slots].tolist(), probe_scores[slots].tolist())))
+        return results
+
+    def _search_ivf(self, probes, top_k):
+        nprobe = int(_setting('FACE_INDEX_IVF_PROBES', 8))
+        results = []
+        for probe in probes:
+            lists = np.argsort(self._centroids @ probe)[::-1][:nprobe]
+            # Only the rows of the probed inverted lists are read
+            rows = np.concatenate([self._list_array(list_id) for list_id in lists.tolist()])
+            scores = self._matrix[rows] @ probe
+            # Best row per member: the first of each slot once ordered by descending score
+            order = np.argsort(-scores, kind='stable')
+            slots, first = np.unique(rows[order] // ROWS_PER_MEMBER, return_index=True)
+            best = order[first]
+            ranked = np.argsort(-scores[best], kind='stable')[:top_k]
+            results.append(list(zip(
+                self._slot_members[slots[ranked]].tolist(), scores[best[ranked]].tolist()
+            )))
+        return results
+
+    def search(self, templates, top_k=None, threshold=None):
+        """
+        Identify a batch of probe templates.
+        Returns one [(member_id, score), ...] list per probe, best first; undecodable probes get None.
+        """
+        self.ensure_built()
+        self._refresh_if_due()
+        top_k = top_k or int(_setting('FACE_MATCH_TOP_K', 5))
+        threshold = _setting('FACE_MATCH_THRESHOLD', 0.6) if threshold is None else threshold
+
+        with self._lock:
+            vectors = [decode_embedding(template, self._dim) for template in templates]
+            valid = [i for i, vector in enumerate(vectors) if vector is not None]
+            results = [None] * len(vectors)
+            if not valid:
+                return results
+            probes = np.vstack([vectors[i] for i in valid])
+            if self._centroids is not None:
+                matches = self._search_ivf(probes, top_k)
+            else:
+                matches = self._search_exhaustive(probes, top_k)
+
+        for i, probe_matches in zip(valid, matches):
+            results[i] = [
+                (member_id, round(score, 4)) for member_id, score in probe_matches
+                if member_id != FREE_SLOT and score >= threshold
+            ]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._built,
+                **self._build_stats,
+                'members': len(self._member_slots),
+                'capacity': self._capacity,
+                'embedding_dim': self._dim,
+                'ivf_lists': 0 if self._centroids is None else len(self._centroids),
+                'ivf_trained_members': self._trained_members if self._centroids is not None else 0,
+                'memory_bytes': 0 if self._matrix is None else self._matrix.nbytes + self._slot_members.nbytes + self._row_lists.nbytes,
+            }
+
+
+face_index = FaceIndex()
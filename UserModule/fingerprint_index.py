@@ -0,0 +1,184 @@
+import hashlib
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+TEMPLATE_FIELDS = ('minutiae', 'minutiae2', 'minutiae3')
+# The same fields read through GenMember (LEFT JOIN on MemberBiometrics)
+MEMBER_TEMPLATE_LOOKUPS = tuple(f'biometrics__{field}' for field in TEMPLATE_FIELDS)
+
+
+def template_digest(template):
+    """Fixed-size digest used as the index key for a raw template."""
+    return hashlib.blake2b(bytes(template), digest_size=16).digest()
+
+
+def refresh_watermark(now):
+    """
+    Where the next refresh starts reading: FINGERPRINT_SYNC_LAG_SECONDS before now, so a write stamped
+    before now but committed after it is still picked up (re-reading a member is harmless).
+    """
+    return now - timedelta(seconds=getattr(settings, 'FINGERPRINT_SYNC_LAG_SECONDS', 2))
+
+
+class FingerprintIndex:
+    """
+    Process-local exact-match index over MemberBiometrics fingerprint templates.
+
+    Maps the digest of every stored template to its member id, so a scan
+    can be verified with a single dict lookup instead of comparing every
+    template in the table. The index is built once per process, kept in
+    sync by the MemberBiometrics signals and catches up with writes made by
+    other workers through GenMember.last_change_datetime, which every
+    biometrics save bumps.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._digests = {}      # digest -> member id
+        self._members = {}      # member id -> tuple of digests
+        self._built = False
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._build_stats = {}
+
+    @property
+    def is_built(self):
+        return self._built
+
+    def build(self):
+        from .models import MemberBiometrics
+
+        started = time.perf_counter()
+        built_at = timezone.now()
+        digests = {}
+        members = {}
+        rows = (
+            MemberBiometrics.objects
+            .exclude(minutiae__isnull=True, minutiae2__isnull=True, minutiae3__isnull=True)
+            .values_list('member_id', *TEMPLATE_FIELDS)
+            .iterator(chunk_size=2000)
+        )
+        for member_id, *templates in rows:
+            keys = tuple(template_digest(t) for t in templates if t)
+            if keys:
+                members[member_id] = keys
+                for key in keys:
+                    digests[key] = member_id
+
+        with self._lock:
+            self._digests = digests
+            self._members = members
+            self._watermark = refresh_watermark(built_at)
+            self._last_refresh = time.monotonic()
+            self._built = True
+            self._build_stats = {
+                'built_at': built_at,
+                'build_seconds': round(time.perf_counter() - started, 3),
+                'members': len(members),
+                'templates': len(digests),
+            }
+        return self.stats()
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def warm_up(self):
+        """Build the index in a background thread so the first scan doesn't pay for it."""
+        thread = threading.Thread(target=self.ensure_built, name='fingerprint-index-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self):
+        """Pull templates changed or deleted by other processes since the last build/refresh."""
+        from .models import GenMember, GenMemberTombstone
+
+        with self._lock:
+            if not self._built:
+                self.build()
+                return
+            since = self._watermark
+            watermark = refresh_watermark(timezone.now())
+            deleted = GenMemberTombstone.objects.filter(deleted_at__gte=since).values_list('member_id', flat=True)
+            for member_id in deleted:
+                self._set_member(member_id, ())
+            rows = (
+                GenMember.objects
+                .filter(last_change_datetime__gte=since)
+                .values_list('id', *MEMBER_TEMPLATE_LOOKUPS)
+            )
+            for member_id, *templates in rows:
+                self._set_member(member_id, templates)
+            self._watermark = watermark
+            self._last_refresh = time.monotonic()
+
+    def _refresh_if_due(self):
+        # Before hits too, so templates replaced or cleared by another worker stop matching
+        interval = getattr(settings, 'FINGERPRINT_INDEX_REFRESH_SECONDS', 5)
+        if time.monotonic() - self._last_refresh >= interval:
+            self.refresh()
+
+    def _set_member(self, member_id, templates):
+        for key in self._members.pop(member_id, ()):
+            if self._digests.get(key) == member_id:
+                del self._digests[key]
+        keys = tuple(template_digest(t) for t in templates if t)
+        if keys:
+            self._members[member_id] = keys
+            for key in keys:
+                self._digests[key] = member_id
+
+    def update_member(self, member_id, templates):
+        # An unbuilt index will read the new templates from the database anyway
+        if not self._built:
+            return
+        with self._lock:
+            self._set_member(member_id, templates)
+
+    def remove_member(self, member_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._set_member(member_id, ())
+
+    def lookup(self, template):
+        """Return the id of the member owning this exact template, or None."""
+        self.ensure_built()
+        self._refresh_if_due()
+        return self._digests.get(template_digest(template))
+
+    def has_template(self, member_id, template):
+        """1:1 check of a template against a single member."""
+        self.ensure_built()
+        self._refresh_if_due()
+        return template_digest(template) in self._members.get(member_id, ())
+
+    def memory_bytes(self):
+        with self._lock:
+            total = sys.getsizeof(self._digests) + sys.getsizeof(self._members)
+            for key, member_id in self._digests.items():
+                total += sys.getsizeof(key) + sys.getsizeof(member_id)
+            for keys in self._members.values():
+                total += sys.getsizeof(keys)
+            return total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._built,
+                **self._build_stats,
+                'members': len(self._members),
+                'templates': len(self._digests),
+                'watermark': self._watermark,
+                'memory_bytes': self.memory_bytes(),
+            }
+
+
+fingerprint_index = FingerprintIndex()
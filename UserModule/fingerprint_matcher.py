@@ -0,0 +1,412 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .fingerprint_index import MEMBER_TEMPLATE_LOOKUPS, TEMPLATE_FIELDS, refresh_watermark
+
+# Rows are scored in chunks so the XOR temporaries stay small on big galleries
+SCORE_CHUNK_ROWS = 65536
+FREE_ROW = -1
+
+# Attached by every pool worker: (shared memory, matrix view, row -> member view, row -> length view)
+_worker_state = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def template_width():
+    # Rows are compared as uint64 words, so the width is rounded up to 8 bytes
+    width = int(_setting('FINGERPRINT_TEMPLATE_BYTES', 512))
+    return (width + 7) // 8 * 8
+
+
+def min_template_bytes():
+    return int(_setting('FINGERPRINT_MIN_TEMPLATE_BYTES', 64))
+
+
+def decode_template(template, width=None):
+    """
+    Pad/truncate a raw device template into one fixed-width matrix row.
+    Returns (row, length): the padding past length is zeros and never scored.
+    """
+    width = width or template_width()
+    row = np.zeros(width, dtype=np.uint8)
+    raw = np.frombuffer(bytes(template), dtype=np.uint8)[:width]
+    row[:raw.size] = raw
+    return row, raw.size
+
+
+def _score_rows(matrix, lengths, probe, probe_length):
+    """
+    Bit similarity (1 - normalized Hamming distance) of probe against every row, over the bytes both
+    actually hold. Rows sharing fewer than FINGERPRINT_MIN_TEMPLATE_BYTES bytes with the probe score 0.
+    """
+    words = -(-probe_length // 8)
+    mask = np.zeros(words * 8, dtype=np.uint8)
+    mask[:probe_length] = 0xFF
+    mask_words = mask.view(np.uint64)
+    probe_words = probe[:words * 8].view(np.uint64)
+    # A row shorter than the probe is zero past its end, so the XOR there is just the probe's bits
+    probe_bits = np.concatenate([[0], np.cumsum(np.bitwise_count(probe[:probe_length]), dtype=np.int64)])
+
+    min_bytes = min_template_bytes()
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_CHUNK_ROWS):
+        chunk = matrix[start:start + SCORE_CHUNK_ROWS, :words * 8].view(np.uint64)
+        distance = np.bitwise_count((chunk ^ probe_words) & mask_words).sum(axis=1, dtype=np.int64)
+        overlap = np.minimum(lengths[start:start + chunk.shape[0]], probe_length)
+        distance -= probe_bits[probe_length] - probe_bits[overlap]
+        scores[start:start + chunk.shape[0]] = np.where(
+            overlap >= min_bytes, 1.0 - distance / (np.maximum(overlap, 1) * 8), 0.0
+        )
+    return scores
+
+
+def _top_rows(scores, row_members, count):
+    scores = np.where(row_members == FREE_ROW, -1.0, scores)
+    count = min(count, scores.size)
+    if count <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows = np.argpartition(scores, -count)[-count:]
+    rows = rows[np.argsort(scores[rows])[::-1]]
+    return rows, scores[rows]
+
+
+def _shared_arrays(buffer, capacity, width):
+    # Layout of the shared segment: matrix, then row -> member, then row -> template length
+    matrix = np.ndarray((capacity, width), dtype=np.uint8, buffer=buffer)
+    row_members = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=capacity * width)
+    row_lengths = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=capacity * (width + 8))
+    return matrix, row_members, row_lengths
+
+
+def _attach_worker(name, capacity, width):
+    global _worker_state
+    shm = shared_memory.SharedMemory(name=name)
+    _worker_state = (shm, *_shared_arrays(shm.buf, capacity, width))
+
+
+def _score_shard(probe, probe_length, start, stop, count):
+    _, matrix, row_members, row_lengths = _worker_state
+    scores = _score_rows(matrix[start:stop], row_lengths[start:stop], probe, probe_length)
+    rows, row_scores = _top_rows(scores, row_members[start:stop], count)
+    return rows + start, row_scores
+
+
+class FingerprintMatcher:
+    """
+    Server-side 1:N fingerprint matcher.
+
+    Every stored minutiae template is decoded into one fixed-width row of a
+    packed uint8 matrix (three rows at most per member), zero-padded past
+    its real length; only the bytes a row and the probe both hold are
+    scored. A probe is scored against the whole gallery in one vectorized
+    pass and the best-scoring members are returned. Galleries above FINGERPRINT_MATCHER_POOL_MIN_ROWS
+    live in shared memory and are scored shard by shard in a process pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._width = None
+        self._capacity = 0
+        self._size = 0
+        self._free = []
+        self._shm = None
+        self._matrix = None
+        self._row_members = None
+        self._row_lengths = None
+        self._member_rows = {}
+        self._pool = None
+        self._built = False
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._build_stats = {}
+
+    @property
+    def is_built(self):
+        return self._built
+
+    # ---------- storage ----------
+
+    def _use_pool(self):
+        return int(_setting('FINGERPRINT_MATCHER_WORKERS', 0)) > 1
+
+    def _allocate(self, capacity):
+        old_matrix, old_row_members, old_row_lengths = self._matrix, self._row_members, self._row_lengths
+        old_shm = self._shm
+        if self._use_pool():
+            shm = shared_memory.SharedMemory(create=True, size=capacity * (self._width + 16))
+            matrix, row_members, row_lengths = _shared_arrays(shm.buf, capacity, self._width)
+        else:
+            shm = None
+            matrix = np.empty((capacity, self._width), dtype=np.uint8)
+            row_members = np.empty(capacity, dtype=np.int64)
+            row_lengths = np.empty(capacity, dtype=np.int64)
+        matrix[:] = 0
+        row_members[:] = FREE_ROW
+        row_lengths[:] = 0
+        if old_matrix is not None:
+            matrix[:self._size] = old_matrix[:self._size]
+            row_members[:self._size] = old_row_members[:self._size]
+            row_lengths[:self._size] = old_row_lengths[:self._size]
+        self._matrix, self._row_members, self._row_lengths, self._shm = matrix, row_members, row_lengths, shm
+        self._capacity = capacity
+        # Workers are attached to the old segment, start a fresh pool on demand
+        self._shutdown_pool()
+        del old_matrix, old_row_members, old_row_lengths
+        if old_shm is not None:
+            old_shm.close()
+            old_shm.unlink()
+
+    def _next_row(self):
+        if self._free:
+            return self._free.pop()
+        if self._size == self._capacity:
+            self._allocate(max(1024, self._capacity * 2))
+        self._size += 1
+        return self._size - 1
+
+    def _set_member(self, member_id, templates):
+        for row in self._member_rows.pop(member_id, ()):
+            self._matrix[row] = 0
+            self._row_members[row] = FREE_ROW
+            self._row_lengths[row] = 0
+            self._free.append(row)
+        rows = []
+        for template in templates:
+            # Templates too short to score are left out of the gallery
+            if not template or len(template) < min_template_bytes():
+                continue
+            row = self._next_row()
+            self._matrix[row], self._row_lengths[row] = decode_template(template, self._width)
+            self._row_members[row] = member_id
+            rows.append(row)
+        if rows:
+            self._member_rows[member_id] = tuple(rows)
+
+    def load(self, member_ids, templates, lengths=None):
+        """Replace the gallery with pre-decoded rows (one member id per row, full width unless lengths)."""
+        with self._lock:
+            self._width = template_width()
+            self._size = 0
+            self._free = []
+            self._member_rows = {}
+            self._matrix = self._row_members = self._row_lengths = None
+            self._watermark = None
+            self._allocate(max(1024, len(member_ids)))
+            self._matrix[:len(member_ids)] = templates[:, :self._width]
+            self._row_members[:len(member_ids)] = member_ids
+            self._row_lengths[:len(member_ids)] = self._width if lengths is None else lengths
+            self._size = len(member_ids)
+            member_rows = {}
+            for row, member_id in enumerate(np.asarray(member_ids).tolist()):
+                member_rows.setdefault(member_id, []).append(row)
+            self._member_rows = {member_id: tuple(rows) for member_id, rows in member_rows.items()}
+            self._built = True
+
+    def build(self):
+        from .models import MemberBiometrics
+
+        started = time.perf_counter()
+        built_at = timezone.now()
+        width = template_width()
+        member_ids = []
+        rows = []
+        lengths = []
+        queryset = (
+            MemberBiometrics.objects
+            .exclude(minutiae__isnull=True, minutiae2__isnull=True, minutiae3__isnull=True)
+            .values_list('member_id', *TEMPLATE_FIELDS)
+            .iterator(chunk_size=2000)
+        )
+        for member_id, *templates in queryset:
+            for template in templates:
+                if template and len(template) >= min_template_bytes():
+                    row, length = decode_template(template, width)
+                    member_ids.append(member_id)
+                    rows.append(row)
+                    lengths.append(length)
+
+        matrix = np.vstack(rows) if rows else np.empty((0, width), dtype=np.uint8)
+        with self._lock:
+            self.load(np.array(member_ids, dtype=np.int64), matrix, np.array(lengths, dtype=np.int64))
+            self._watermark = refresh_watermark(built_at)
+            self._last_refresh = time.monotonic()
+            self._build_stats = {
+                'built_at': built_at,
+                'build_seconds': round(time.perf_counter() - started, 3),
+            }
+        return self.stats()
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def warm_up(self):
+        thread = threading.Thread(target=self.ensure_built, name='fingerprint-matcher-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self):
+        """Pull templates changed or deleted by other processes since the last build/refresh."""
+        from .models import GenMember, GenMemberTombstone
+
+        with self._lock:
+            if not self._built:
+                self.build()
+                return
+            watermark = refresh_watermark(timezone.now())
+            deleted = (
+                GenMemberTombstone.objects
+                .filter(deleted_at__gte=self._watermark)
+                .values_list('member_id', flat=True)
+            )
+            for member_id in deleted:
+                self._set_member(member_id, ())
+            changed = (
+                GenMember.objects
+                .filter(last_change_datetime__gte=self._watermark)
+                .values_list('id', *MEMBER_TEMPLATE_LOOKUPS)
+            )
+            for member_id, *templates in changed:
+                self._set_member(member_id, templates)
+            self._watermark = watermark
+            self._last_refresh = time.monotonic()
+
+    def _refresh_if_due(self):
+        # Galleries handed to load() directly have no database watermark
+        if self._watermark is None:
+            return
+        interval = _setting('FINGERPRINT_INDEX_REFRESH_SECONDS', 5)
+        if time.monotonic() - self._last_refresh >= interval:
+            self.refresh()
+
+    def update_member(self, member_id, templates):
+        if not self._built:
+            return
+        with self._lock:
+            self._set_member(member_id, templates)
+
+    def remove_member(self, member_id):
+        self.update_member(member_id, ())
+
+    # ---------- scoring ----------
+
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=int(_setting('FINGERPRINT_MATCHER_WORKERS', 0)),
+                mp_context=get_context('spawn'),
+                initializer=_attach_worker,
+                initargs=(self._shm.name, self._capacity, self._width),
+            )
+        return self._pool
+
+    def _candidate_rows(self, probe, probe_length, count):
+        size = self._size
+        pool_min_rows = int(_setting('FINGERPRINT_MATCHER_POOL_MIN_ROWS', 200000))
+        if self._shm is None or size < pool_min_rows:
+            scores = _score_rows(self._matrix[:size], self._row_lengths[:size], probe, probe_length)
+            return _top_rows(scores, self._row_members[:size], count)
+
+        pool = self._get_pool()
+        shard_rows = -(-size // int(_setting('FINGERPRINT_MATCHER_WORKERS', 0)))
+        futures = [
+            pool.submit(_score_shard, probe, probe_length, start, min(start + shard_rows, size), count)
+            for start in range(0, size, shard_rows)
+        ]
+        results = [future.result() for future in futures]
+        rows = np.concatenate([r for r, _ in results])
+        scores = np.concatenate([s for _, s in results])
+        order = np.argsort(scores)[::-1][:count]
+        return rows[order], scores[order]
+
+    def _probe(self, template):
+        if len(template) < min_template_bytes():
+            raise ValueError(f"Template shorter than {min_template_bytes()} bytes can't be scored")
+        return decode_template(template, self._width)
+
+    def identify(self, template, top_k=None, threshold=None):
+        """
+        Best matching members for a probe, as [(member_id, score), ...] best first.
+        Raises ValueError for templates too short to score.
+        """
+        self.ensure_built()
+        self._refresh_if_due()
+        top_k = top_k or int(_setting('FINGERPRINT_MATCH_TOP_K', 5))
+        threshold = _setting('FINGERPRINT_MATCH_THRESHOLD', 0.8) if threshold is None else threshold
+        probe, probe_length = self._probe(template)
+
+        with self._lock:
+            # A member owns up to three rows, over-fetch so top_k distinct members survive
+            rows, scores = self._candidate_rows(probe, probe_length, top_k * len(TEMPLATE_FIELDS))
+            row_members = self._row_members[rows]
+
+        candidates = []
+        seen = set()
+        for member_id, score in zip(row_members.tolist(), scores.tolist()):
+            if member_id == FREE_ROW or member_id in seen or score < threshold:
+                continue
+            seen.add(member_id)
+            candidates.append((member_id, round(score, 4)))
+            if len(candidates) == top_k:
+                break
+        return candidates
+
+    def verify(self, member_id, template):
+        """1:1 score of a probe against one member's own templates only; ValueError if too short to score."""
+        self.ensure_built()
+        self._refresh_if_due()
+        probe, probe_length = self._probe(template)
+        with self._lock:
+            rows = list(self._member_rows.get(member_id, ()))
+            if not rows:
+                return None
+            scores = _score_rows(self._matrix[rows], self._row_lengths[rows], probe, probe_length)
+            return round(float(scores.max()), 4)
+
+    def close(self):
+        """Stop the pool and release the shared memory segment."""
+        with self._lock:
+            self._shutdown_pool()
+            self._matrix = self._row_members = self._row_lengths = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+            self._member_rows = {}
+            self._free = []
+            self._size = self._capacity = 0
+            self._built = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._built,
+                **self._build_stats,
+                'members': len(self._member_rows),
+                'templates': self._size - len(self._free),
+                'capacity': self._capacity,
+                'template_bytes': self._width,
+                'shared_memory': self._shm is not None,
+                'memory_bytes': 0 if self._matrix is None else (
+                    self._matrix.nbytes + self._row_members.nbytes + self._row_lengths.nbytes
+                ),
+            }
+
+
+fingerprint_matcher = FingerprintMatcher()
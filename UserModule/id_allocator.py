@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+# Models whose BigIntegerField primary keys are handed out by a Postgres sequence
+SEQUENCE_MODELS = ('GenShift', 'SecUser', 'GenPerson', 'GenPersonRole', 'GenMember', 'GenMembershipType')
+
+
+def sequence_name(model):
+    return f"{model._meta.db_table}_id_seq"
+
+
+class IdAllocator:
+    """
+    Primary key allocator backed by one Postgres sequence per model.
+
+    nextval() is O(1) and never hands the same id out twice, so concurrent
+    workers can insert without scanning the table. With
+    ID_ALLOCATOR_BLOCK_SIZE > 1 each worker process reserves ids in blocks
+    and serves the rest of the block from memory; explicit ids must then
+    be above every id the sequence has handed out (explicit_floor()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _block_mode(self):
+        return int(getattr(settings, 'ID_ALLOCATOR_BLOCK_SIZE', 1)) > 1
+
+    def _fetch(self, model, count):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                [connection.ops.quote_name(sequence_name(model)), count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def allocate(self, model, count=1):
+        """Return `count` fresh ids for model."""
+        if not self._block_mode():
+            return self._fetch(model, count)
+        block_size = int(getattr(settings, 'ID_ALLOCATOR_BLOCK_SIZE', 1))
+
+        # Keyed by pid so a block cached before a fork isn't served by two children
+        key = (os.getpid(), model._meta.label)
+        with self._lock:
+            block = self._blocks.setdefault(key, deque())
+            if len(block) < count:
+                block.extend(self._fetch(model, max(block_size, count - len(block))))
+            return [block.popleft() for _ in range(count)]
+
+    def allocate_one(self, model):
+        return self.allocate(model, 1)[0]
+
+    def explicit_floor(self, model):
+        """
+        Lowest id that may be inserted explicitly. In block mode every id the sequence has handed out
+        may still sit unused in some worker's block, so explicit ids must be above all of them.
+        """
+        if not self._block_mode():
+            return 1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END "
+                f"FROM {connection.ops.quote_name(sequence_name(model))}"
+            )
+            return cursor.fetchone()[0]
+
+    def reserve(self, model, object_id):
+        """
+        Move the sequence past an id about to be inserted explicitly, before inserting it.
+        Returns False when the id can't be used: in block mode, the sequence already handed it out.
+        Outside block mode ids below the sequence are fine as long as the table doesn't hold them.
+        """
+        seq = connection.ops.quote_name(sequence_name(model))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(%s, %s) FROM {seq} "
+                f"WHERE CASE WHEN is_called THEN last_value < %s ELSE last_value <= %s END",
+                [seq, object_id, object_id, object_id],
+            )
+            moved = cursor.fetchone() is not None
+        return moved or not self._block_mode()
+
+    def sync(self, model):
+        """Seed the sequence above the highest id in the table (e.g. after a legacy import)."""
+        seq = connection.ops.quote_name(sequence_name(model))
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(%s, GREATEST((SELECT COALESCE(MAX(id), 0) FROM {table}), "
+                f"(SELECT last_value FROM {seq})))",
+                [seq],
+            )
+        with self._lock:
+            self._blocks = {key: block for key, block in self._blocks.items() if key[1] != model._meta.label}
+
+    def sync_all(self):
+        from django.apps import apps
+
+        for model_name in SEQUENCE_MODELS:
+            self.sync(apps.get_model('UserModule', model_name))
+
+
+id_allocator = IdAllocator()
@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from UserModule import renditions
+from UserModule.models import GenPerson
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _generate(digest, force):
+    try:
+        return digest, renditions.generate(digest, force=force), None
+    except Exception as exc:
+        return digest, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Build missing AVIF/WebP renditions for every stored person photo, in parallel processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Photos handed to the pool at a time')
+        parser.add_argument('--force', action='store_true', help='Rebuild renditions that already exist')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def handle(self, *args, **options):
+        refs = (
+            GenPerson.objects
+            .filter(person_image_ref__isnull=False)
+            .values_list('person_image_ref', flat=True)
+            .distinct()
+            .order_by('person_image_ref')
+        )
+        done = written = failed = 0
+        last_ref = ''
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            while True:
+                batch = list(refs.filter(person_image_ref__gt=last_ref)[:options['batch_size']])
+                if not batch:
+                    break
+                last_ref = batch[-1]
+                futures = [pool.submit(_generate, digest, options['force']) for digest in batch]
+                for future in as_completed(futures):
+                    digest, count, error = future.result()
+                    done += 1
+                    written += count
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"{digest}: {error}")
+                self.log(f"{done} photos checked, {written} renditions written, {failed} failed")
+
+        self.log(self.style.SUCCESS(f"Done: {done} photos, {written} renditions written, {failed} failed."))
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from UserModule.media_store import store_blob
+from UserModule.models import GenPerson
+
+
+class Command(BaseCommand):
+    help = 'Move GenPerson photo blobs into the content-addressed media store, one batch per transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows still hold blobs')
+
+    def log(self, msg):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write(f"[{now}] {msg}")
+
+    def handle(self, *args, **options):
+        pending = GenPerson.objects.filter(Q(person_image__isnull=False) | Q(thumbnail_image__isnull=False))
+        if options['dry_run']:
+            self.log(f"{pending.count()} persons still have photo blobs in the table")
+            return
+
+        fields = [*GenPerson.IMAGE_FIELDS, *GenPerson.IMAGE_FIELDS.values()]
+        last_id = 0
+        moved = 0
+        moved_bytes = 0
+        while True:
+            # Rows are locked for the batch so a concurrent photo update can't be overwritten
+            with transaction.atomic():
+                rows = list(
+                    pending.filter(id__gt=last_id)
+                    .order_by('id')
+                    .select_for_update()
+                    .values_list('id', *fields)[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                persons = []
+                for person_id, *values in rows:
+                    person = GenPerson(id=person_id, **dict(zip(fields, values)))
+                    for field, ref_field in GenPerson.IMAGE_FIELDS.items():
+                        data = getattr(person, field)
+                        if data:
+                            moved_bytes += len(data)
+                            setattr(person, ref_field, store_blob(data))
+                        setattr(person, field, None)
+                    persons.append(person)
+                GenPerson.objects.bulk_update(persons, fields)
+            last_id = rows[-1][0]
+            moved += len(rows)
+            self.log(f"Moved photos of {moved} persons ({moved_bytes / 1048576:.1f} MiB), last id {last_id}")
+
+        self.log(self.style.SUCCESS(
+            f"Done: {moved} persons, {moved_bytes / 1048576:.1f} MiB. "
+            f"Run VACUUM on {GenPerson._meta.db_table} to return the space."
+        ))
@@ -0,0 +1,112 @@
+"""
+Content-addressed storage for person photos.
+
+A blob is written once under MEDIA_ROOT/<PERSON_MEDIA_DIR>/<aa>/<bb>/<sha256>
+and the database row only keeps the hex digest. Identical photos share a
+file, files never change once written, so they can be cached forever
+under their digest URL.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Leading bytes -> content type, for the formats gate cameras and the desk app upload
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def media_root():
+    return Path(settings.MEDIA_ROOT) / getattr(settings, 'PERSON_MEDIA_DIR', 'persons')
+
+
+def blob_path(digest):
+    if not DIGEST_RE.match(digest or ''):
+        raise ValueError(f"Invalid media digest: {digest!r}")
+    return media_root() / digest[:2] / digest[2:4] / digest
+
+
+def store_blob(data):
+    """Write data (if not already stored) and return its digest."""
+    data = bytes(data)
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if path.exists():
+        return digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a reader never sees a partially written file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return digest
+
+
+def read_blob(digest):
+    if not digest:
+        return None
+    try:
+        return blob_path(digest).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def content_type(path):
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return 'application/octet-stream'
+
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Single byte range of a Range header as inclusive (start, end).
+    None means serve the whole file (no/unsupported range), False means unsatisfiable.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def media_url(digest, request=None, size=None):
+    if not digest:
+        return None
+    url = reverse('person-media', args=[digest])
+    if size:
+        url = f"{url}?size={size}"
+    return request.build_absolute_uri(url) if request is not None else url
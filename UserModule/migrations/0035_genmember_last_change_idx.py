@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0034_alter_coachusers_start_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='genmember',
+            index=models.Index(fields=['last_change_datetime', 'id'], name='genmember_last_change_idx'),
+        ),
+    ]
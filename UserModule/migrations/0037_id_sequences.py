@@ -0,0 +1,33 @@
+from django.db import migrations
+
+SEQUENCE_MODELS = ('genshift', 'secuser', 'genperson', 'genpersonrole', 'genmember', 'genmembershiptype')
+
+
+def create_sequences(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    for model_name in SEQUENCE_MODELS:
+        table = apps.get_model('UserModule', model_name)._meta.db_table
+        seq = quote(f"{table}_id_seq")
+        # Start right above the ids already imported from the legacy database
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {seq}")
+        schema_editor.execute(
+            f"SELECT setval('{seq}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {quote(table)}), false)"
+        )
+
+
+def drop_sequences(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    for model_name in SEQUENCE_MODELS:
+        table = apps.get_model('UserModule', model_name)._meta.db_table
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {quote(f'{table}_id_seq')}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0036_genmembertombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
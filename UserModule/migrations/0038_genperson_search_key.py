@@ -0,0 +1,74 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:43
+
+import re
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# Frozen copy of UserModule.search's normalisation as of this migration
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '\u200c': None, '\u200d': None, '\u0640': None,
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    '\u0670': None,
+    **{persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_name(text):
+    if not text:
+        return ''
+    return _SPACES.sub(' ', text.translate(_CHAR_MAP)).strip().casefold()
+
+
+def person_search_key(first_name, last_name, full_name):
+    full = normalize_name(full_name)
+    parts = normalize_name(f"{first_name or ''} {last_name or ''}")
+    if parts and parts not in full:
+        full = f"{full} {parts}".strip()
+    return full or None
+
+
+def fill_search_keys(apps, schema_editor):
+    GenPerson = apps.get_model('UserModule', 'GenPerson')
+    batch = []
+    persons = GenPerson.objects.only('id', 'first_name', 'last_name', 'full_name').iterator(chunk_size=BATCH_SIZE)
+    for person in persons:
+        person.search_key = person_search_key(person.first_name, person.last_name, person.full_name)
+        batch.append(person)
+        if len(batch) == BATCH_SIZE:
+            GenPerson.objects.bulk_update(batch, ['search_key'])
+            batch = []
+    if batch:
+        GenPerson.objects.bulk_update(batch, ['search_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0037_id_sequences'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='genperson',
+            name='search_key',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        # Filled before the index exists so the GIN index is built once
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='genperson',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_key'], name='genperson_search_key_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
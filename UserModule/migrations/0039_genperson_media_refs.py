@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0038_genperson_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genperson',
+            name='person_image_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='genperson',
+            name='thumbnail_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
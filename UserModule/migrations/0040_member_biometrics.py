@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0039_genperson_media_refs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberBiometrics',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='biometrics', serialize=False, to='UserModule.genmember')),
+                ('minutiae', models.BinaryField(blank=True, null=True)),
+                ('minutiae2', models.BinaryField(blank=True, null=True)),
+                ('minutiae3', models.BinaryField(blank=True, null=True)),
+                ('face_template_1', models.BinaryField(blank=True, null=True)),
+                ('face_template_2', models.BinaryField(blank=True, null=True)),
+                ('face_template_3', models.BinaryField(blank=True, null=True)),
+                ('face_template_4', models.BinaryField(blank=True, null=True)),
+                ('face_template_5', models.BinaryField(blank=True, null=True)),
+            ],
+        ),
+    ]
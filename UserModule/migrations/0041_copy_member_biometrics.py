@@ -0,0 +1,75 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:50
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+TEMPLATE_COLUMNS = (
+    'minutiae', 'minutiae2', 'minutiae3',
+    'face_template_1', 'face_template_2', 'face_template_3', 'face_template_4', 'face_template_5',
+)
+
+
+def _batches(schema_editor, table):
+    """Yield (low, high] member id ranges of at most BATCH_SIZE rows, walking the primary key."""
+    low = None
+    while True:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT max(id), count(*) FROM (SELECT id FROM {table} WHERE %s IS NULL OR id > %s "
+                f"ORDER BY id LIMIT %s) batch",
+                [low, low, BATCH_SIZE],
+            )
+            high, count = cursor.fetchone()
+        if not count:
+            return
+        yield low, high
+        low = high
+
+
+def copy_templates(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    members = quote(apps.get_model('UserModule', 'GenMember')._meta.db_table)
+    biometrics = quote(apps.get_model('UserModule', 'MemberBiometrics')._meta.db_table)
+    columns = ', '.join(quote(column) for column in TEMPLATE_COLUMNS)
+    has_template = ' OR '.join(f"{quote(column)} IS NOT NULL" for column in TEMPLATE_COLUMNS)
+    for low, high in _batches(schema_editor, members):
+        # One short transaction per batch, so the member table is never locked for the whole copy
+        with transaction.atomic(using=schema_editor.connection.alias):
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {biometrics} (member_id, {columns}) "
+                    f"SELECT id, {columns} FROM {members} "
+                    f"WHERE (%s IS NULL OR id > %s) AND id <= %s AND ({has_template}) "
+                    # Batches committed by an earlier, interrupted run are skipped
+                    f"ON CONFLICT (member_id) DO NOTHING",
+                    [low, low, high],
+                )
+
+
+def restore_templates(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    members = quote(apps.get_model('UserModule', 'GenMember')._meta.db_table)
+    biometrics = quote(apps.get_model('UserModule', 'MemberBiometrics')._meta.db_table)
+    assignments = ', '.join(f"{quote(column)} = b.{quote(column)}" for column in TEMPLATE_COLUMNS)
+    for low, high in _batches(schema_editor, members):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {members} m SET {assignments} FROM {biometrics} b "
+                    f"WHERE b.member_id = m.id AND (%s IS NULL OR m.id > %s) AND m.id <= %s",
+                    [low, low, high],
+                )
+
+
+class Migration(migrations.Migration):
+
+    # Templates are copied in committed batches rather than one long transaction; safe to re-run
+    atomic = False
+
+    dependencies = [
+        ('UserModule', '0040_member_biometrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_templates, restore_templates),
+    ]
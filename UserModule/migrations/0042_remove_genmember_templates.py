@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserModule', '0041_copy_member_biometrics'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='genmember',
+            name='face_template_1',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='face_template_2',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='face_template_3',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='face_template_4',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='face_template_5',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='minutiae',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='minutiae2',
+        ),
+        migrations.RemoveField(
+            model_name='genmember',
+            name='minutiae3',
+        ),
+    ]
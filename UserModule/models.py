@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import connections, models, transaction
 from django.utils import timezone
 from django.apps import apps
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+
+from .media_store import store_blob
+from . import renditions
+from .search import person_search_key
 
 
 
@@ -46,6 +51,12 @@ class SecUser(models.Model):
     def __str__(self):
         return self.username or f"User {self.id}"
 
+class GenPersonManager(models.Manager):
+    def get_queryset(self):
+        # Legacy photo blobs stay out of every query, photos are read from the media store
+        return super().get_queryset().defer('person_image', 'thumbnail_image')
+
+
 class GenPerson(models.Model):
     GENDER_CHOICES = [
         ('M', 'Male'),
@@ -60,8 +71,12 @@ class GenPerson(models.Model):
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, null=True, blank=True)
     national_code = models.CharField(max_length=50, null=True, blank=True)
     nidentity = models.CharField(max_length=50, null=True, blank=True)
+    # Legacy blob columns, emptied by the migrate_person_media command
     person_image = models.BinaryField(null=True, blank=True)
     thumbnail_image = models.BinaryField(null=True)
+    # sha256 digests of the photos in the media store
+    person_image_ref = models.CharField(max_length=64, null=True, blank=True)
+    thumbnail_ref = models.CharField(max_length=64, null=True, blank=True)
     birth_date = models.DateField(max_length=510, null=True, blank=True)
     tel = models.CharField(max_length=50, null=True, blank=True)
     mobile = models.CharField(max_length=50, null=True, blank=True)
@@ -80,10 +95,91 @@ class GenPerson(models.Model):
     creation_datetime = models.DateTimeField(null=True, blank=True, auto_now_add=True)
     modifier = models.CharField(max_length=255, null=True, blank=True)
     modification_datetime = models.CharField(max_length=510, null=True, blank=True)
+    # Normalized names for search, maintained by save()
+    search_key = models.TextField(null=True, blank=True, editable=False)
+
+    NAME_FIELDS = ('first_name', 'last_name', 'full_name')
+    IMAGE_FIELDS = {'person_image': 'person_image_ref', 'thumbnail_image': 'thumbnail_ref'}
+
+    objects = GenPersonManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_key'], opclasses=['gin_trgm_ops'], name='genperson_search_key_trgm'),
+        ]
+
+    def refresh_search_key(self):
+        self.search_key = person_search_key(self.first_name, self.last_name, self.full_name)
+
+    def offload_images(self):
+        """Move photo bytes assigned to the blob fields into the media store, return the fields changed."""
+        changed = []
+        for field, ref_field in self.IMAGE_FIELDS.items():
+            # __dict__, so a deferred blob is never loaded just to check it
+            data = self.__dict__.get(field)
+            if data:
+                setattr(self, ref_field, store_blob(data))
+                setattr(self, field, None)
+                changed += [field, ref_field]
+        if 'person_image_ref' in changed:
+            renditions.schedule(self.person_image_ref)
+        return changed
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        extra_fields = set(self.offload_images())
+        if update_fields is None or set(update_fields) & set(self.NAME_FIELDS):
+            self.refresh_search_key()
+            extra_fields.add('search_key')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *extra_fields}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.full_name or f"Person {self.id}"
 
+def log_end_date_changes(queryset, end_date):
+    """
+    Set-based MemberSubLog writer: one INSERT ... SELECT logging every member of
+    queryset whose end_date is about to become end_date (a value or an expression).
+    """
+    if end_date is None:
+        return 0
+    MemberSubLog = apps.get_model('DataInsight', 'MemberSubLog')
+    if not hasattr(end_date, 'resolve_expression'):
+        end_date = models.Value(end_date, output_field=models.DateTimeField())
+    changed = (
+        queryset.order_by()
+        .annotate(new_end_date=end_date, logged_at=models.Value(timezone.now(), output_field=models.DateTimeField()))
+        .filter(new_end_date__isnull=False)
+        .exclude(end_date=models.F('new_end_date'))
+        .values_list('id', 'new_end_date', 'logged_at')
+    )
+    sql, params = changed.query.sql_with_params()
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(MemberSubLog._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} (member_id, end_date, created_at) {sql}", params)
+        return cursor.rowcount
+
+
+class GenMemberQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if 'end_date' not in kwargs:
+            return super().update(**kwargs)
+        # bulk_update() lands here too, once per batch, with end_date as a CASE expression
+        with transaction.atomic(using=self.db, savepoint=False):
+            log_end_date_changes(self, kwargs['end_date'])
+            return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if 'end_date' in fields:
+            for obj in objs:
+                obj._loaded_end_date = obj.end_date
+        return rows
+
+
 class GenMember(models.Model):
     id = models.BigIntegerField(primary_key=True)
     membership_type = models.ForeignKey(GenMembershipType, on_delete=models.CASCADE, null=True, blank=True)
@@ -101,15 +197,7 @@ class GenMember(models.Model):
     modification_datetime = models.CharField(max_length=255, null=True, blank=True)
     is_family = models.BooleanField(default=False, null=True, blank=True)
     max_debit = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    minutiae = models.BinaryField(null=True, blank=True)
-    minutiae2 = models.BinaryField(null=True, blank=True)
-    minutiae3 = models.BinaryField(null=True, blank=True)
     salary = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    face_template_1 = models.BinaryField(null=True, blank=True)
-    face_template_2 = models.BinaryField(null=True, blank=True)
-    face_template_3 = models.BinaryField(null=True, blank=True)
-    face_template_4 = models.BinaryField(null=True, blank=True)
-    face_template_5 = models.BinaryField(null=True, blank=True)
     creation_datetime = models.DateTimeField(null=True, blank=True, auto_now_add=True)
     session_left = models.IntegerField(null=True, blank=True)
     end_date = models.DateTimeField(null=True, blank=True)
@@ -119,15 +207,43 @@ class GenMember(models.Model):
     balance = models.IntegerField(null=True, blank=True)
     last_change_datetime = models.DateTimeField(null=True, blank=True)
 
+    objects = GenMemberQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_change_datetime', 'id'], name='genmember_last_change_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # end_date as loaded, so save() can tell whether it changed without reading the row again
+        if 'end_date' in field_names:
+            instance._loaded_end_date = values[field_names.index('end_date')]
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if 'end_date' in self.__dict__:
+            self._loaded_end_date = self.end_date
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            old = GenMember.objects.filter(pk=self.pk).first()
-            old_end_date = old.end_date if old else None
-        else:
+        update_fields = kwargs.get('update_fields')
+        end_date_written = 'end_date' in self.__dict__ and (update_fields is None or 'end_date' in update_fields)
+        if self._state.adding and (self.pk is None or kwargs.get('force_insert')):
             old_end_date = None
+        elif '_loaded_end_date' in self.__dict__:
+            old_end_date = self._loaded_end_date
+        elif end_date_written:
+            # Loaded with end_date deferred and assigned since, or built with the id of a stored
+            # member (saved as an UPDATE): the only cases that need the stored value
+            old_end_date = GenMember.objects.filter(pk=self.pk).values_list('end_date', flat=True).first()
 
         self.last_change_datetime = timezone.now()
         super().save(*args, **kwargs)
+        if not end_date_written:
+            return
+        self._loaded_end_date = self.end_date
 
         if self.end_date and self.end_date != old_end_date:
             MemberSubLog = apps.get_model('DataInsight', 'MemberSubLog')
@@ -139,7 +255,42 @@ class GenMember(models.Model):
 
     def __str__(self):
         return f"Member {self.id} - {self.card_no}"
-    
+
+
+class MemberBiometrics(models.Model):
+    """Fingerprint and face templates of a member, kept off the GenMember row so member reads stay narrow."""
+    member = models.OneToOneField(GenMember, on_delete=models.CASCADE, primary_key=True, related_name='biometrics')
+    minutiae = models.BinaryField(null=True, blank=True)
+    minutiae2 = models.BinaryField(null=True, blank=True)
+    minutiae3 = models.BinaryField(null=True, blank=True)
+    face_template_1 = models.BinaryField(null=True, blank=True)
+    face_template_2 = models.BinaryField(null=True, blank=True)
+    face_template_3 = models.BinaryField(null=True, blank=True)
+    face_template_4 = models.BinaryField(null=True, blank=True)
+    face_template_5 = models.BinaryField(null=True, blank=True)
+
+    TEMPLATE_FIELDS = (
+        'minutiae', 'minutiae2', 'minutiae3',
+        'face_template_1', 'face_template_2', 'face_template_3', 'face_template_4', 'face_template_5',
+    )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Indexes and device sync pick up template changes through the member's watermark
+        GenMember.objects.filter(pk=self.member_id).update(last_change_datetime=timezone.now())
+
+    def __str__(self):
+        return f"Biometrics of member {self.member_id}"
+
+
+class GenMemberTombstone(models.Model):
+    """Deleted member ids, so devices syncing templates incrementally can drop them."""
+    member_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Member {self.member_id} deleted at {self.deleted_at}"
+
 
 
 class Sport(models.Model):
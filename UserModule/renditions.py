@@ -0,0 +1,118 @@
+"""
+Resized AVIF/WebP renditions of person photos.
+
+Renditions are derived from the photo's digest, so they need no database
+columns: <media root>/renditions/<digest>/<size>.<format>. They are built
+off the request path by a small thread pool when a photo is stored, and
+in bulk by the generate_person_renditions command.
+"""
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pillow_avif  # noqa: F401  registers the AVIF codec with Pillow
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .media_store import DIGEST_RE, media_root, read_blob
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'avif': 'image/avif', 'webp': 'image/webp'}
+_PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP'}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def sizes():
+    """Rendition name -> longest edge in pixels."""
+    return getattr(settings, 'PERSON_RENDITION_SIZES', {'avatar': 80, 'card': 320, 'full': 1024})
+
+
+def rendition_path(digest, size, fmt):
+    if not DIGEST_RE.match(digest or '') or size not in sizes() or fmt not in FORMATS:
+        raise ValueError(f"Invalid rendition {digest!r}/{size!r}.{fmt!r}")
+    return media_root() / 'renditions' / digest / f"{size}.{fmt}"
+
+
+def _write(path, image, fmt):
+    quality = getattr(settings, 'PERSON_RENDITION_QUALITY', 60)
+    buffer = io.BytesIO()
+    image.save(buffer, _PIL_FORMATS[fmt], quality=quality)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def generate(digest, force=False):
+    """Build every missing rendition of one photo; returns how many files were written."""
+    targets = [
+        (size, edge, fmt) for size, edge in sizes().items() for fmt in FORMATS
+        if force or not rendition_path(digest, size, fmt).exists()
+    ]
+    if not targets:
+        return 0
+    data = read_blob(digest)
+    if not data:
+        return 0
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+    written = 0
+    # Largest first, each smaller size is resized from the previous one
+    image = source
+    for size, edge, fmt in sorted(targets, key=lambda target: -target[1]):
+        if max(image.size) > edge:
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        _write(rendition_path(digest, size, fmt), image, fmt)
+        written += 1
+    return written
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PERSON_RENDITION_WORKERS', 2),
+                thread_name_prefix='person-renditions',
+            )
+        return _executor
+
+
+def _run(digest):
+    try:
+        generate(digest)
+    except Exception:
+        logger.exception("Could not build renditions for photo %s", digest)
+    finally:
+        with _executor_lock:
+            _pending.discard(digest)
+
+
+def _submit(digest):
+    with _executor_lock:
+        if digest in _pending:
+            return
+        _pending.add(digest)
+    _get_executor().submit(_run, digest)
+
+
+def schedule(digest):
+    """Queue rendition generation for a stored photo once the current transaction commits."""
+    if digest:
+        transaction.on_commit(lambda: _submit(digest))
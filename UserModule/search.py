@@ -0,0 +1,98 @@
+"""
+Name search over GenPerson.search_key.
+
+search_key holds full_name (and first/last name when full_name doesn't
+already contain them) normalized so spelling variants compare equal:
+Arabic yeh/kaf/heh/alef forms are folded to their Persian letters, ZWNJ,
+tatweel and diacritics are dropped, digits become ASCII and whitespace is
+collapsed. Queries go through the same normalization and are answered
+from the pg_trgm GIN index on search_key, prefix matches first, then by
+trigram word similarity.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '\u200c': None, '\u200d': None, '\u0640': None,
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    '\u0670': None,
+    **{persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+_SPACES = re.compile(r'\s+')
+
+# Names shorter than a trigram are matched by (word) prefix only
+MIN_FUZZY_LENGTH = 3
+
+
+def normalize_name(text):
+    if not text:
+        return ''
+    return _SPACES.sub(' ', text.translate(_CHAR_MAP)).strip().casefold()
+
+
+def person_search_key(first_name, last_name, full_name):
+    full = normalize_name(full_name)
+    parts = normalize_name(f"{first_name or ''} {last_name or ''}")
+    if parts and parts not in full:
+        full = f"{full} {parts}".strip()
+    return full or None
+
+
+def _ranked(queryset, field, key, limit):
+    prefix = Q(**{f'{field}__startswith': key}) | Q(**{f'{field}__contains': f' {key}'})
+    matches = prefix
+    if len(key) >= MIN_FUZZY_LENGTH:
+        matches |= Q(**{f'{field}__trigram_word_similar': key})
+    queryset = (
+        queryset
+        .filter(matches)
+        .annotate(
+            prefix_rank=Case(
+                When(**{f'{field}__startswith': key}, then=Value(2)),
+                When(**{f'{field}__contains': f' {key}'}, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            score=TrigramWordSimilarity(key, field),
+        )
+        .order_by('-prefix_rank', '-score', 'id')
+    )
+    threshold = getattr(settings, 'PERSON_SEARCH_MIN_SIMILARITY', 0.5)
+    with transaction.atomic():
+        # The %> operator (and so the index scan) filters on this GUC, scoped to the transaction
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(threshold)])
+        return list(queryset[:limit])
+
+
+def search_persons(query, limit=20):
+    """Best matching persons for a name query, best first, each with .score."""
+    from .models import GenPerson
+
+    key = normalize_name(query)
+    if not key:
+        return []
+    return _ranked(GenPerson.objects.all(), 'search_key', key, limit)
+
+
+def search_members(query, limit=20):
+    """Members whose person matches the name query, best first, each with .score."""
+    from .models import GenMember
+
+    key = normalize_name(query)
+    if not key:
+        return []
+    members = GenMember.objects.select_related('person').only(
+        'id', 'card_no', 'end_date', 'session_left', 'person__id', 'person__full_name', 'person__mobile',
+    )
+    return _ranked(members, 'person__search_key', key, limit)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 import base64
-from .models import GenShift, SecUser, GenPerson, GenPersonRole, GenMember, GenMembershipType, Sport, CoachManagement, CoachUsers
+from .models import GenShift, SecUser, GenPerson, GenPersonRole, GenMember, GenMembershipType, MemberBiometrics, Sport, CoachManagement, CoachUsers
+from .media_store import media_url
 from rest_framework import serializers
 from .models import GenMember
 import base64
@@ -16,7 +17,9 @@ class FingerprintListSerializer(serializers.ModelSerializer):
 
     def get_minutiae(self, obj):
         minutiae_list = []
-        for field in [obj.minutiae, obj.minutiae2, obj.minutiae3]:
+        # Members without a biometrics row list three empty templates
+        biometrics = getattr(obj, 'biometrics', None)
+        for field in [getattr(biometrics, name, None) for name in ('minutiae', 'minutiae2', 'minutiae3')]:
             if field:  # encode back to base64 for JSON
                 minutiae_list.append(base64.b64encode(field).decode("utf-8"))
             else:
@@ -37,8 +40,8 @@ class FingerprintSerializer(serializers.ModelSerializer):
         return ret
 
     class Meta:
-        model = GenMember
-        fields = ['minutiae', 'minutiae2', 'minutiae3', 'has_finger']
+        model = MemberBiometrics
+        fields = ['minutiae', 'minutiae2', 'minutiae3']
 
 class CoachUsersSerializer(serializers.ModelSerializer):
     class Meta:
@@ -83,14 +86,36 @@ class SecUserSerializer(serializers.ModelSerializer):
 
 class GenPersonSerializer(serializers.ModelSerializer):
     creation_datetime = serializers.DateTimeField(read_only=True)
-    person_image = Base64BinaryField(required=False, allow_null=True)
-    thumbnail_image = Base64BinaryField(required=False, allow_null=True)
+    # Photos are uploaded as base64 and served back by URL from the media store
+    person_image = Base64BinaryField(required=False, allow_null=True, write_only=True)
+    thumbnail_image = Base64BinaryField(required=False, allow_null=True, write_only=True)
+    person_image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    avatar_url = serializers.SerializerMethodField()
+
+    def get_person_image_url(self, obj):
+        return media_url(obj.person_image_ref, self.context.get('request'))
+
+    def get_avatar_url(self, obj):
+        return media_url(obj.person_image_ref, self.context.get('request'), size='avatar')
+
+    def get_thumbnail_url(self, obj):
+        return media_url(obj.thumbnail_ref, self.context.get('request'))
+
+    def to_internal_value(self, data):
+        ret = super().to_internal_value(data)
+        # A null photo clears its ref; bytes reach the media store when the row is saved
+        for field, ref_field in GenPerson.IMAGE_FIELDS.items():
+            if field in ret and not ret[field]:
+                ret[ref_field] = None
+        return ret
 
     class Meta:
         model = GenPerson
         fields = [
             'id', 'first_name', 'last_name', 'full_name', 'father_name', 'gender', 'national_code', 'nidentity',
-            'person_image', 'thumbnail_image', 'birth_date', 'tel', 'mobile', 'email', 'education', 'job',
+            'person_image', 'thumbnail_image', 'person_image_url', 'thumbnail_url', 'avatar_url',
+            'birth_date', 'tel', 'mobile', 'email', 'education', 'job',
             'has_insurance', 'insurance_no', 'ins_start_date', 'ins_end_date', 'address', 'has_parrent',
             'team_name', 'shift', 'user', 'creation_datetime', 'modifier', 'modification_datetime'
         ]
@@ -108,15 +133,21 @@ class GenMembershipTypeSerializer(serializers.ModelSerializer):
         fields = ['id', 'membership_type_desc']
 
 
+def include_templates(request):
+    params = getattr(request, 'query_params', {})
+    return params.get('include_templates') in ('1', 'true')
+
+
 class GenMemberSerializer(serializers.ModelSerializer):
-    face_template_1 = Base64BinaryField(required=False, allow_null=True)
-    face_template_2 = Base64BinaryField(required=False, allow_null=True)
-    face_template_3 = Base64BinaryField(required=False, allow_null=True)
-    face_template_4 = Base64BinaryField(required=False, allow_null=True)
-    face_template_5 = Base64BinaryField(required=False, allow_null=True)
-    minutiae = Base64BinaryField(required=False, allow_null=True)
-    minutiae2 = Base64BinaryField(required=False, allow_null=True)
-    minutiae3 = Base64BinaryField(required=False, allow_null=True)
+    # Stored on MemberBiometrics, returned only with ?include_templates=1
+    face_template_1 = Base64BinaryField(source='biometrics.face_template_1', required=False, allow_null=True)
+    face_template_2 = Base64BinaryField(source='biometrics.face_template_2', required=False, allow_null=True)
+    face_template_3 = Base64BinaryField(source='biometrics.face_template_3', required=False, allow_null=True)
+    face_template_4 = Base64BinaryField(source='biometrics.face_template_4', required=False, allow_null=True)
+    face_template_5 = Base64BinaryField(source='biometrics.face_template_5', required=False, allow_null=True)
+    minutiae = Base64BinaryField(source='biometrics.minutiae', required=False, allow_null=True)
+    minutiae2 = Base64BinaryField(source='biometrics.minutiae2', required=False, allow_null=True)
+    minutiae3 = Base64BinaryField(source='biometrics.minutiae3', required=False, allow_null=True)
     session_left = serializers.IntegerField(required=False, allow_null=True)
 
     # ✅ Update sport to FK
@@ -130,6 +161,29 @@ class GenMemberSerializer(serializers.ModelSerializer):
     def get_sport_name(self, obj):
         return obj.sport.name if obj.sport else None
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not include_templates(self.context.get('request')):
+            for field in MemberBiometrics.TEMPLATE_FIELDS:
+                self.fields[field].write_only = True
+
+    def create(self, validated_data):
+        templates = validated_data.pop('biometrics', None)
+        member = super().create(validated_data)
+        self._save_biometrics(member, templates)
+        return member
+
+    def update(self, instance, validated_data):
+        templates = validated_data.pop('biometrics', None)
+        member = super().update(instance, validated_data)
+        self._save_biometrics(member, templates)
+        return member
+
+    def _save_biometrics(self, member, templates):
+        # The biometrics post_save signal keeps this worker's indexes in step
+        if templates:
+            member.biometrics, _ = MemberBiometrics.objects.update_or_create(member=member, defaults=templates)
+
     class Meta:
         model = GenMember
         fields = [
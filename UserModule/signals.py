@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .face_index import FACE_FIELDS, face_index
+from .fingerprint_index import TEMPLATE_FIELDS, fingerprint_index
+from .fingerprint_matcher import fingerprint_matcher
+from .models import GenMember, GenMemberTombstone, MemberBiometrics
+
+
+def index_biometrics(biometrics, fields=MemberBiometrics.TEMPLATE_FIELDS):
+    """Push one member's templates into this worker's fingerprint and face indexes."""
+    deferred = biometrics.get_deferred_fields()
+    if set(TEMPLATE_FIELDS) & set(fields) and not set(TEMPLATE_FIELDS) & deferred:
+        templates = [getattr(biometrics, field) for field in TEMPLATE_FIELDS]
+        fingerprint_index.update_member(biometrics.member_id, templates)
+        fingerprint_matcher.update_member(biometrics.member_id, templates)
+    if set(FACE_FIELDS) & set(fields) and not set(FACE_FIELDS) & deferred:
+        face_index.update_member(biometrics.member_id, [getattr(biometrics, field) for field in FACE_FIELDS])
+
+
+@receiver(post_save, sender=MemberBiometrics)
+def index_member_biometrics(sender, instance, update_fields=None, **kwargs):
+    index_biometrics(instance, update_fields if update_fields is not None else MemberBiometrics.TEMPLATE_FIELDS)
+
+
+@receiver(post_delete, sender=MemberBiometrics)
+def unindex_member_biometrics(sender, instance, **kwargs):
+    fingerprint_index.remove_member(instance.member_id)
+    fingerprint_matcher.remove_member(instance.member_id)
+    face_index.remove_member(instance.member_id)
+
+
+@receiver(post_delete, sender=GenMember)
+def unindex_member_fingerprints(sender, instance, **kwargs):
+    GenMemberTombstone.objects.create(member_id=instance.pk)
+    fingerprint_index.remove_member(instance.pk)
+    fingerprint_matcher.remove_member(instance.pk)
+    face_index.remove_member(instance.pk)
+
+
+def reindex_members(biometrics):
+    """Refresh this worker's biometric indexes for templates written with bulk_create."""
+    for row in biometrics:
+        index_biometrics(row)
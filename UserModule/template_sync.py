@@ -0,0 +1,156 @@
+"""
+Incremental fingerprint template distribution for gate devices.
+
+A device keeps the opaque cursor returned by the last page and asks for
+everything that changed after it: members whose row changed (ordered by
+last_change_datetime, id) and members deleted since (GenMemberTombstone).
+Deletions must be applied before changes, so a member deleted and
+re-created with the same id ends up present.
+
+Binary framing (encoding=binary), all integers little-endian:
+
+    header   b'GYMS' | u16 version | u32 changed | u32 deleted | u8 has_more
+             | u16 cursor length | cursor (ascii)
+    changed  i64 member id | i64 person id (-1 = none)
+             | 3 x (u32 length | raw template bytes), length 0 = no template
+    deleted  i64 member id
+"""
+import base64
+import json
+import struct
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fingerprint_index import MEMBER_TEMPLATE_LOOKUPS
+from .models import GenMember, GenMemberTombstone
+
+BINARY_MAGIC = b'GYMS'
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<4sHIIBH')
+_IDS = struct.Struct('<qq')
+_LENGTH = struct.Struct('<I')
+_MEMBER_ID = struct.Struct('<q')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Cursor -> {'t': iso datetime or None, 'm': member id, 'd': tombstone id}; None means full sync."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+        stamp = position['t']
+        if stamp is not None and parse_datetime(stamp) is None:
+            raise ValueError
+        return {'t': stamp, 'm': int(position['m']), 'd': int(position['d'])}
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Invalid sync cursor')
+
+
+def changes_since(cursor, limit):
+    """
+    One page of template changes after the cursor.
+    Returns (changed rows, deleted member ids, next cursor, has_more).
+    """
+    position = decode_cursor(cursor)
+    # Rows stamped in the last few seconds may belong to transactions that
+    # haven't committed yet; leave them for the next page so none are skipped.
+    lag = getattr(settings, 'FINGERPRINT_SYNC_LAG_SECONDS', 2)
+    upper = timezone.now() - timedelta(seconds=lag)
+
+    members = GenMember.objects.filter(
+        Q(last_change_datetime__isnull=True) | Q(last_change_datetime__lte=upper)
+    )
+    deleted = []
+    if position is None:
+        # First sync: the device starts empty, deletions so far don't concern it
+        last_tombstone = GenMemberTombstone.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        position = {'t': None, 'm': 0, 'd': last_tombstone}
+    else:
+        if position['t'] is None:
+            members = members.filter(
+                Q(last_change_datetime__isnull=True, id__gt=position['m'])
+                | Q(last_change_datetime__isnull=False)
+            )
+        else:
+            stamp = parse_datetime(position['t'])
+            members = members.filter(
+                Q(last_change_datetime__gt=stamp)
+                | Q(last_change_datetime=stamp, id__gt=position['m'])
+            )
+        tombstones = list(
+            GenMemberTombstone.objects
+            .filter(id__gt=position['d'], deleted_at__lte=upper)
+            .order_by('id')
+            .values_list('id', 'member_id')
+        )
+        if tombstones:
+            position = {**position, 'd': tombstones[-1][0]}
+            deleted = [member_id for _, member_id in tombstones]
+
+    rows = list(
+        members
+        .order_by(F('last_change_datetime').asc(nulls_first=True), 'id')
+        .values_list('id', 'person_id', 'last_change_datetime', *MEMBER_TEMPLATE_LOOKUPS)[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last_id, _, last_stamp = rows[-1][:3]
+        position = {**position, 't': last_stamp.isoformat() if last_stamp else None, 'm': last_id}
+
+    changed = [
+        {'member_id': member_id, 'person_id': person_id, 'templates': templates}
+        for member_id, person_id, _, *templates in rows
+    ]
+    return changed, deleted, encode_cursor(position), has_more
+
+
+def encode_json(changed, deleted, cursor, has_more):
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'deleted': deleted,
+        'changed': [
+            {
+                'member_id': item['member_id'],
+                'person_id': item['person_id'],
+                'minutiae': [
+                    base64.b64encode(template).decode('utf-8') if template else None
+                    for template in item['templates']
+                ],
+            }
+            for item in changed
+        ],
+    }
+
+
+def encode_binary(changed, deleted, cursor, has_more):
+    cursor_bytes = cursor.encode('ascii')
+    parts = [
+        _HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(changed), len(deleted), int(has_more), len(cursor_bytes)),
+        cursor_bytes,
+    ]
+    for item in changed:
+        person_id = item['person_id'] if item['person_id'] is not None else -1
+        parts.append(_IDS.pack(item['member_id'], person_id))
+        for template in item['templates']:
+            template = bytes(template) if template else b''
+            parts.append(_LENGTH.pack(len(template)))
+            parts.append(template)
+    for member_id in deleted:
+        parts.append(_MEMBER_ID.pack(member_id))
+    return b''.join(parts)
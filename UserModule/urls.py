@@ -1,5 +1,9 @@
 from django.urls import path
-from .views import DynamicAPIView, SportAPIView, CoachManagementAPIView, CoachUsersAPIView, FingerprintAPIView
+from .views import (
+    DynamicAPIView, SportAPIView, CoachManagementAPIView, CoachUsersAPIView, FingerprintAPIView,
+    FingerprintIndexAPIView, FingerprintSyncAPIView, FaceIdentifyAPIView, FaceIndexAPIView,
+    PersonSearchAPIView, PersonMediaAPIView
+)
 
 urlpatterns = [
     path('dynamic/', DynamicAPIView.as_view()),
@@ -7,4 +11,10 @@ urlpatterns = [
     path('coach-management/', CoachManagementAPIView.as_view(), name='coach-management'),
     path('coach-user-management/', CoachUsersAPIView.as_view(), name='coach-user-management'),
     path('fingerprint/', FingerprintAPIView.as_view(), name='fingerprint'),
+    path('fingerprint/index/', FingerprintIndexAPIView.as_view(), name='fingerprint-index'),
+    path('fingerprint/sync/', FingerprintSyncAPIView.as_view(), name='fingerprint-sync'),
+    path('face/identify/', FaceIdentifyAPIView.as_view(), name='face-identify'),
+    path('face/index/', FaceIndexAPIView.as_view(), name='face-index'),
+    path('person/search/', PersonSearchAPIView.as_view(), name='person-search'),
+    path('media/persons/<str:digest>/', PersonMediaAPIView.as_view(), name='person-media'),
 ]
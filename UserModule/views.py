@@ -3,54 +3,60 @@ import json
 import base64
 
 # Django imports
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.http import FileResponse, HttpResponse
 
 # DRF (Django Rest Framework) imports
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.negotiation import BaseContentNegotiation
 
 # Local app imports
+from GymAutomation.pagination import InvalidPage, paginate
 from .models import (
     GenShift, SecUser, GenPerson, GenPersonRole,
-    GenMember, GenMembershipType, Sport,
+    GenMember, GenMembershipType, MemberBiometrics, Sport,
     CoachManagement, CoachUsers
 )
 from .serializers import (
     GenShiftSerializer, SecUserSerializer, GenPersonSerializer, GenPersonRoleSerializer,
     GenMemberSerializer, GenMembershipTypeSerializer, SportSerializer,
-    CoachManagementSerializer, CoachUsersSerializer, FingerprintListSerializer
+    CoachManagementSerializer, CoachUsersSerializer, FingerprintListSerializer, include_templates
 )
+from .fingerprint_index import fingerprint_index
+from .fingerprint_matcher import fingerprint_matcher
+from .face_index import face_index
+from .template_sync import InvalidCursor, changes_since, encode_binary, encode_json
+from .id_allocator import id_allocator
+from . import bulk
+from .search import normalize_name, search_members, search_persons
+from .media_store import blob_path, content_type, parse_range
+from . import renditions
 
 
 class FingerprintAPIView(APIView):
     def get(self, request):
-        queryset = GenMember.objects.all()
+        queryset = GenMember.objects.select_related('biometrics')
 
         # Check for pagination params
-        page = request.query_params.get("page")
-        limit = request.query_params.get("limit")
-
-        if page is not None and limit is not None:
+        params = request.query_params
+        if params.get("cursor") or (params.get("page") is not None and params.get("limit") is not None):
             try:
-                page = int(page)
-                limit = int(limit)
-            except ValueError:
-                return Response({"error": "Invalid pagination values"}, status=400)
-
-            total_items = queryset.count()
-            total_pages = (total_items + limit - 1) // limit
+                page = paginate(request, queryset, ['id'])
+            except InvalidPage as exc:
+                return Response({"error": str(exc)}, status=400)
 
-            start = (page - 1) * limit
-            end = start + limit
-            queryset = queryset[start:end]
-
-            serializer = FingerprintListSerializer(queryset, many=True)
+            serializer = FingerprintListSerializer(page.items, many=True)
             return Response({
-                "total_items": total_items,
-                "total_pages": total_pages,
-                "current_page": page,
+                "total_items": page.total_items,
+                "total_pages": page.total_pages,
+                "current_page": page.number,
+                "next_cursor": page.next_cursor,
+                "total_items_estimated": page.estimated,
                 "items": serializer.data
             })
 
@@ -66,19 +72,66 @@ class FingerprintAPIView(APIView):
         if not template_base64:
             return Response({"error": "No fingerprint provided"}, status=400)
 
-        template_bytes = base64.b64decode(template_base64)
-        members = GenMember.objects.all()
-        if user_id:
-            members = members.filter(id=user_id)
+        try:
+            template_bytes = base64.b64decode(template_base64)
+        except Exception:
+            return Response({"error": "Invalid base64-encoded template"}, status=400)
 
-        for member in members:
-            if member.minutiae == template_bytes or \
-               member.minutiae2 == template_bytes or \
-               member.minutiae3 == template_bytes:
+        try:
+            top_k = int(request.data.get("topK") or 0) or None
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid topK"}, status=400)
+        # Only the server decides what score opens the gate
+        threshold = getattr(settings, 'FINGERPRINT_MATCH_THRESHOLD', 0.8)
+
+        # Exact digest hit first, then the fuzzy matcher for real re-scans
+        score = None
+        candidates = []
+        if user_id:
+            try:
+                user_id = int(user_id)
+            except (TypeError, ValueError):
+                return Response({"error": "Invalid userId"}, status=400)
+            if fingerprint_index.has_template(user_id, template_bytes):
+                member_id, score = user_id, 1.0
+            else:
+                try:
+                    score = fingerprint_matcher.verify(user_id, template_bytes)
+                except ValueError as exc:
+                    return Response({"error": str(exc)}, status=400)
+                member_id = user_id if score is not None and score >= threshold else None
+        else:
+            member_id = fingerprint_index.lookup(template_bytes)
+            if member_id is not None:
+                score = 1.0
+            else:
+                try:
+                    candidates = fingerprint_matcher.identify(template_bytes, top_k=top_k, threshold=threshold)
+                except ValueError as exc:
+                    return Response({"error": str(exc)}, status=400)
+                if candidates:
+                    member_id, score = candidates[0]
+
+        if member_id is not None:
+            member = (
+                GenMember.objects.select_related('person')
+                .only('id', 'person__full_name')
+                .filter(id=member_id)
+                .first()
+            )
+            if member:
                 return Response({
                     "userId": member.id,
-                    "full_name": member.person.full_name if member.person else None
+                    "full_name": member.person.full_name if member.person else None,
+                    "score": score,
+                    "candidates": [
+                        {"userId": candidate_id, "score": candidate_score}
+                        for candidate_id, candidate_score in candidates
+                    ],
                 }, status=200)
+            # Deleted by another worker since it was indexed
+            fingerprint_index.remove_member(member_id)
+            fingerprint_matcher.remove_member(member_id)
 
         return Response({"message": "No matching user found"}, status=404)
 
@@ -98,17 +151,243 @@ class FingerprintAPIView(APIView):
             if field in request.data and request.data[field]:
                 request.data[field] = base64.b64decode(request.data[field])
 
-        # Update has_finger if provided
-        if 'has_finger' in request.data:
-            member.has_finger = request.data['has_finger']
+        templates = {
+            field: request.data[field] for field in ['minutiae', 'minutiae2', 'minutiae3'] if field in request.data
+        }
+        # has_finger and the templates are saved together or not at all
+        with transaction.atomic():
+            # Update has_finger if provided
+            if 'has_finger' in request.data:
+                member.has_finger = request.data['has_finger']
+                member.save()
+
+            # Update minutiae fields
+            if templates:
+                MemberBiometrics.objects.update_or_create(member=member, defaults=templates)
+        return Response({"message": "Fingerprint updated successfully"}, status=200)
 
-        # Update minutiae fields
-        for field in ['minutiae', 'minutiae2', 'minutiae3']:
-            if field in request.data:
-                setattr(member, field, request.data[field])
 
-        member.save()
-        return Response({"message": "Fingerprint updated successfully"}, status=200)
+class FingerprintIndexAPIView(APIView):
+    def get(self, request):
+        """Index size, build time and memory footprint of this worker"""
+        return Response({
+            'exact': fingerprint_index.stats(),
+            'matcher': fingerprint_matcher.stats(),
+        })
+
+    def post(self, request):
+        """Rebuild the exact index and the matcher gallery from the database"""
+        return Response({
+            'exact': fingerprint_index.build(),
+            'matcher': fingerprint_matcher.build(),
+        })
+
+
+class FingerprintSyncAPIView(APIView):
+    def get(self, request):
+        """Templates changed (and members deleted) since the device's cursor"""
+        try:
+            limit = int(request.query_params.get('limit', 500))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "Invalid limit"}, status=400)
+        limit = min(limit, getattr(settings, 'FINGERPRINT_SYNC_MAX_LIMIT', 5000))
+
+        try:
+            page = changes_since(request.query_params.get('cursor'), limit)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+
+        # "format" is taken by DRF's renderer negotiation
+        if request.query_params.get('encoding') == 'binary':
+            return HttpResponse(encode_binary(*page), content_type='application/octet-stream')
+        return Response(encode_json(*page))
+
+
+class FaceIdentifyAPIView(APIView):
+    def post(self, request):
+        """Identify one face template ("template") or a batch of them ("templates")"""
+        batch = request.data.get("templates")
+        single = request.data.get("template")
+        if not batch and not single:
+            return Response({"error": "No face template provided"}, status=400)
+        if batch is not None and not isinstance(batch, list):
+            return Response({"error": "templates must be a list"}, status=400)
+
+        try:
+            probes = [base64.b64decode(template) for template in (batch or [single])]
+            top_k = int(request.data.get("topK") or 0) or None
+            threshold = request.data.get("threshold")
+            threshold = float(threshold) if threshold not in (None, "") else None
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid template, topK or threshold"}, status=400)
+
+        results = face_index.search(probes, top_k=top_k, threshold=threshold)
+
+        member_ids = {member_id for matches in results if matches for member_id, _ in matches}
+        names = dict(
+            GenMember.objects.filter(id__in=member_ids).values_list('id', 'person__full_name')
+        )
+        items = []
+        for matches in results:
+            if matches is None:
+                items.append({"error": "Template is not a valid face embedding"})
+                continue
+            items.append({
+                "matches": [
+                    {"userId": member_id, "full_name": names.get(member_id), "score": score}
+                    for member_id, score in matches if member_id in names
+                ]
+            })
+
+        if batch is None:
+            item = items[0]
+            if "error" in item:
+                return Response(item, status=400)
+            if not item["matches"]:
+                return Response({"message": "No matching user found"}, status=404)
+            return Response(item)
+        return Response({"items": items})
+
+
+class FaceIndexAPIView(APIView):
+    def get(self, request):
+        """Face gallery size, IVF state and memory footprint of this worker"""
+        return Response(face_index.stats())
+
+    def post(self, request):
+        """Rebuild the face gallery from the database"""
+        return Response(face_index.build())
+
+
+class IgnoreAcceptNegotiation(BaseContentNegotiation):
+    """The view picks the image type from Accept itself; errors are always JSON."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class PersonMediaAPIView(APIView):
+    """
+    Photos from the media store; a digest URL never changes content, so it's cached for good.
+    ?size=avatar|card|full serves a resized rendition, AVIF or WebP by the Accept header
+    (or ?type=avif|webp).
+    """
+    content_negotiation_class = IgnoreAcceptNegotiation
+
+    def get(self, request, digest):
+        try:
+            path = blob_path(digest)
+        except ValueError:
+            return Response({'error': 'Invalid media id'}, status=status.HTTP_400_BAD_REQUEST)
+        if not path.exists():
+            return Response({'error': 'Media not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        size = request.query_params.get('size')
+        if size is None:
+            return self.serve(request, path, f'"{digest}"', content_type(path))
+        if size not in renditions.sizes():
+            return Response(
+                {'error': f"Invalid size. Use one of: {', '.join(renditions.sizes())}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fmt = request.query_params.get('type')
+        if fmt is None:
+            accept = request.headers.get('Accept', '')
+            fmt = 'avif' if 'image/avif' in accept else 'webp'
+        if fmt not in renditions.FORMATS:
+            return Response({'error': 'Invalid type. Use avif or webp.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rendition = renditions.rendition_path(digest, size, fmt)
+        if not rendition.exists():
+            # Not built yet: queue it and hand out the original without letting caches keep it
+            renditions.schedule(digest)
+            return self.serve(request, path, f'"{digest}"', content_type(path), cache_control='no-cache')
+        response = self.serve(request, rendition, f'"{digest}-{size}.{fmt}"', renditions.FORMATS[fmt])
+        response['Vary'] = 'Accept'
+        return response
+
+    def serve(self, request, path, etag, mime, cache_control='public, max-age=31536000, immutable'):
+        headers = {
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            'Accept-Ranges': 'bytes',
+        }
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        size = path.stat().st_size
+        byte_range = None
+        if request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            return HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, 'Content-Range': f'bytes */{size}'},
+            )
+        if byte_range:
+            start, end = byte_range
+            with open(path, 'rb') as f:
+                f.seek(start)
+                chunk = f.read(end - start + 1)
+            return HttpResponse(
+                chunk, status=status.HTTP_206_PARTIAL_CONTENT, content_type=mime,
+                headers={**headers, 'Content-Range': f'bytes {start}-{end}/{size}'},
+            )
+
+        response = FileResponse(open(path, 'rb'), content_type=mime)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+
+class PersonSearchAPIView(APIView):
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not normalize_name(query):
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, getattr(settings, 'PERSON_SEARCH_MAX_LIMIT', 100))
+
+        if request.query_params.get('action') == 'member':
+            items = [
+                {
+                    'id': member.id,
+                    'person_id': member.person_id,
+                    'full_name': member.person.full_name if member.person else None,
+                    'mobile': member.person.mobile if member.person else None,
+                    'card_no': member.card_no,
+                    'session_left': member.session_left,
+                    'end_date': member.end_date,
+                    'score': round(member.score, 4),
+                }
+                for member in search_members(query, limit)
+            ]
+        else:
+            items = [
+                {
+                    'id': person.id,
+                    'full_name': person.full_name,
+                    'first_name': person.first_name,
+                    'last_name': person.last_name,
+                    'mobile': person.mobile,
+                    'national_code': person.national_code,
+                    'score': round(person.score, 4),
+                }
+                for person in search_persons(query, limit)
+            ]
+        return Response({'items': items})
 
 
 class CoachManagementAPIView(APIView):
@@ -121,22 +400,17 @@ class CoachManagementAPIView(APIView):
         
         # Pagination
         try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-        except ValueError:
-            return Response({'error': 'Invalid pagination values'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_items = queryset.count()
-        total_pages = (total_items + limit - 1) // limit
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_queryset = queryset[start:end]
+            page = paginate(request, queryset, ['id'])
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = CoachManagementSerializer(paginated_queryset, many=True)
+        serializer = CoachManagementSerializer(page.items, many=True)
         return Response({
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
+            'total_items': page.total_items,
+            'total_pages': page.total_pages,
+            'current_page': page.number,
+            'next_cursor': page.next_cursor,
+            'total_items_estimated': page.estimated,
             'items': serializer.data
         })
 
@@ -219,6 +493,10 @@ class CoachUsersAPIView(APIView):
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+# Query params that never become queryset filters
+PAGINATION_PARAMS = ['action', 'page', 'limit', 'order_by', 'cursor', 'count', 'include_templates']
+
+
 class DynamicAPIView(APIView):
 
     def get_model(self, action):
@@ -256,8 +534,36 @@ class DynamicAPIView(APIView):
     def get_serializer(self, *args, **kwargs):
         if not hasattr(self, 'serializer_class') or self.serializer_class is None:
             raise AssertionError("serializer_class must be set before calling get_serializer()")
+        kwargs.setdefault('context', {'request': self.request})
         return self.serializer_class(*args, **kwargs)
 
+    def bulk_response(self, rows, write, success_status):
+        max_rows = getattr(settings, 'DYNAMIC_BULK_MAX_ROWS', 1000)
+        if not rows:
+            return Response({'error': 'Empty batch'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > max_rows:
+            return Response({'error': f'At most {max_rows} rows per batch'}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = write(rows)
+        failed = sum(1 for item in items if item['status'] == 'failed')
+        return Response({
+            'succeeded': len(items) - failed,
+            'failed': failed,
+            'items': items,
+        }, status=success_status if failed < len(items) else status.HTTP_400_BAD_REQUEST)
+
+    def get_ordering(self, request, use_creation_field):
+        # id breaks ties so every ordering can be paged with a keyset cursor
+        order_by = request.query_params.get('order_by')
+        if use_creation_field:
+            if order_by == 'latest':
+                return ['-creation_datetime', '-id']
+            if order_by == 'earlier':
+                return ['creation_datetime', 'id']
+        elif order_by == 'latest':
+            return ['-id']
+        return ['id']
+
     def get(self, request):
         action = request.query_params.get('action')
         model = self.get_model(action)
@@ -271,32 +577,18 @@ class DynamicAPIView(APIView):
 
             filters = Q()
             for key, value in request.query_params.items():
-                if key not in ['action', 'page', 'limit', 'order_by']:
+                if key not in PAGINATION_PARAMS:
                     filters &= Q(**{key: value})
 
             queryset = queryset.filter(filters, is_single_settion=True)
 
-            order_by = request.query_params.get('order_by')
-            if order_by == 'latest':
-                queryset = queryset.order_by('-creation_datetime')
-            elif order_by == 'earlier':
-                queryset = queryset.order_by('creation_datetime')
-
             try:
-                page = int(request.query_params.get('page', 1))
-                limit = int(request.query_params.get('limit', 10))
-            except ValueError:
-                return Response({'error': 'Invalid pagination values'}, status=status.HTTP_400_BAD_REQUEST)
-
-            total_items = queryset.count()
-            total_pages = (total_items + limit - 1) // limit
-
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_queryset = queryset[start:end]
+                page = paginate(request, queryset, self.get_ordering(request, True))
+            except InvalidPage as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
             data = []
-            for member in paginated_queryset:
+            for member in page.items:
                 data.append({
                     'person': member.person,
                     'price': member.price,
@@ -314,9 +606,11 @@ class DynamicAPIView(APIView):
                 })
 
             return Response({
-                'total_items': total_items,
-                'total_pages': total_pages,
-                'current_page': page,
+                'total_items': page.total_items,
+                'total_pages': page.total_pages,
+                'current_page': page.number,
+                'next_cursor': page.next_cursor,
+                'total_items_estimated': page.estimated,
                 'items': data
             })
 
@@ -328,42 +622,25 @@ class DynamicAPIView(APIView):
             filters &= Q(id=object_id)
 
         for key, value in request.query_params.items():
-            if key not in ['action', 'id', 'page', 'limit', 'order_by']:
-                if key == 'full_name':
+            if key not in PAGINATION_PARAMS + ['id']:
+                if key == 'full_name' and model is GenPerson:
+                    # Served by the trigram index, and tolerant of yeh/kaf/ZWNJ variants
+                    filters &= Q(search_key__contains=normalize_name(value))
+                elif key == 'full_name':
                     filters &= Q(full_name__icontains=value)
                 else:
                     filters &= Q(**{key: value})
 
         queryset = model.objects.filter(filters)
-
-        order_by = request.query_params.get('order_by')
-        use_creation_field = action in ['person', 'user', 'member']
-
-        if use_creation_field:
-            if order_by == 'latest':
-                queryset = queryset.order_by('-creation_datetime')
-            elif order_by == 'earlier':
-                queryset = queryset.order_by('creation_datetime')
-        else:
-            if order_by == 'latest':
-                queryset = queryset.order_by('-id')
-            elif order_by == 'earlier':
-                queryset = queryset.order_by('id')
+        if model is GenMember and include_templates(request):
+            queryset = queryset.select_related('biometrics')
 
         try:
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-        except ValueError:
-            return Response({'error': 'Invalid pagination values'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_items = queryset.count()
-        total_pages = (total_items + limit - 1) // limit
-
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_queryset = queryset[start:end]
+            page = paginate(request, queryset, self.get_ordering(request, action in ['person', 'user', 'member']))
+        except InvalidPage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_serializer(paginated_queryset, many=True)
+        serializer = self.get_serializer(page.items, many=True)
         data = serializer.data
 
         # Extra for person
@@ -397,9 +674,11 @@ class DynamicAPIView(APIView):
                 item['full_name'] = person_map.get(person_id)
 
         return Response({
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
+            'total_items': page.total_items,
+            'total_pages': page.total_pages,
+            'current_page': page.number,
+            'next_cursor': page.next_cursor,
+            'total_items_estimated': page.estimated,
             'items': data
         })
 
@@ -412,6 +691,13 @@ class DynamicAPIView(APIView):
 
         self.serializer_class = self.get_serializer_class(model)
 
+        # A JSON array creates the whole batch at once
+        if isinstance(request.data, list):
+            return self.bulk_response(
+                request.data, lambda rows: bulk.bulk_create(model, self.serializer_class, rows, pool=action == 'pool'),
+                status.HTTP_201_CREATED,
+            )
+
         # Custom behavior for 'pool' action
         if action == 'pool':
             data = request.data.copy()
@@ -425,28 +711,22 @@ class DynamicAPIView(APIView):
             # Handle full_name → create GenPerson if full_name exists
             full_name = data.pop('full_name', None)
             if full_name:
-                existing_person_ids = set(GenPerson.objects.values_list('id', flat=True))
-                new_person_id = 1
-                while new_person_id in existing_person_ids:
-                    new_person_id += 1
-                person = GenPerson.objects.create(id=new_person_id, full_name=full_name)
+                person = GenPerson.objects.create(id=id_allocator.allocate_one(GenPerson), full_name=full_name)
                 data['person'] = person.id
 
             # Generate unique ID for GenMember
             if 'id' not in data or data['id'] in [None, '']:
-                existing_ids = set(GenMember.objects.values_list('id', flat=True))
-                new_id = 1
-                while new_id in existing_ids:
-                    new_id += 1
-                data['id'] = new_id
+                data['id'] = id_allocator.allocate_one(GenMember)
             else:
                 try:
                     base_id = int(data['id'])
                 except ValueError:
                     return Response({'error': 'Invalid ID format'}, status=status.HTTP_400_BAD_REQUEST)
 
-                while GenMember.objects.filter(id=base_id).exists():
-                    base_id += 1
+                if GenMember.objects.filter(id=base_id).exists():
+                    return Response({'error': 'This id already exists.'}, status=status.HTTP_400_BAD_REQUEST)
+                if not id_allocator.reserve(GenMember, base_id):
+                    return Response({'error': 'This id is already allocated; leave id empty to get a fresh one.'}, status=status.HTTP_400_BAD_REQUEST)
                 data['id'] = base_id
 
             serializer = GenMemberSerializer(data=data)
@@ -467,19 +747,17 @@ class DynamicAPIView(APIView):
         data = request.data.copy()
 
         if 'id' not in data or data['id'] in [None, '']:
-            existing_ids = set(model.objects.values_list('id', flat=True))
-            new_id = 1
-            while new_id in existing_ids:
-                new_id += 1
-            data['id'] = new_id
+            data['id'] = id_allocator.allocate_one(model)
         else:
             try:
                 base_id = int(data['id'])
             except ValueError:
                 return Response({'error': 'Invalid ID format'}, status=status.HTTP_400_BAD_REQUEST)
 
-            while model.objects.filter(id=base_id).exists():
-                base_id += 1
+            if model.objects.filter(id=base_id).exists():
+                return Response({'error': 'This id already exists.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not id_allocator.reserve(model, base_id):
+                return Response({'error': 'This id is already allocated; leave id empty to get a fresh one.'}, status=status.HTTP_400_BAD_REQUEST)
             data['id'] = base_id
 
         serializer = self.get_serializer(data=data)
@@ -496,6 +774,13 @@ class DynamicAPIView(APIView):
         if not model or action == 'pool':
             return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # A JSON array updates every listed object, each row carries its own 'id'
+        if isinstance(request.data, list):
+            serializer_class = self.get_serializer_class(model)
+            return self.bulk_response(
+                request.data, lambda rows: bulk.bulk_update(model, serializer_class, rows), status.HTTP_200_OK,
+            )
+
         object_id = request.query_params.get('id')
         if not object_id:
             return Response({'error': 'ID is required'}, status=status.HTTP_400_BAD_REQUEST)